@@ -0,0 +1,69 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import text
+
+from database import Base, engine
+
+# importa todos os models para que Base.metadata esteja completo
+import appointment.model_appointment  # noqa: F401
+import appointment.model_appointment_sheep  # noqa: F401
+import appointment.model_medication  # noqa: F401
+import farm.model_farm  # noqa: F401
+import farmer.model_farmer  # noqa: F401
+import inventory.model_inventory  # noqa: F401
+import milkproduction.model_milkdaily  # noqa: F401
+import milkproduction.model_lactation  # noqa: F401
+import milkproduction.model_yieldstats  # noqa: F401
+import milkproduction.model_forecast  # noqa: F401
+import milkproduction.model_milkproduction  # noqa: F401
+import sensor.model_sensor  # noqa: F401
+import sheep.model_sheep  # noqa: F401
+import sheep.model_sheepparentage  # noqa: F401
+import sheepgroup.model_sheepgroup  # noqa: F401
+import veterinarian.model_veterinarian  # noqa: F401
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# chave do advisory lock que serializa migrações entre workers
+MIGRATION_LOCK_KEY = 724515
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # usa a mesma DATABASE_URL da aplicação (database.py)
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
+
+        try:
+            context.configure(connection=connection, target_metadata=target_metadata)
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
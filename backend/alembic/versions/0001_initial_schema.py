@@ -0,0 +1,138 @@
+"""initial schema (sheep_dump.sql)
+
+Bases que já existem (criadas pelo antigo create_all ou restauradas do dump)
+são aceitas como estão: cada tabela só é criada se ainda não existir.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-06-02 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_table(name, *columns):
+    # tabelas já existentes (dump/create_all) ficam como estão
+    if sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns)
+    if any(getattr(column, 'name', None) == 'id' for column in columns):
+        op.create_index(f'ix_{name}_id', name, ['id'])
+
+
+def upgrade() -> None:
+    _create_table(
+        'farm',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('location', sa.Text()),
+    )
+    _create_table(
+        'farmer',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('email', sa.String(255), nullable=False, unique=True),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('farm_id', sa.Integer(), nullable=False, unique=True),
+    )
+    _create_table(
+        'veterinarian',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('email', sa.String(255), nullable=False, unique=True),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('farm_id', sa.Integer(), sa.ForeignKey('farm.id'), nullable=False),
+        sa.Column('farmer_id', sa.Integer(), sa.ForeignKey('farmer.id'), nullable=False),
+    )
+    _create_table(
+        'sheep_group',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('description', sa.Text()),
+        sa.Column('farm_id', sa.Integer(), sa.ForeignKey('farm.id'), nullable=False),
+    )
+    _create_table(
+        'sheep',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('birth_date', sa.Date()),
+        sa.Column('farm_id', sa.Integer(), sa.ForeignKey('farm.id'), nullable=False),
+        sa.Column('feeding_hay', sa.Float(5), nullable=False),
+        sa.Column('feeding_feed', sa.Float(5), nullable=False),
+        sa.Column('gender', sa.String(10)),
+        sa.Column('group_id', sa.Integer(), sa.ForeignKey('sheep_group.id')),
+    )
+    _create_table(
+        'sheep_parentage',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('parent_id', sa.Integer(), sa.ForeignKey('sheep.id'), nullable=False),
+        sa.Column('offspring_id', sa.Integer(), sa.ForeignKey('sheep.id'), nullable=False),
+        sa.UniqueConstraint('parent_id', 'offspring_id', name='_parent_offspring_uc'),
+    )
+    _create_table(
+        'milk_production_individual',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('sheep_id', sa.Integer(), sa.ForeignKey('sheep.id'), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('volume', sa.Float(5), nullable=False),
+    )
+    _create_table(
+        'farm_inventory',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('farm_id', sa.Integer(), sa.ForeignKey('farm.id'), nullable=False),
+        sa.Column('item_name', sa.String(255), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit', sa.String(50), nullable=False),
+        sa.Column('last_updated', sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column('consumption_rate', sa.Float(), nullable=False),
+        sa.Column('category', sa.String(99), nullable=False),
+    )
+    _create_table(
+        'sensor',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('farm_id', sa.Integer(), sa.ForeignKey('farm.id'), nullable=False),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('min_value', sa.Float(5)),
+        sa.Column('max_value', sa.Float(5)),
+        sa.Column('current_value', sa.Float(5), nullable=False),
+        sa.Column('timestamp', sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    _create_table(
+        'appointment',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('vet_id', sa.Integer(), sa.ForeignKey('veterinarian.id'), nullable=False),
+        sa.Column('date', sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column('motivo', sa.Text()),
+        sa.Column('comentarios', sa.Text()),
+    )
+    _create_table(
+        'appointment_sheep',
+        sa.Column('appointment_id', sa.Integer(), sa.ForeignKey('appointment.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('sheep_id', sa.Integer(), sa.ForeignKey('sheep.id', ondelete='CASCADE'), primary_key=True),
+    )
+    _create_table(
+        'medication',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('appointment_id', sa.Integer(), sa.ForeignKey('appointment.id'), nullable=False),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('dosage', sa.String(100)),
+        sa.Column('indication', sa.Text()),
+    )
+
+
+def downgrade() -> None:
+    for table in (
+        'medication', 'appointment_sheep', 'appointment', 'sensor', 'farm_inventory',
+        'milk_production_individual', 'sheep_parentage', 'sheep', 'sheep_group',
+        'veterinarian', 'farmer', 'farm',
+    ):
+        op.drop_table(table)
@@ -0,0 +1,54 @@
+"""milk_daily_farm_group rollup
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-06-02 10:05:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('milk_daily_farm_group'):
+        return
+
+    op.create_table(
+        'milk_daily_farm_group',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('farm_id', sa.Integer(), sa.ForeignKey('farm.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('group_id', sa.Integer(), sa.ForeignKey('sheep_group.id', ondelete='CASCADE')),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.UniqueConstraint(
+            'farm_id', 'group_id', 'date',
+            name='_milk_daily_farm_group_uc',
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+    op.create_index('ix_milk_daily_farm_group_id', 'milk_daily_farm_group', ['id'])
+
+    # popula a partir do histórico existente
+    op.execute(
+        """
+        INSERT INTO milk_daily_farm_group (farm_id, group_id, date, total, count)
+        SELECT s.farm_id, s.group_id, m.date, SUM(m.volume), COUNT(m.id)
+        FROM milk_production_individual m
+        JOIN sheep s ON s.id = m.sheep_id
+        GROUP BY s.farm_id, s.group_id, m.date
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('milk_daily_farm_group')
@@ -0,0 +1,93 @@
+"""composite indexes for the hot query shapes
+
+Adiciona índices por fazenda/grupo e a unique (sheep_id, date) em
+milk_production_individual, usada pelo upsert da produção diária.
+Registros duplicados de (sheep_id, date) são removidos antes, mantendo o mais recente
+(maior id); os removidos vão para milk_production_individual_duplicates, a contagem
+sai no log e o rollup diário é recalculado. O downgrade devolve os duplicados.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-06-02 10:10:00
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+# cópia dos registros duplicados removidos antes da unique (sheep_id, date)
+DUPLICATES_TABLE = 'milk_production_individual_duplicates'
+
+INDEXES = [
+    ('ix_sheep_farm_id_id', 'sheep', ['farm_id', 'id']),
+    ('ix_sheep_farm_id_group_id', 'sheep', ['farm_id', 'group_id']),
+    ('ix_sheep_parentage_offspring_id_parent_id', 'sheep_parentage', ['offspring_id', 'parent_id']),
+    ('ix_milk_production_individual_date', 'milk_production_individual', ['date']),
+    ('ix_milk_daily_farm_group_farm_id_date', 'milk_daily_farm_group', ['farm_id', 'date']),
+    ('ix_sheep_group_farm_id', 'sheep_group', ['farm_id']),
+    ('ix_sensor_farm_id_name', 'sensor', ['farm_id', 'name']),
+    ('ix_farm_inventory_farm_id_item_name', 'farm_inventory', ['farm_id', 'item_name']),
+    ('ix_veterinarian_farm_id', 'veterinarian', ['farm_id']),
+]
+
+REBUILD_ROLLUP = """
+    INSERT INTO milk_daily_farm_group (farm_id, group_id, date, total, count)
+    SELECT s.farm_id, s.group_id, m.date, SUM(m.volume), COUNT(m.id)
+    FROM milk_production_individual m
+    JOIN sheep s ON s.id = m.sheep_id
+    GROUP BY s.farm_id, s.group_id, m.date
+"""
+
+
+def upgrade() -> None:
+    op.execute(f"CREATE TABLE IF NOT EXISTS {DUPLICATES_TABLE} (LIKE milk_production_individual)")
+    removed = op.get_bind().execute(sa.text(
+        f"""
+        WITH removed AS (
+            DELETE FROM milk_production_individual m
+            USING milk_production_individual newer
+            WHERE newer.sheep_id = m.sheep_id
+              AND newer.date = m.date
+              AND newer.id > m.id
+            RETURNING m.*
+        )
+        INSERT INTO {DUPLICATES_TABLE} SELECT * FROM removed
+        """
+    )).rowcount
+    if removed:
+        log.warning("Moved %d duplicate (sheep_id, date) milk records to %s; the latest record of each was kept",
+                    removed, DUPLICATES_TABLE)
+    else:
+        op.drop_table(DUPLICATES_TABLE)
+    op.create_unique_constraint('_sheep_date_uc', 'milk_production_individual', ['sheep_id', 'date'])
+
+    # o rollup foi populado antes da remoção dos duplicados
+    op.execute("DELETE FROM milk_daily_farm_group")
+    op.execute(REBUILD_ROLLUP)
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_constraint('_sheep_date_uc', 'milk_production_individual', type_='unique')
+
+    if sa.inspect(op.get_bind()).has_table(DUPLICATES_TABLE):
+        op.execute(f"INSERT INTO milk_production_individual SELECT * FROM {DUPLICATES_TABLE}")
+        op.drop_table(DUPLICATES_TABLE)
+        # o rollup volta a contar os duplicados, como antes do upgrade
+        op.execute("DELETE FROM milk_daily_farm_group")
+        op.execute(REBUILD_ROLLUP)
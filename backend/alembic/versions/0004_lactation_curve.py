@@ -0,0 +1,48 @@
+"""lactation_curve (Wood's curve per sheep)
+
+Tabela derivada de milk_production_individual; começa vazia e é preenchida
+por `python -m milkproduction.lactation` ou sob demanda pelas rotas.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-06-20 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('lactation_curve'):
+        return
+
+    op.create_table(
+        'lactation_curve',
+        sa.Column('sheep_id', sa.Integer(), sa.ForeignKey('sheep.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('lactation_start', sa.Date()),
+        sa.Column('records', sa.Integer(), nullable=False),
+        sa.Column('a', sa.Float()),
+        sa.Column('b', sa.Float()),
+        sa.Column('c', sa.Float()),
+        sa.Column('peak_yield', sa.Float()),
+        sa.Column('days_to_peak', sa.Float()),
+        sa.Column('persistency', sa.Float()),
+        sa.Column('source_count', sa.Integer(), nullable=False),
+        sa.Column('source_last_date', sa.Date()),
+        sa.Column('source_total', sa.Float(), nullable=False),
+        sa.Column('fitted_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_lactation_curve_peak_yield', 'lactation_curve', ['peak_yield'])
+
+
+def downgrade() -> None:
+    op.drop_table('lactation_curve')
@@ -0,0 +1,44 @@
+"""milk_yield_stats (EWMA per sheep for yield-drop alerts)
+
+Começa vazia: cada ovelha é calculada a partir do histórico no primeiro
+registro novo, ou de uma vez com `python -m milkproduction.anomalies`.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-06-24 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('milk_yield_stats'):
+        return
+
+    op.create_table(
+        'milk_yield_stats',
+        sa.Column('sheep_id', sa.Integer(), sa.ForeignKey('sheep.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('mean', sa.Float(), nullable=False),
+        sa.Column('variance', sa.Float(), nullable=False),
+        sa.Column('last_date', sa.Date(), nullable=False),
+        sa.Column('last_volume', sa.Float(), nullable=False),
+        sa.Column('expected', sa.Float()),
+        sa.Column('deviation', sa.Float()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_milk_yield_stats_deviation', 'milk_yield_stats', ['deviation'])
+
+
+def downgrade() -> None:
+    op.drop_table('milk_yield_stats')
@@ -0,0 +1,50 @@
+"""milk_forecast (cached per-farm/per-group yield forecasts)
+
+Começa vazia: preenchida por `python -m milkproduction.forecast` (agendado
+todas as noites) ou sob demanda por GET /milk-production/forecast.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-06-30 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('milk_forecast'):
+        return
+
+    op.create_table(
+        'milk_forecast',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('farm_id', sa.Integer(), sa.ForeignKey('farm.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('scope', sa.String(5), nullable=False),
+        sa.Column('group_id', sa.Integer(), sa.ForeignKey('sheep_group.id', ondelete='CASCADE')),
+        sa.Column('origin', sa.Date(), nullable=False),
+        sa.Column('values', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column('lower', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column('upper', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column('history_days', sa.Integer(), nullable=False),
+        sa.Column('fitted_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint(
+            'farm_id', 'scope', 'group_id',
+            name='_milk_forecast_series_uc',
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('milk_forecast')
@@ -0,0 +1,38 @@
+"""lactation_dirty (sheep whose lactation curve must be refitted)
+
+As rotas de escrita de leite marcam as ovelhas aqui e o job
+`python -m milkproduction.lactation` reajusta só elas; as rotas de leitura
+não reajustam mais. Ovelhas com registros mudados antes da migração são
+encontradas por `python -m milkproduction.lactation --full`.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-07-08 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('lactation_dirty'):
+        return
+
+    op.create_table(
+        'lactation_dirty',
+        sa.Column('sheep_id', sa.Integer(), sa.ForeignKey('sheep.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('marked_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('lactation_dirty')
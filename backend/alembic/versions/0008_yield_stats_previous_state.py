@@ -0,0 +1,36 @@
+"""milk_yield_stats.previous_mean / previous_variance
+
+Estado EWMA antes do último registro de cada ovelha: uma correção ou
+reenvio com data igual a last_date desfaz só o último passo em vez de
+reler o histórico. Linhas antigas ficam com NULL e são recalculadas do
+histórico na próxima correção.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-07-08 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('milk_yield_stats')}
+    if 'previous_mean' not in columns:
+        op.add_column('milk_yield_stats', sa.Column('previous_mean', sa.Float()))
+    if 'previous_variance' not in columns:
+        op.add_column('milk_yield_stats', sa.Column('previous_variance', sa.Float()))
+
+
+def downgrade() -> None:
+    op.drop_column('milk_yield_stats', 'previous_variance')
+    op.drop_column('milk_yield_stats', 'previous_mean')
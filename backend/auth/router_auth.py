@@ -1,27 +1,30 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from farmer.model_farmer import Farmer
 from veterinarian.model_veterinarian import Veterinarian
 from auth.schema_auth import LoginRequest, TokenResponse
-from utils import verify_password, create_access_token
+from utils import verify_and_update_password, create_access_token
 from fastapi.security import OAuth2PasswordBearer
 from utils import decode_token
-from blacklist import blacklisted_tokens, is_token_blacklisted, add_token_to_blacklist
+from blacklist import is_token_blacklisted, add_token_to_blacklist
 from auth.schema_auth import TokenUser
+import principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 router = APIRouter()
 
 # POST /login - user logs into the system
 @router.post("/login", response_model=TokenResponse)
-def login(user_data: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(Farmer).filter(Farmer.email == user_data.email).first()
+async def login(user_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.scalars(select(Farmer).where(Farmer.email == user_data.email))).first()
     role = "farmer"
 
     if not user:
-        user = db.query(Veterinarian).filter(Veterinarian.email == user_data.email).first()
+        user = (await db.scalars(select(Veterinarian).where(Veterinarian.email == user_data.email))).first()
         role = "veterinarian"
 
     if not user:
@@ -30,11 +33,23 @@ def login(user_data: LoginRequest, db: Session = Depends(get_db)):
     if not user.password:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    if not verify_password(user_data.password, user.password):
+    model = Farmer if role == "farmer" else Veterinarian
+    user_id, email, stored_hash = user.id, user.email, user.password
+    # devolve a conexão ao pool enquanto o bcrypt roda no pool de hashing
+    await db.close()
+
+    valid, new_hash = await verify_and_update_password(user_data.password, stored_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    # custo do bcrypt mudou (BCRYPT_ROUNDS): regrava o hash com a senha em mãos
+    if new_hash:
+        await db.execute(update(model).where(model.id == user_id).values(password=new_hash))
+        await db.commit()
 
-    access_token = create_access_token(data={"sub": user.email, "role": role})
+    # descarta principals antigos desse email (ex.: conta recriada com outro id)
+    principal_cache.invalidate_email(email)
+    access_token = create_access_token(data={"sub": email, "role": role})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -44,7 +59,8 @@ def logout(token: str = Depends(oauth2_scheme)):
     if not token:
         raise HTTPException(status_code=401)
     
-    add_token_to_blacklist(token)
+    add_token_to_blacklist(token, decode_token(token))
+    principal_cache.invalidate_token(token)
     return {"message": "Logout realizado com sucesso"}
 
 
@@ -53,7 +69,14 @@ def logout(token: str = Depends(oauth2_scheme)):
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     if not token:
         raise HTTPException(status_code=401)
-    
+
+    if is_token_blacklisted(token):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    cached = principal_cache.get_principal(token)
+    if cached is not None:
+        return cached
+
     payload = decode_token(token)
     email = payload.get("sub")
     role = payload.get("role")
@@ -68,10 +91,20 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return TokenUser(
+    current_user = TokenUser(
         id=user.id,
         name=user.name,
         email=user.email,
         role=role,
         farm_id=user.farm_id,
-    )
\ No newline at end of file
+    )
+    principal_cache.set_principal(token, current_user, payload.get("exp"))
+    return current_user
+
+
+# dependência para rotas exclusivas de fazendeiro: farm_id já vem do token,
+# sem precisar buscar o Farmer pelo email de novo
+async def get_current_farmer(current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role != "farmer":
+        raise HTTPException(status_code=404, detail="Farmer not found")
+    return current_user
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Benchmark da blacklist de tokens sob logout contínuo.
+
+Revoga tokens com vida curta (--ttl) sem parar e mostra, a cada intervalo, quantas
+entradas o store guarda e a memória usada: com a limpeza no exp ambos ficam constantes.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_blacklist --backend memory --seconds 10 --ttl 1
+    python -m benchmarks.bench_blacklist --backend sqlite --seconds 10 --ttl 1
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from blacklist import MemoryRevocationStore, SQLiteRevocationStore
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--ttl", type=float, default=1, help="vida dos tokens revogados, em segundos")
+    args = parser.parse_args()
+
+    path = None
+    if args.backend == "memory":
+        store = MemoryRevocationStore()
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "blacklist.sqlite3")
+        store = SQLiteRevocationStore(path)
+        store.PURGE_INTERVAL = args.ttl
+
+    tracemalloc.start()
+    print(f"{'t (s)':>6} {'revoked':>10} {'entries':>8} {'memory KiB':>11} {'lookup us':>10}")
+
+    start = time.perf_counter()
+    next_report = start + 1
+    revoked = 0
+    while time.perf_counter() - start < args.seconds:
+        jti = uuid.uuid4().hex
+        store.revoke(jti, time.time() + args.ttl)
+        revoked += 1
+
+        now = time.perf_counter()
+        if now >= next_report:
+            next_report = now + 1
+            lookups = 1000
+            t0 = time.perf_counter()
+            for _ in range(lookups):
+                store.is_revoked(jti)
+            lookup_us = (time.perf_counter() - t0) / lookups * 1e6
+            memory = tracemalloc.get_traced_memory()[0] / 1024
+            if path:
+                memory += os.path.getsize(path) / 1024
+            print(f"{now - start:>6.0f} {revoked:>10} {len(store):>8} {memory:>11.0f} {lookup_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Latência de uma rota não relacionada (GET /auth/me) enquanto os dashboards de leite
+(rotas async def) são martelados. Com o driver async o p99 deve ficar próximo do
+medido com o servidor ocioso.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_event_loop --herd 500 --days 365 --concurrency 32 --seconds 10
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import insert
+
+from database import SessionLocal
+from main import app
+from milkproduction import rollup
+from milkproduction.model_milkproduction import MilkProduction
+from benchmarks.common import bench_farm, seed_sheep
+
+DASHBOARDS = [
+    "/milk-production/total-today",
+    "/milk-production/total-today-by-group",
+    "/milk-production/sum-last-7-days",
+    "/milk-production/sum-2-weeks-ago",
+    "/milk-production/daily-total-last-7-days",
+    "/milk-production/daily-by-group-last-7-days",
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def probe(ac, headers, stop_at, latencies):
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        response = await ac.get("/auth/me", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+        await asyncio.sleep(0.005)
+
+
+async def hammer(ac, headers, stop_at, counter):
+    index = 0
+    while time.perf_counter() < stop_at:
+        response = await ac.get(DASHBOARDS[index % len(DASHBOARDS)], headers=headers)
+        assert response.status_code == 200
+        counter[0] += 1
+        index += 1
+
+
+async def run(headers, concurrency, seconds):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as ac:
+        idle = []
+        await probe(ac, headers, time.perf_counter() + seconds / 2, idle)
+
+        loaded, counter = [], [0]
+        stop_at = time.perf_counter() + seconds
+        await asyncio.gather(
+            probe(ac, headers, stop_at, loaded),
+            *(hammer(ac, headers, stop_at, counter) for _ in range(concurrency))
+        )
+    return idle, loaded, counter[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--herd", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    with bench_farm("event-loop") as (client, headers, farm_id):
+        today = date.today()
+        with SessionLocal() as db:
+            sheep_ids = seed_sheep(db, farm_id, args.herd)
+            db.execute(insert(MilkProduction), [
+                {"sheep_id": sheep_id, "date": today - timedelta(days=d), "volume": 1.5}
+                for sheep_id in sheep_ids
+                for d in range(args.days)
+            ])
+            rollup.rebuild(db, farm_id=farm_id)
+            db.commit()
+
+        idle, loaded, requests = asyncio.run(run(headers, args.concurrency, args.seconds))
+
+    print(f"dashboard requests: {requests} ({requests / args.seconds:.0f}/s, concurrency {args.concurrency})")
+    print(f"{'/auth/me':>10} {'n':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, latencies in [("idle", idle), ("loaded", loaded)]:
+        print(f"{label:>10} {len(latencies):>6} {percentile(latencies, 0.5):>8.1f} {percentile(latencies, 0.99):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
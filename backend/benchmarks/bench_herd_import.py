@@ -0,0 +1,59 @@
+"""
+Benchmark do POST /sheep/import (cadastro do rebanho em lote).
+
+Gera `--size` animais em `--generations` gerações, com pai e mãe referenciados
+por chave dentro do próprio envio, e mede animais/s por tamanho de envio.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_herd_import --size 20000 --generations 10
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from database import SessionLocal
+from benchmarks.common import bench_farm, clear_farm
+
+
+def herd_csv(size, generations, rng):
+    per_generation = size // generations
+    lines = ["key,birth_date,gender,feeding_hay,feeding_feed,father_key,mother_key"]
+    previous = None
+    for generation in range(generations):
+        born = date(2000, 1, 1) + timedelta(days=365 * generation)
+        rams, ewes = [], []
+        for i in range(per_generation):
+            key = f"G{generation}-{i}"
+            gender = "Macho" if i % 2 == 0 else "Fêmea"
+            (rams if gender == "Macho" else ewes).append(key)
+            father, mother = (rng.choice(previous[0]), rng.choice(previous[1])) if previous else ("", "")
+            lines.append(f"{key},{born},{gender},1.5,1.0,{father},{mother}")
+        previous = (rams, ewes)
+    return "\n".join(lines).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--generations", type=int, default=10)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with bench_farm("herd-import") as (client, headers, farm_id):
+        print(f"{'animals':>8} {'created':>8} {'seconds':>8} {'animals/s':>10}")
+        for size in args.size:
+            body = herd_csv(size, args.generations, rng)
+            with SessionLocal() as db:
+                clear_farm(db, farm_id)
+
+            start = time.perf_counter()
+            response = client.post("/sheep/import", content=body, headers={**headers, "Content-Type": "text/csv"})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+            created = response.json()["created"]
+            print(f"{size:>8} {created:>8} {elapsed:>8.2f} {created / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark de GET /sheep/inbreeding e /sheep/kinship num registro grande.
+
+Usa o mesmo registro sintético de bench_pedigree (pais sorteados da geração
+anterior). Mede a primeira chamada (monta o pedigree da fazenda) e as seguintes
+(pedigree em cache; o cache de respostas é invalidado antes de cada uma).
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_inbreeding --size 20000 --generations 12 --rams 50
+"""
+import argparse
+import random
+import time
+
+import response_cache
+from database import SessionLocal
+from sheep import inbreeding
+from benchmarks.common import bench_farm
+from benchmarks.bench_pedigree import seed
+
+
+def timed(client, url, headers, farm_id):
+    response_cache.bump_farm(farm_id)
+    start = time.perf_counter()
+    response = client.get(url, headers=headers)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.text
+    return response.json(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--generations", type=int, default=12)
+    parser.add_argument("--rams", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with bench_farm("inbreeding") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            layers = seed(db, farm_id, args.size, args.generations, rng)
+        rams, ewes = layers[-1]
+
+        inbreeding.clear()
+        data, cold = timed(client, "/sheep/inbreeding", headers, farm_id)
+        warm = min(timed(client, "/sheep/inbreeding", headers, farm_id)[1] for _ in range(args.repeat))
+        inbred = [row["inbreeding"] for row in data if row["inbreeding"] > 0]
+        print(f"inbreeding: {len(data)} animals, {len(inbred)} inbred (max F {max(inbred, default=0):.4f})")
+        print(f"  cold (build pedigree) {cold:9.1f} ms")
+        print(f"  warm (cached)         {warm:9.1f} ms")
+
+        query = "&".join([f"rams={r}" for r in rng.sample(rams, args.rams)] + [f"ewes={e}" for e in ewes])
+        timings = [timed(client, f"/sheep/kinship?{query}", headers, farm_id)[1] for _ in range(args.repeat)]
+        print(f"kinship {args.rams} x {len(ewes)}: {min(timings):9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
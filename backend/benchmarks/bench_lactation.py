@@ -0,0 +1,124 @@
+"""
+Benchmark das curvas de lactação: ajuste do rebanho inteiro (vetorizado x um
+mínimos quadrados por ovelha), reajuste pela marca d'água (--full) e pela fila
+lactation_dirty, e GET /sheep/lactation-ranking.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_lactation --herd 800 --days 300
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import delete, insert
+
+import response_cache
+from database import SessionLocal
+from milkproduction import lactation
+from milkproduction.model_lactation import LactationCurve
+from milkproduction.model_milkproduction import MilkProduction
+from benchmarks.common import bench_farm, seed_sheep
+
+
+def seed(db, farm_id, size, days, rng):
+    # curvas de Wood com parâmetros e ruído aleatórios, terminando hoje
+    sheep_ids = seed_sheep(db, farm_id, size)
+    first = date.today() - timedelta(days=days - 1)
+    t = np.arange(1, days + 1)
+    rows = []
+    for sheep_id in sheep_ids:
+        a, b, c = rng.uniform(0.8, 1.6), rng.uniform(0.1, 0.35), rng.uniform(0.003, 0.01)
+        volumes = a * t ** b * np.exp(-c * t) * np.exp(rng.normal(0, 0.08, days))
+        rows.extend({"sheep_id": sheep_id, "date": first + timedelta(days=d), "volume": round(float(v), 2)}
+                    for d, v in enumerate(volumes))
+    db.execute(insert(MilkProduction), rows)
+    db.commit()
+    return sheep_ids
+
+
+def fit_loop(sheep_ids, days, volumes):
+    # referência: um lstsq por ovelha (sem o corte por intervalo)
+    result = {}
+    for sheep_id in np.unique(sheep_ids):
+        mask = sheep_ids == sheep_id
+        t = (days[mask] - days[mask].min() + 1).astype(np.float64)
+        design = np.stack([np.ones_like(t), np.log(t), -t], axis=1)
+        result[sheep_id] = np.linalg.lstsq(design, np.log(volumes[mask]), rcond=None)[0]
+    return result
+
+
+def best(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        value = function()
+        timings.append(time.perf_counter() - began)
+    return min(timings) * 1000, value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--herd", type=int, default=800)
+    parser.add_argument("--days", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(7)
+
+    with bench_farm("lactation") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            sheep_ids = seed(db, farm_id, args.herd, args.days, rng)
+        print(f"{args.herd} ewes x {args.days} days = {args.herd * args.days} records")
+
+        arrays = (
+            np.repeat(np.array(sheep_ids, dtype=np.int64), args.days),
+            np.tile(np.arange(args.days, dtype=np.int64), args.herd),
+            np.exp(rng.normal(0, 0.1, args.herd * args.days)),
+        )
+        ms, _ = best(lambda: lactation.fit(*arrays), args.repeat)
+        print(f"{'fit (vectorized)':<28} {ms:>9.1f} ms")
+        ms, _ = best(lambda: fit_loop(*arrays), 1)
+        print(f"{'fit (lstsq per ewe)':<28} {ms:>9.1f} ms")
+
+        def full():
+            with SessionLocal() as db:
+                db.execute(delete(LactationCurve).where(LactationCurve.sheep_id.in_(sheep_ids)))
+                count = lactation.refresh(db, farm_id, full=True)
+                db.commit()
+                return count
+
+        ms, count = best(full, args.repeat)
+        print(f"{'refresh (all ' + str(count) + ')':<28} {ms:>9.1f} ms")
+
+        def unchanged():
+            with SessionLocal() as db:
+                return lactation.refresh(db, farm_id, full=True)
+
+        ms, count = best(unchanged, args.repeat)
+        print(f"{'refresh --full (' + str(count) + ' changed)':<28} {ms:>9.1f} ms")
+
+        changed = sheep_ids[:10]
+        with SessionLocal() as db:
+            db.execute(insert(MilkProduction), [
+                {"sheep_id": sheep_id, "date": date.today() + timedelta(days=1), "volume": 1.0}
+                for sheep_id in changed
+            ])
+            lactation.mark(db, changed)  # como as rotas de escrita
+            db.commit()
+            began = time.perf_counter()
+            count = lactation.refresh(db, farm_id)
+            db.commit()
+            print(f"{'refresh queue (' + str(count) + ' marked)':<28} {(time.perf_counter() - began) * 1000:>9.1f} ms")
+
+        def ranking():
+            response_cache.bump_farm(farm_id)
+            response = client.get("/sheep/lactation-ranking?by=persistency&limit=50", headers=headers)
+            assert response.status_code == 200, response.text
+            return response
+
+        ms, _ = best(ranking, args.repeat)
+        print(f"{'GET lactation-ranking':<28} {ms:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
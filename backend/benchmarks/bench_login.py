@@ -0,0 +1,69 @@
+"""
+Teste de carga do POST /auth/login: vazão de logins simultâneos e latência de uma
+rota barata (GET /auth/me) durante o pico de logins.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    BCRYPT_ROUNDS=10 PASSWORD_HASH_WORKERS=2 python -m benchmarks.bench_login --logins 64 --concurrency 16
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from httpx import AsyncClient, ASGITransport
+
+from main import app
+from utils import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+from benchmarks.common import bench_farm, PASSWORD
+
+
+async def run(email, headers, logins, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as ac:
+        async def login():
+            async with semaphore:
+                response = await ac.post("/auth/login", json={"email": email, "password": PASSWORD})
+                assert response.status_code == 200
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await ac.get("/auth/me", headers=headers)
+                probe_latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    return elapsed, probe_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    with bench_farm("login") as (client, headers, farm_id):
+        email = "login@bench.com"
+        elapsed, probes = asyncio.run(run(email, headers, args.logins, args.concurrency))
+
+    probes.sort()
+    p95 = probes[int(len(probes) * 0.95) - 1] if len(probes) >= 20 else probes[-1]
+    print(f"bcrypt rounds={BCRYPT_ROUNDS} workers={PASSWORD_HASH_WORKERS}")
+    print(f"logins={args.logins} concurrency={args.concurrency} time={elapsed:.2f}s "
+          f"throughput={args.logins / elapsed:.1f} logins/s")
+    print(f"/auth/me during burst: n={len(probes)} p50={statistics.median(probes) * 1000:.1f}ms "
+          f"p95={p95 * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
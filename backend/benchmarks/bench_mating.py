@@ -0,0 +1,61 @@
+"""
+Benchmark de POST /sheep/mating-plan: um grupo de ovelhas x carneiros candidatos
+num registro grande (mesmo registro sintético de bench_pedigree).
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_mating --size 20000 --ewes 600 --rams 20
+"""
+import argparse
+import random
+import time
+
+from database import SessionLocal
+from sheep import inbreeding
+from sheep.model_sheep import Sheep
+from sheepgroup.model_sheepgroup import SheepGroup
+from benchmarks.common import bench_farm
+from benchmarks.bench_pedigree import seed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--generations", type=int, default=12)
+    parser.add_argument("--ewes", type=int, default=600)
+    parser.add_argument("--rams", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with bench_farm("mating") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            layers = seed(db, farm_id, args.size, args.generations, rng)
+            group = SheepGroup(name="Bench mating", farm_id=farm_id)
+            db.add(group)
+            db.flush()
+            # ovelhas e carneiros das duas últimas gerações (aparentados entre si)
+            ewes = rng.sample(layers[-1][1] + layers[-2][1], args.ewes)
+            rams = rng.sample(layers[-1][0] + layers[-2][0], args.rams)
+            db.query(Sheep).filter(Sheep.id.in_(ewes)).update({"group_id": group.id})
+            db.commit()
+            group_id = group.id
+
+        payload = {"group_id": group_id, "ram_ids": rams}
+        timings = []
+        for attempt in range(args.repeat + 1):
+            if attempt == 0:
+                inbreeding.clear()
+            start = time.perf_counter()
+            response = client.post("/sheep/mating-plan", json=payload, headers=headers)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+
+        data = response.json()
+        print(f"{args.ewes} ewes x {args.rams} rams, unassigned {data['unassigned']}, "
+              f"mean expected F {data['mean_expected_inbreeding']:.4f}")
+        print(f"  cold (build pedigree) {timings[0]:9.1f} ms")
+        print(f"  warm (cached)         {min(timings[1:]):9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
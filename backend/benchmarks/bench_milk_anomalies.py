@@ -0,0 +1,93 @@
+"""
+Benchmark do detector de quedas de produção: custo de `anomalies.record` numa
+ordenha inteira enviada em lote (O(1) por registro) x recalcular a partir do
+histórico, POST /milk-production/bulk e GET /milk-production/anomalies.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_milk_anomalies --herd 5000 --days 60
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+import response_cache
+from database import SessionLocal
+from milkproduction import anomalies
+from milkproduction.model_milkproduction import MilkProduction
+from benchmarks.common import bench_farm, seed_sheep
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--herd", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(3)
+    today = date.today()
+    first = today - timedelta(days=args.days + args.repeat + 1)
+
+    with bench_farm("milk-anomalies") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            sheep_ids = seed_sheep(db, farm_id, args.herd)
+            db.execute(insert(MilkProduction), [
+                {"sheep_id": sheep_id, "date": first + timedelta(days=d), "volume": round(float(volume), 2)}
+                for sheep_id in sheep_ids
+                for d, volume in enumerate(rng.normal(2.0, 0.1, args.days))
+            ])
+            db.commit()
+
+            began = time.perf_counter()
+            anomalies.rebuild(db, farm_id)
+            db.commit()
+        print(f"{args.herd} sheep x {args.days} days")
+        print(f"{'rebuild from history':<32} {(time.perf_counter() - began) * 1000:>9.1f} ms")
+
+        def session(day):
+            volumes = rng.normal(2.0, 0.1, args.herd)
+            volumes[rng.random(args.herd) < 0.01] = 0.5  # ~1% de quedas
+            return [(sheep_id, day, round(float(volume), 2)) for sheep_id, volume in zip(sheep_ids, volumes)]
+
+        day = first + timedelta(days=args.days)
+        timings = {"record (incremental)": [], "replay from history": [], "POST /bulk": []}
+        for _ in range(args.repeat):
+            rows = session(day)
+            with SessionLocal() as db:
+                db.execute(insert(MilkProduction), [
+                    {"sheep_id": sheep_id, "date": row_day, "volume": volume} for sheep_id, row_day, volume in rows
+                ])
+                began = time.perf_counter()
+                anomalies.record(db, rows)
+                timings["record (incremental)"].append(time.perf_counter() - began)
+                began = time.perf_counter()
+                anomalies._replay(db, sorted(sheep_ids))
+                timings["replay from history"].append(time.perf_counter() - began)
+                db.commit()
+            day += timedelta(days=1)
+
+            body = [{"sheep_id": sheep_id, "date": str(day), "volume": volume} for sheep_id, _, volume in session(day)]
+            began = time.perf_counter()
+            response = client.post("/milk-production/bulk", json=body, headers=headers)
+            timings["POST /bulk"].append(time.perf_counter() - began)
+            assert response.status_code == 200, response.text
+            day += timedelta(days=1)
+
+        for name, values in timings.items():
+            print(f"{name + ' (' + str(args.herd) + ' rows)':<32} {min(values) * 1000:>9.1f} ms")
+
+        listing = []
+        for _ in range(args.repeat):
+            response_cache.bump_farm(farm_id)
+            began = time.perf_counter()
+            response = client.get(f"/milk-production/anomalies?days={args.days + 2 * args.repeat + 2}",
+                                  headers=headers)
+            listing.append(time.perf_counter() - began)
+            assert response.status_code == 200, response.text
+        print(f"{'GET /anomalies (' + str(len(response.json())) + ' flagged)':<32} {min(listing) * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark do POST /milk-production/bulk (sessões de ordenha em lote).
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_milk_bulk --herd 800 --sessions 30
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from database import SessionLocal
+from benchmarks.common import bench_farm, seed_sheep
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--herd", type=int, default=800, help="ovelhas por sessão de ordenha")
+    parser.add_argument("--sessions", type=int, default=30, help="número de dias enviados")
+    parser.add_argument("--days-per-request", type=int, default=10)
+    parser.add_argument("--csv", action="store_true", help="envia text/csv em vez de JSON")
+    args = parser.parse_args()
+
+    with bench_farm("milk-bulk") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            sheep_ids = seed_sheep(db, farm_id, args.herd)
+            db.commit()
+
+        first_day = date.today() - timedelta(days=args.sessions)
+        days = [first_day + timedelta(days=d) for d in range(args.sessions)]
+
+        total_rows = 0
+        elapsed = 0.0
+        for offset in range(0, len(days), args.days_per_request):
+            chunk = days[offset:offset + args.days_per_request]
+            rows = [
+                {"sheep_id": sheep_id, "date": str(day), "volume": 1.0 + (sheep_id % 7) / 10}
+                for day in chunk
+                for sheep_id in sheep_ids
+            ]
+            if args.csv:
+                body = "sheep_id,date,volume\n" + "\n".join(f"{r['sheep_id']},{r['date']},{r['volume']}" for r in rows)
+                kwargs = {"content": body.encode(), "headers": {**headers, "Content-Type": "text/csv"}}
+            else:
+                kwargs = {"json": rows, "headers": headers}
+
+            start = time.perf_counter()
+            response = client.post("/milk-production/bulk", **kwargs)
+            elapsed += time.perf_counter() - start
+            assert response.status_code == 200, response.text
+            assert response.json()["created"] == len(rows)
+            total_rows += len(rows)
+
+        print(f"rows={total_rows} requests={-(-len(days) // args.days_per_request)} "
+              f"time={elapsed:.2f}s throughput={total_rows / elapsed:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
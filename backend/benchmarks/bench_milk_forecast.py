@@ -0,0 +1,151 @@
+"""
+Benchmark da previsão de produção.
+
+1. Backtest (só NumPy) sobre muitas fazendas sintéticas: séries diárias por
+   grupo com nível, tendência de lactação, padrão semanal e ruído; o modelo é
+   ajustado nos HISTORY_DAYS dias anteriores à origem e comparado com o real
+   nos 7/14/30 dias seguintes, junto de duas referências (repetir a última
+   semana e média dos últimos 7 dias). Métrica: WAPE (soma |erro| / soma real).
+2. Banco: refresh de uma fazenda com muitos grupos e GET /milk-production/forecast
+   frio (ajuste sob demanda) e em cache.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_milk_forecast --farms 2000 --groups 40
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+import response_cache
+from database import SessionLocal
+from milkproduction import forecast
+from milkproduction.model_milkdaily import MilkDailyFarmGroup
+from sheepgroup.model_sheepgroup import SheepGroup
+from benchmarks.common import bench_farm
+
+HORIZONS = (7, 14, 30)
+
+
+def synthetic(rng, farms, length):
+    """Séries por grupo x dias e a fazenda de cada grupo; alguns grupos começam tarde (histórico curto)."""
+    series, owners = [], []
+    t = np.arange(length)
+    for farm in range(farms):
+        for _ in range(rng.integers(1, 6)):
+            level = rng.uniform(5, 80)
+            trend = rng.uniform(-0.004, 0.002) * level  # litros/dia
+            weekly = rng.normal(0, 0.04, 7) * level
+            noise = rng.normal(0, rng.uniform(0.02, 0.10) * level, length)
+            values = np.maximum(level + trend * t + weekly[t % 7] + noise, 0)
+            if rng.random() < 0.1:
+                # grupo formado recentemente: 5 a 40 dias de histórico
+                values[: forecast.HISTORY_DAYS - rng.integers(5, 41)] = 0
+            series.append(values)
+            owners.append(farm)
+    return np.array(series), np.array(owners)
+
+
+def wape(prediction, actual):
+    return np.abs(prediction - actual).sum() / actual.sum()
+
+
+def baselines(history):
+    last_week = history[:, -7:]
+    naive = np.tile(last_week, (1, forecast.FORECAST_HORIZON // 7 + 1))[:, :forecast.FORECAST_HORIZON]
+    mean = np.repeat(last_week.mean(axis=1, keepdims=True), forecast.FORECAST_HORIZON, axis=1)
+    return naive, mean
+
+
+def backtest(rng, farms, repeat):
+    origin = date(2024, 3, 31)
+    length = forecast.HISTORY_DAYS + forecast.FORECAST_HORIZON
+    data, owners = synthetic(rng, farms, length)
+    history, actual = data[:, :forecast.HISTORY_DAYS], data[:, forecast.HISTORY_DAYS:]
+    recorded = history != 0
+    first = np.where(recorded.any(axis=1), recorded.argmax(axis=1), forecast.HISTORY_DAYS)
+    observed = np.arange(forecast.HISTORY_DAYS)[None, :] >= first[:, None]
+
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        prediction, spread, _ = forecast.fit(history, observed, origin)
+        farm_prediction, farm_spread = forecast.totals(owners, prediction, spread, farms)
+        timings.append(time.perf_counter() - began)
+    print(f"backtest: {farms} farms, {len(data)} groups, fit {min(timings) * 1000:.1f} ms "
+          f"({min(timings) / len(data) * 1e6:.1f} us/group)")
+
+    farm_history = np.zeros((farms, history.shape[1]))
+    farm_actual = np.zeros((farms, actual.shape[1]))
+    np.add.at(farm_history, owners, history)
+    np.add.at(farm_actual, owners, actual)
+    for label, series_prediction, series_spread, series_history, series_actual in (
+        ("groups", prediction, spread, history, actual),
+        ("farm totals", farm_prediction, farm_spread, farm_history, farm_actual),
+    ):
+        naive, mean = baselines(series_history)
+        lower = np.maximum(series_prediction - series_spread, 0)
+        covered = ((series_actual >= lower) & (series_actual <= series_prediction + series_spread)).mean()
+        print(f"{label}: 95% interval coverage {covered:.1%}")
+        print(f"{'WAPE':>8} {'model':>8} {'naive-7':>8} {'mean-7':>8}")
+        for horizon in HORIZONS:
+            print(f"{str(horizon) + 'd':>8} "
+                  f"{wape(series_prediction[:, :horizon], series_actual[:, :horizon]):>8.2%} "
+                  f"{wape(naive[:, :horizon], series_actual[:, :horizon]):>8.2%} "
+                  f"{wape(mean[:, :horizon], series_actual[:, :horizon]):>8.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--farms", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=40, help="grupos da fazenda usada no teste com o banco")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(11)
+
+    backtest(rng, args.farms, args.repeat)
+
+    with bench_farm("milk-forecast") as (client, headers, farm_id):
+        origin = date.today() - timedelta(days=1)
+        with SessionLocal() as db:
+            group_ids = db.execute(
+                insert(SheepGroup).returning(SheepGroup.id),
+                [{"name": f"G{i}", "farm_id": farm_id} for i in range(args.groups)],
+            ).scalars().all()
+            db.execute(insert(MilkDailyFarmGroup), [
+                {"farm_id": farm_id, "group_id": group_id, "date": origin - timedelta(days=d),
+                 "total": float(rng.uniform(10, 50)), "count": 10}
+                for group_id in group_ids
+                for d in range(forecast.HISTORY_DAYS)
+            ])
+            db.commit()
+
+            timings = []
+            for _ in range(args.repeat):
+                began = time.perf_counter()
+                forecast.refresh(db, farm_id)
+                db.commit()
+                timings.append(time.perf_counter() - began)
+        print(f"{'refresh (' + str(args.groups + 1) + ' series)':<28} {min(timings) * 1000:>9.1f} ms")
+
+        def get(cold):
+            if cold:
+                with SessionLocal() as db:
+                    forecast.refresh(db, farm_id, origin - timedelta(days=1))  # previsão de ontem: obsoleta
+                    db.commit()
+            response_cache.bump_farm(farm_id)
+            began = time.perf_counter()
+            response = client.get("/milk-production/forecast?days=30&group_by=group", headers=headers)
+            elapsed = time.perf_counter() - began
+            assert response.status_code == 200, response.text
+            return elapsed
+
+        # no TestClient a tarefa em segundo plano roda antes de client.get voltar: o tempo "stale" inclui o reajuste
+        for label, cold in (("GET /forecast (stale, refit)", True), ("GET /forecast (cached)", False)):
+            print(f"{label:<28} {min(get(cold) for _ in range(args.repeat)) * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark do ranking de produção: GET /milk-production/ranking (janela,
+percentis e quantis no banco) x GET /sheep/ com o rebanho inteiro ordenado no
+cliente, como o frontend fazia.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_milk_ranking --herd 50000 --days 30
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+import response_cache
+from database import SessionLocal
+from benchmarks.common import bench_farm, seed_sheep
+
+
+def best(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        value = function()
+        timings.append(time.perf_counter() - began)
+    return min(timings) * 1000, value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--herd", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with bench_farm("milk-ranking") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            sheep_ids = seed_sheep(db, farm_id, args.herd)
+            # registros gerados no próprio banco: volume por ovelha + ruído diário
+            db.execute(text(
+                """
+                INSERT INTO milk_production_individual (sheep_id, date, volume)
+                SELECT s.id, CAST(:end AS date) - d, round((1 + (s.id % 97) / 40.0 + random() * 0.3)::numeric, 2)
+                FROM sheep s CROSS JOIN generate_series(0, :days - 1) AS d
+                WHERE s.farm_id = :farm_id
+                """
+            ), {"end": date.today(), "days": args.days, "farm_id": farm_id})
+            db.commit()
+        print(f"{len(sheep_ids)} ewes x {args.days} days = {len(sheep_ids) * args.days} records")
+
+        def get(url):
+            response_cache.bump_farm(farm_id)
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200, response.text
+            return response
+
+        start = date.today() - timedelta(days=args.days - 1)
+        for label, url in (
+            ("GET /ranking top 50", f"/milk-production/ranking?from={start}&limit=50&buckets=10"),
+            ("GET /ranking bottom 50 avg", f"/milk-production/ranking?from={start}&limit=50&order=bottom&metric=average"),
+            ("GET /ranking last 7 days", "/milk-production/ranking?to=" + str(date.today()) + "&from="
+             + str(date.today() - timedelta(days=6)) + "&limit=50"),
+        ):
+            ms, response = best(lambda: get(url), args.repeat)
+            print(f"{label:<30} {ms:>9.1f} ms {len(response.content) / 1024:>9.1f} KiB")
+
+        def full_herd():
+            sheep = get("/sheep/").json()
+            return sorted(sheep, key=lambda row: row.get("milk_production") or 0, reverse=True)[:50]
+
+        ms, _ = best(full_herd, args.repeat)
+        size = len(get("/sheep/").content)
+        print(f"{'GET /sheep/ + sort in client':<30} {ms:>9.1f} ms {size / 1024:>9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
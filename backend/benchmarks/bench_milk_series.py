@@ -0,0 +1,50 @@
+"""
+Benchmark do GET /milk-production/series: um ano de produção por agrupamento.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_milk_series --herd 800 --days 365
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import response_cache
+from database import SessionLocal
+from milkproduction import rollup
+from benchmarks.common import bench_farm
+from benchmarks.bench_sheep_list import seed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--herd", type=int, default=800)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with bench_farm("milk-series") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            seed(db, farm_id, args.herd, args.days)
+            rollup.rebuild(db, farm_id=farm_id)
+            db.commit()
+
+        start = date.today() - timedelta(days=args.days - 1)
+        print(f"{'group_by':>11} {'granularity':>11} {'series':>7} {'buckets':>8} {'KB':>7} {'ms (best)':>10}")
+        for group_by in ("farm", "group", "gender", "birth_year", "sheep"):
+            for granularity in ("day", "week", "month"):
+                url = f"/milk-production/series?from={start}&granularity={granularity}&group_by={group_by}"
+                timings = []
+                for _ in range(args.repeat):
+                    # mede a consulta, não o cache de respostas
+                    response_cache.bump_farm(farm_id)
+                    began = time.perf_counter()
+                    response = client.get(url, headers=headers)
+                    timings.append(time.perf_counter() - began)
+                    assert response.status_code == 200, response.text
+                data = response.json()
+                print(f"{group_by:>11} {granularity:>11} {len(data['series']):>7} {len(data['buckets']):>8} "
+                      f"{len(response.content) / 1024:>7.1f} {min(timings) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark de GET /sheep/{id}/ancestors e /descendants num registro grande.
+
+Gera `--size` animais em `--generations` gerações; cada animal (fora a primeira
+geração) recebe um pai e uma mãe sorteados da geração anterior.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_pedigree --size 20000 --generations 12 --depth 10
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import insert, text
+
+import response_cache
+from database import SessionLocal
+from sheep.model_sheepparentage import SheepParentage
+from benchmarks.common import bench_farm, seed_sheep
+
+
+def seed(db, farm_id, size, generations, rng):
+    per_generation = size // generations
+    layers = []
+    for _ in range(generations):
+        rams = seed_sheep(db, farm_id, per_generation // 2, gender="Macho")
+        ewes = seed_sheep(db, farm_id, per_generation - len(rams))
+        layers.append((rams, ewes))
+
+    rows = []
+    for (rams, ewes), (parent_rams, parent_ewes) in zip(layers[1:], layers):
+        for offspring in rams + ewes:
+            rows.append({"parent_id": rng.choice(parent_rams), "offspring_id": offspring})
+            rows.append({"parent_id": rng.choice(parent_ewes), "offspring_id": offspring})
+    db.execute(insert(SheepParentage), rows)
+    db.commit()
+    # estatísticas atualizadas como estariam num registro em produção (autovacuum)
+    db.execute(text("ANALYZE sheep"))
+    db.execute(text("ANALYZE sheep_parentage"))
+    db.commit()
+    return layers
+
+
+def timed(client, url, headers, farm_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        # invalida o cache de respostas: mede a consulta em si
+        response_cache.bump_farm(farm_id)
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return response.json(), min(timings) * 1000, sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--generations", type=int, default=12)
+    parser.add_argument("--depth", type=int, nargs="+", default=[3, 6, 10, 12])
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with bench_farm("pedigree") as (client, headers, farm_id):
+        with SessionLocal() as db:
+            layers = seed(db, farm_id, args.size, args.generations, rng)
+        youngest = layers[-1][0] + layers[-1][1]
+        oldest = layers[0][0] + layers[0][1]
+
+        print(f"{'direction':>12} {'depth':>6} {'nodes':>7} {'edges':>7} {'ms (best)':>10} {'ms (p50)':>9}")
+        for direction, roots in (("ancestors", youngest), ("descendants", oldest)):
+            for depth in args.depth:
+                for root in rng.sample(roots, args.samples):
+                    data, best, median = timed(client, f"/sheep/{root}/{direction}?depth={depth}", headers,
+                                               farm_id, args.repeat)
+                    print(f"{direction:>12} {depth:>6} {len(data['nodes']):>7} {len(data['edges']):>7} "
+                          f"{best:>10.2f} {median:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
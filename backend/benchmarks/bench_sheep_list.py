@@ -0,0 +1,65 @@
+"""
+Benchmark do GET /sheep/: número de queries e tempo de resposta por tamanho do rebanho.
+
+Uso (a partir de backend/, com DATABASE_URL apontando para uma base de testes):
+    python -m benchmarks.bench_sheep_list --sizes 100 1000 3000 --days 365
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event, insert
+
+from database import SessionLocal, engine
+from milkproduction.model_milkproduction import MilkProduction
+from benchmarks.common import bench_farm, seed_sheep, clear_farm
+
+
+def seed(db, farm_id, size, days):
+    today = date.today()
+    sheep_ids = seed_sheep(db, farm_id, size)
+    db.execute(
+        insert(MilkProduction),
+        [
+            {"sheep_id": sheep_id, "date": today - timedelta(days=d), "volume": 1.5}
+            for sheep_id in sheep_ids
+            for d in range(days)
+        ],
+    )
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with bench_farm("sheep-list") as (client, headers, farm_id):
+        print(f"{'herd':>8} {'records':>10} {'queries':>8} {'ms (best)':>10}")
+        for size in args.sizes:
+            with SessionLocal() as db:
+                clear_farm(db, farm_id)
+                seed(db, farm_id, size, args.days)
+
+            timings = []
+            for _ in range(args.repeat):
+                statements.clear()
+                event.listen(engine, "before_cursor_execute", count_statement)
+                start = time.perf_counter()
+                response = client.get("/sheep/", headers=headers)
+                timings.append(time.perf_counter() - start)
+                event.remove(engine, "before_cursor_execute", count_statement)
+                assert response.status_code == 200 and len(response.json()) == size
+
+            print(f"{size:>8} {size * args.days:>10} {len(statements):>8} {min(timings) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
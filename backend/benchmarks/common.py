@@ -0,0 +1,63 @@
+"""Utilitários compartilhados pelos benchmarks: fazenda descartável, login e limpeza."""
+from contextlib import contextmanager
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, delete, text
+
+from database import SessionLocal
+from main import app
+from farm.model_farm import Farm
+from farmer.model_farmer import Farmer
+from sheep.model_sheep import Sheep
+from sheepgroup.model_sheepgroup import SheepGroup
+from milkproduction.model_milkproduction import MilkProduction
+from utils import hash_password
+
+PASSWORD = "bench123"
+
+
+def seed_sheep(db, farm_id, size, gender="Fêmea"):
+    return db.execute(
+        insert(Sheep).returning(Sheep.id),
+        [
+            {"birth_date": date(2022, 1, 1), "farm_id": farm_id, "feeding_hay": 1.0,
+             "feeding_feed": 1.0, "gender": gender}
+            for _ in range(size)
+        ],
+    ).scalars().all()
+
+
+def clear_farm(db, farm_id):
+    sheep_ids = db.query(Sheep.id).filter(Sheep.farm_id == farm_id)
+    db.execute(delete(MilkProduction).where(MilkProduction.sheep_id.in_(sheep_ids)))
+    db.execute(text("DELETE FROM sheep_parentage WHERE offspring_id IN (SELECT id FROM sheep WHERE farm_id = :f)"),
+               {"f": farm_id})
+    db.execute(delete(Sheep).where(Sheep.farm_id == farm_id))
+    db.execute(delete(SheepGroup).where(SheepGroup.farm_id == farm_id))
+    db.commit()
+
+
+@contextmanager
+def bench_farm(name):
+    """Cria fazenda + fazendeiro temporários e devolve (client, headers, farm_id)."""
+    email = f"{name}@bench.com"
+    with SessionLocal() as db:
+        farm = Farm(name=f"Bench {name}", location="bench")
+        db.add(farm)
+        db.flush()
+        farmer = Farmer(name="Bench", email=email, password=hash_password(PASSWORD), farm_id=farm.id)
+        db.add(farmer)
+        db.commit()
+        farm_id, farmer_id = farm.id, farmer.id
+
+    client = TestClient(app)
+    try:
+        token = client.post("/auth/login", json={"email": email, "password": PASSWORD}).json()["access_token"]
+        yield client, {"Authorization": f"Bearer {token}"}, farm_id
+    finally:
+        with SessionLocal() as db:
+            clear_farm(db, farm_id)
+            db.query(Farmer).filter(Farmer.id == farmer_id).delete()
+            db.query(Farm).filter(Farm.id == farm_id).delete()
+            db.commit()
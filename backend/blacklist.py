@@ -1,11 +1,115 @@
+import heapq
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
 
-from typing import Set
+from jose import jwt, JWTError
 
-# Conjunto em memória (em produção use Redis ou DB)
-blacklisted_tokens: Set[str] = set()
+# Tokens revogados (logout), indexados pelo jti e guardados só até o exp do token.
+# TOKEN_BLACKLIST_BACKEND=memory  -> por processo (padrão, um worker)
+# TOKEN_BLACKLIST_BACKEND=sqlite  -> arquivo compartilhado entre workers (TOKEN_BLACKLIST_PATH)
+
+
+class MemoryRevocationStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked: Dict[str, float] = {}        # jti -> exp
+        self._expiry: List[Tuple[float, str]] = []  # heap (exp, jti) para a limpeza
+
+    def revoke(self, jti: str, exp: float):
+        with self._lock:
+            self._purge(time.time())
+            if exp > self._revoked.get(jti, 0):
+                self._revoked[jti] = exp
+                heapq.heappush(self._expiry, (exp, jti))
+
+    def is_revoked(self, jti: str) -> bool:
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time.time()
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def _purge(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            exp, jti = heapq.heappop(self._expiry)
+            if self._revoked.get(jti) == exp:
+                del self._revoked[jti]
+
+
+class SQLiteRevocationStore:
+    PURGE_INTERVAL = 60  # segundos entre limpezas dos expirados
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0.0
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS revoked_token (jti TEXT PRIMARY KEY, exp REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_revoked_token_exp ON revoked_token (exp)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # uma conexão por thread (rotas sync rodam no threadpool)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def revoke(self, jti: str, exp: float):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO revoked_token (jti, exp) VALUES (?, ?) "
+                "ON CONFLICT (jti) DO UPDATE SET exp = MAX(exp, excluded.exp)",
+                (jti, exp)
+            )
+            if now >= self._next_purge:
+                self._next_purge = now + self.PURGE_INTERVAL
+                conn.execute("DELETE FROM revoked_token WHERE exp <= ?", (now,))
+
+    def is_revoked(self, jti: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM revoked_token WHERE jti = ? AND exp > ?", (jti, time.time())
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._connection().execute("SELECT count(*) FROM revoked_token").fetchone()[0]
+
+
+def create_store():
+    backend = os.getenv("TOKEN_BLACKLIST_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryRevocationStore()
+    if backend == "sqlite":
+        return SQLiteRevocationStore(os.getenv("TOKEN_BLACKLIST_PATH", "token_blacklist.sqlite3"))
+    raise RuntimeError(f"Unknown TOKEN_BLACKLIST_BACKEND: {backend}")
+
+
+store = create_store()
+
+
+def _token_key(claims: dict, token: str) -> str:
+    # tokens emitidos antes do jti existir caem no hash do próprio token
+    return claims.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+def add_token_to_blacklist(token: str, claims: dict):
+    # claims já validadas (decode_token) pelo chamador
+    store.revoke(_token_key(claims, token), float(claims["exp"]))
 
-def add_token_to_blacklist(token: str):
-    blacklisted_tokens.add(token)
 
 def is_token_blacklisted(token: str) -> bool:
-    return token in blacklisted_tokens
+    # sem verificar assinatura: só precisamos da chave; a validação é feita em decode_token
+    try:
+        claims = jwt.get_unverified_claims(token)
+    except JWTError:
+        return False
+    return store.is_revoked(_token_key(claims, token))
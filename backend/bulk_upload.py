@@ -0,0 +1,108 @@
+import codecs
+import csv
+import json
+from collections import deque
+
+from fastapi import HTTPException, Request
+
+# Leitura dos corpos das rotas de envio em lote:
+#   text/csv              -> cabeçalho + linhas, lido em streaming
+#   application/x-ndjson  -> um objeto JSON por linha, lido em streaming
+#   JSON (padrão)         -> array de objetos
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
+
+async def read_lines(request: Request):
+    # lê o corpo linha a linha (com o "\n" final), sem juntar o corpo inteiro
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+class _LineFeed:
+    # iterador de linhas alimentado aos poucos: um único csv.reader lê dele,
+    # e só quando o buffer tem um registro completo
+    def __init__(self):
+        self.pending = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+        return self.pending.popleft()
+
+
+async def read_csv_records(request: Request):
+    """
+    Registros CSV do corpo, em streaming. Campos entre aspas podem ter quebras
+    de linha (e \r\n): as linhas se acumulam enquanto há uma aspa aberta, ou
+    seja, número ímpar de aspas, já que aspas escapadas vêm em pares.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    quotes = 0
+    try:
+        async for line in read_lines(request):
+            feed.pending.append(line)
+            quotes += line.count('"')
+            if quotes % 2:
+                continue
+            quotes = 0
+            yield next(reader)
+        if feed.pending:
+            # aspa sem fechamento no fim do corpo
+            next(reader)
+            raise csv.Error("unexpected end of data")
+    except csv.Error as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV on line {reader.line_num}: {exc}")
+
+
+async def read_bulk_rows(request: Request, max_rows: int) -> list:
+    """
+    Linhas do corpo como dicts. Para CSV/NDJSON a leitura para em max_rows + 1
+    linhas: o chamador responde 413 quando len(rows) > max_rows.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("text/csv"):
+        rows = []
+        header = None
+        async for values in read_csv_records(request):
+            if not values or (len(values) == 1 and not values[0].strip()):
+                continue
+            if header is None:
+                header = [h.strip() for h in values]
+                continue
+            rows.append(dict(zip(header, values)))
+            if len(rows) > max_rows:
+                break
+        return rows
+
+    if content_type.startswith(NDJSON_TYPES):
+        rows = []
+        async for line in read_lines(request):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {len(rows) + 1}")
+            if len(rows) > max_rows:
+                break
+        return rows
+
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array, NDJSON or text/csv")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array, NDJSON or text/csv")
+    return rows
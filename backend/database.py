@@ -2,18 +2,270 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 # load the URL from the .env file
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# connection pool settings (per engine, i.e. per uvicorn worker)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))  # 10 + 30 = threadpool de 40 threads
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# PgBouncer em transaction pooling: sem prepared statements nomeados no servidor
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# read replicas for the analytics endpoints (comma-separated URLs; empty = primary only)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))  # segundos
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+# depois de escrever, o mesmo token lê do primário por esse tempo (read-your-writes)
+DB_READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "10"))
+
+
+class PoolStats:
+    """Contadores de uso do pool expostos em /health/db."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_max = 0
+
+    def record(self, waited: float, overflow: int, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.overflow_max = max(self.overflow_max, overflow)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "overflow_max": self.overflow_max,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / max(self.checkouts, 1) * 1000, 3),
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class _InstrumentedPool:
+    # mede quanto tempo cada checkout esperou por uma conexão livre
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - start, self.overflow(), timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start, self.overflow())
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options(url, poolclass) -> dict:
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
 # create the engine to connect to the database
-engine = create_engine(DATABASE_URL)
+# (psycopg2 never uses server-side prepared statements, so it is PgBouncer-safe as is)
+engine = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL, InstrumentedQueuePool))
 
 # how to talk to the DB in the routes
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async driver for the `async def` routes (only Postgres is supported: the schema
+# and the queries use ON CONFLICT, unnest, COPY, advisory locks and ARRAY columns)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg"}
+
+
+def _async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# one async engine per event loop: asyncpg connections are bound to the loop
+# that opened them (uvicorn has one per worker; pytest-asyncio one per test)
+_async_engines = weakref.WeakKeyDictionary()
+
+
+def _float4_as_text(dbapi_connection, connection_record):
+    # asyncpg decodes `real` in binary (4.8 -> 4.800000190734863); read it as text
+    # so the async routes return the same values as psycopg2
+    dbapi_connection.run_async(
+        lambda conn: conn.set_type_codec(
+            "float4", encoder=str, decoder=float, schema="pg_catalog", format="text"
+        )
+    )
+
+
+def _async_engine_options(url) -> dict:
+    options = _pool_options(url, InstrumentedAsyncQueuePool)
+    if DB_PGBOUNCER and make_url(url).get_driver_name() == "asyncpg":
+        # asyncpg prepara todo statement; com PgBouncer o cache precisa ficar desligado
+        # e os nomes precisam ser únicos entre conexões do servidor
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+
+def get_async_engine(url=None):
+    url = url or ASYNC_DATABASE_URL
+    engines = _async_engines.setdefault(asyncio.get_running_loop(), {})
+    async_engine = engines.get(str(url))
+    if async_engine is None:
+        async_engine = create_async_engine(url, **_async_engine_options(url))
+        if async_engine.dialect.driver == "asyncpg":
+            event.listen(async_engine.sync_engine, "connect", _float4_as_text)
+        engines[str(url)] = async_engine
+    return async_engine
+
+
+# replica lag in seconds (0 on a primary)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "ELSE 0 END"
+)
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.async_url = _async_url(url)
+        self.engine = create_engine(url, **_pool_options(url, InstrumentedQueuePool))
+        self.lag = None
+        self.healthy = False
+        self.checked_at = float("-inf")
+
+    def needs_check(self) -> bool:
+        return time.monotonic() - self.checked_at >= DB_REPLICA_CHECK_INTERVAL
+
+    def record_lag(self, lag):
+        # lag None = réplica inacessível
+        self.lag = None if lag is None else float(lag)
+        self.healthy = self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG
+        self.checked_at = time.monotonic()
+
+    def check(self):
+        try:
+            with self.engine.connect() as connection:
+                self.record_lag(connection.scalar(REPLICA_LAG_SQL))
+        except Exception:
+            self.record_lag(None)
+
+    async def check_async(self):
+        try:
+            async with get_async_engine(self.async_url).connect() as connection:
+                self.record_lag(await connection.scalar(REPLICA_LAG_SQL))
+        except Exception:
+            self.record_lag(None)
+
+
+replicas = []
+_replica_cycle = itertools.cycle(())
+
+
+def configure_replicas(urls):
+    global replicas, _replica_cycle
+    # as consultas de análise só rodam no Postgres: outra base seria dada como
+    # saudável (sem lag) e falharia em toda leitura, sem cair no primário
+    others = [make_url(url).render_as_string(hide_password=True) for url in urls
+              if make_url(url).get_backend_name() != "postgresql"]
+    if others:
+        raise ValueError(f"Read replicas must be Postgres URLs: {', '.join(others)}")
+    for replica in replicas:
+        replica.engine.dispose()
+    replicas = [Replica(url) for url in urls]
+    _replica_cycle = itertools.cycle(range(len(replicas)))
+
+
+configure_replicas(DATABASE_REPLICA_URLS)
+
+
+class _RecentWrites:
+    """Tokens que escreveram há menos de DB_READ_YOUR_WRITES_WINDOW segundos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._written_at = OrderedDict()
+
+    def mark(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            self._written_at.pop(key, None)
+            self._written_at[key] = now
+            while self._written_at and next(iter(self._written_at.values())) < now - DB_READ_YOUR_WRITES_WINDOW:
+                self._written_at.popitem(last=False)
+
+    def recent(self, key: str) -> bool:
+        written_at = self._written_at.get(key)
+        return written_at is not None and time.monotonic() - written_at < DB_READ_YOUR_WRITES_WINDOW
+
+
+recent_writes = _RecentWrites()
+
+
+def _replica_candidates(request: Request):
+    # None = usar o primário
+    key = request.headers.get("authorization")
+    if not replicas or (key and recent_writes.recent(key)):
+        return []
+    start = next(_replica_cycle)
+    return [replicas[(start + i) % len(replicas)] for i in range(len(replicas))]
+
+
 # define models
 Base = declarative_base()
 
@@ -23,3 +275,39 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSession(get_async_engine(), autoflush=False, expire_on_commit=False) as db:
+        yield db
+
+
+# read-only dependencies for analytics: a healthy replica when configured,
+# otherwise (lag, failure, recent write by this token) the primary
+def get_read_db(request: Request):
+    bind = engine
+    for replica in _replica_candidates(request):
+        if replica.needs_check():
+            replica.check()
+        if replica.healthy:
+            bind = replica.engine
+            break
+
+    db = SessionLocal(bind=bind)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    bind = get_async_engine()
+    for replica in _replica_candidates(request):
+        if replica.needs_check():
+            await replica.check_async()
+        if replica.healthy:
+            bind = get_async_engine(replica.async_url)
+            break
+
+    async with AsyncSession(bind, autoflush=False, expire_on_commit=False) as db:
+        yield db
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
+import principal_cache
 from farmer.model_farmer import Farmer
 from farmer.schema_farmer import FarmerCreate, FarmerResponse
 
@@ -17,6 +18,7 @@ def create_farmer(farmer: FarmerCreate, db: Session = Depends(get_db)):
 
     # create new farmer object
     new_farmer = Farmer(**farmer.model_dump())
+    principal_cache.invalidate_email(new_farmer.email)
 
     db.add(new_farmer)
     db.commit()
@@ -47,10 +49,12 @@ def update_farmer(id: int, updated_data: FarmerCreate, db: Session = Depends(get
     if not farmer:
         raise HTTPException(status_code=404, detail="Farmer not found")
 
+    previous_email = farmer.email
     for key, value in updated_data.model_dump().items():
         setattr(farmer, key, value)
 
     db.commit()
+    principal_cache.invalidate_email(previous_email, farmer.email)
     db.refresh(farmer)
 
     return farmer
\ No newline at end of file
@@ -0,0 +1,47 @@
+import time
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engine, get_async_db, get_async_engine, DB_PGBOUNCER
+import response_cache
+
+router = APIRouter()
+
+
+def _pool_status(pool):
+    stats = getattr(pool, "stats", None)
+    if stats is None:
+        return {"class": type(pool).__name__}
+    return stats.snapshot(pool)
+
+
+# GET /health/db - database round trip and connection pool usage
+@router.get("/db")
+async def database_health(db: AsyncSession = Depends(get_async_db)):
+    start = time.perf_counter()
+    try:
+        await db.execute(text("SELECT 1"))
+        status, code = "ok", 200
+    except Exception:
+        status, code = "unavailable", 503
+    latency_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    return JSONResponse(status_code=code, content={
+        "status": status,
+        "latency_ms": latency_ms,
+        "pgbouncer": DB_PGBOUNCER,
+        "pool": _pool_status(engine.pool),
+        "async_pool": _pool_status(get_async_engine().pool),
+    })
+
+
+# GET /health/cache - response cache backend and hit/miss counters
+@router.get("/cache")
+def cache_health():
+    backend = response_cache.backend
+    return {
+        "backend": response_cache.RESPONSE_CACHE_BACKEND,
+        "entries": len(backend) if backend is not None else 0,
+        **response_cache.metrics.snapshot(),
+    }
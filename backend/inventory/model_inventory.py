@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, TIMESTAMP, func
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, TIMESTAMP, func, Index
 from database import Base
 
 class FarmInventory(Base):
@@ -11,4 +11,8 @@ class FarmInventory(Base):
     unit = Column(String(50), nullable=False)
     last_updated = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     consumption_rate = Column(Float, nullable=False, default=0)
-    category = Column(String(99), nullable=False)
\ No newline at end of file
+    category = Column(String(99), nullable=False)
+
+    __table_args__ = (
+        Index('ix_farm_inventory_farm_id_item_name', 'farm_id', 'item_name'),
+    )
@@ -1,5 +1,6 @@
-from fastapi import FastAPI
-from database import Base, engine
+from fastapi import FastAPI, Request
+from alembic import command
+from alembic.config import Config
 from sheep import router_sheep
 from inventory import router_inventory
 from farmer import router_farmer
@@ -9,11 +10,16 @@ from appointment import router_appointment
 from sheepgroup import router_sheepgroup
 from milkproduction import router_milkproduction
 from sensor import router_sensor
+from health import router_health
 from fastapi.middleware.cors import CORSMiddleware
 import os
+from database import recent_writes
+import response_cache
 from dotenv import load_dotenv
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 # Create the FastAPI app
 app = FastAPI()
@@ -24,13 +30,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
-# Create all database tables (based on your models)
+# read-your-writes: after a successful write, this token's analytics reads go to the
+# primary for DB_READ_YOUR_WRITES_WINDOW seconds instead of a possibly stale replica
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    response = await call_next(request)
+    authorization = request.headers.get("authorization")
+    if authorization and request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        recent_writes.mark(authorization)
+    return response
+
+
+# per-farm cache of GET responses, invalidated by every write of the farm (response_cache.py)
+app.middleware("http")(response_cache.cache_responses)
+
+
+# Apply pending database migrations (alembic/versions)
 @app.on_event("startup")
 def startup():
-    Base.metadata.create_all(bind=engine)
+    alembic_cfg = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", os.path.join(BASE_DIR, "alembic"))
+    alembic_cfg.attributes["configure_logger"] = False
+    command.upgrade(alembic_cfg, "head")
 
 
 # register sheep routes under /sheep path
@@ -58,4 +83,7 @@ app.include_router(router_sheepgroup.router, prefix="/sheep-group", tags=["Group
 app.include_router(router_milkproduction.router, prefix="/milk-production", tags=["MilkProduction"])
 
 # register sensors routes under /sensor path
-app.include_router(router_sensor.router, prefix="/sensor", tags=["Sensor"])
\ No newline at end of file
+app.include_router(router_sensor.router, prefix="/sensor", tags=["Sensor"])
+
+# register health checks under /health path
+app.include_router(router_health.router, prefix="/health", tags=["Health"])
@@ -0,0 +1,269 @@
+"""
+Detecção de quedas bruscas de produção (sinal precoce de mastite).
+
+Cada ovelha tem média e variância móveis exponenciais (EWMA) em
+milk_yield_stats. Todo registro gravado pelas rotas de produção chama
+`record`, que avança o estado em O(1) por registro (vetorizado por ovelha
+em envios em lote). O registro é comparado com a média anterior a ele:
+deviation = (volume - média) / desvio padrão.
+
+O estado guarda também a média/variância de antes do último registro: uma
+correção (ou reenvio) da data do último registro desfaz só esse passo. Só é
+preciso reler o histórico de uma ovelha quando o estado dela não existe ou
+chega um registro com data anterior ao último visto (lançamento atrasado):
+a EWMA depende da ordem.
+
+    python -m milkproduction.anomalies              # recalcula todas as fazendas
+    python -m milkproduction.anomalies --farm-id 3
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import Date, Float, Integer, DateTime, any_, cast, delete, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from milkproduction.model_milkproduction import MilkProduction
+from milkproduction.model_yieldstats import MilkYieldStats
+from sheep.model_sheep import Sheep
+
+# peso do registro novo na média (0.1 ~ memória de 10 ordenhas)
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.1"))
+# registros anteriores necessários antes de avaliar desvios
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "7"))
+# desvio padrão mínimo, como fração da média (séries quase constantes)
+ANOMALY_MIN_STD = float(os.getenv("ANOMALY_MIN_STD", "0.05"))
+# queda em desvios padrão a partir da qual a ovelha aparece em /anomalies
+ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "3"))
+
+# tabelas (Core): o job roda sem configurar todos os mappers; run_sync também serve
+stats_table = MilkYieldStats.__table__
+milk_table = MilkProduction.__table__
+sheep_table = Sheep.__table__
+
+
+def _empty(size: int) -> dict:
+    return {
+        "count": np.zeros(size, dtype=np.int64),
+        "mean": np.zeros(size),
+        "variance": np.zeros(size),
+        "expected": np.full(size, np.nan),
+        "deviation": np.full(size, np.nan),
+        "previous_mean": np.zeros(size),
+        "previous_variance": np.zeros(size),
+    }
+
+
+def advance(state: dict, slots: np.ndarray, volumes: np.ndarray):
+    """
+    Aplica registros aos estados (in place). `slots` indica o estado de cada
+    registro; entradas ordenadas por (slot, data). Cada passo do laço processa
+    o k-ésimo registro de todas as ovelhas de uma vez.
+    """
+    if not len(slots):
+        return
+    position = np.arange(len(slots)) - np.searchsorted(slots, slots)
+    order = np.argsort(position, kind="stable")
+    bounds = np.searchsorted(position[order], np.arange(position.max() + 2))
+
+    count, mean, variance = state["count"], state["mean"], state["variance"]
+    for k in range(len(bounds) - 1):
+        rows = order[bounds[k]:bounds[k + 1]]
+        slot, volume = slots[rows], volumes[rows]
+        previous = count[slot]
+        first = previous == 0
+        current_mean = mean[slot]
+        std = np.sqrt(np.maximum(variance[slot], (ANOMALY_MIN_STD * current_mean) ** 2))
+        scored = (previous >= ANOMALY_WARMUP) & (std > 0)
+
+        diff = volume - current_mean
+        state["expected"][slot] = np.where(first, np.nan, current_mean)
+        state["deviation"][slot] = np.where(scored, diff / np.where(std > 0, std, 1.0), np.nan)
+        state["previous_mean"][slot] = current_mean
+        state["previous_variance"][slot] = variance[slot]
+        # EWMA incremental da média e da variância
+        increment = ANOMALY_ALPHA * diff
+        mean[slot] = np.where(first, volume, current_mean + increment)
+        variance[slot] = np.where(first, 0.0, (1 - ANOMALY_ALPHA) * (variance[slot] + diff * increment))
+        count[slot] = previous + 1
+
+
+def _history(db: Session, sheep_ids: list):
+    rows = db.execute(
+        select(milk_table.c.sheep_id, milk_table.c.date, milk_table.c.volume)
+        .where(milk_table.c.sheep_id == any_(cast(sheep_ids, ARRAY(Integer))))
+        .order_by(milk_table.c.sheep_id, milk_table.c.date)
+    ).all()
+    return [row[0] for row in rows], [row[1] for row in rows], np.array([row[2] for row in rows], dtype=np.float64)
+
+
+def _nullable(values) -> list:
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def _save(db: Session, sheep_ids: list, state: dict, last_dates: list, last_volumes, existing: bool = False):
+    # um único comando sobre unnest(arrays), como no envio em lote; linhas já
+    # travadas (existing) vão por UPDATE ... FROM, sem a inserção especulativa do ON CONFLICT
+    columns = ["sheep_id", "count", "mean", "variance", "last_date", "last_volume", "expected", "deviation",
+               "previous_mean", "previous_variance"]
+    batch = func.unnest(
+        cast(sheep_ids, ARRAY(Integer)),
+        cast(state["count"].tolist(), ARRAY(Integer)),
+        cast(state["mean"].tolist(), ARRAY(Float)),
+        cast(state["variance"].tolist(), ARRAY(Float)),
+        cast(last_dates, ARRAY(Date)),
+        cast([float(volume) for volume in last_volumes], ARRAY(Float)),
+        cast(_nullable(state["expected"]), ARRAY(Float)),
+        cast(_nullable(state["deviation"]), ARRAY(Float)),
+        cast(state["previous_mean"].tolist(), ARRAY(Float)),
+        cast(state["previous_variance"].tolist(), ARRAY(Float)),
+    ).table_valued(*columns).render_derived()
+    updated_at = cast(datetime.utcnow(), DateTime)
+
+    if existing:
+        db.execute(
+            update(stats_table)
+            .where(stats_table.c.sheep_id == batch.c.sheep_id)
+            .values({**{column: batch.c[column] for column in columns[1:]}, "updated_at": updated_at})
+        )
+        return
+
+    stmt = insert(stats_table).from_select(
+        columns + ["updated_at"],
+        select(*(batch.c[column] for column in columns), updated_at),
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[stats_table.c.sheep_id],
+        set_={column: stmt.excluded[column] for column in columns[1:] + ["updated_at"]},
+    ))
+
+
+def _replay(db: Session, sheep_ids: list):
+    # recalcula do zero a partir do histórico (estado ausente ou registro fora de ordem)
+    history_ids, days, volumes = _history(db, sheep_ids)
+    if not history_ids:
+        return
+    keys = sorted(set(history_ids))
+    position = {sheep_id: i for i, sheep_id in enumerate(keys)}
+    slots = np.fromiter((position[sheep_id] for sheep_id in history_ids), dtype=np.int64, count=len(history_ids))
+    state = _empty(len(keys))
+    advance(state, slots, volumes)
+
+    last = np.searchsorted(slots, np.arange(len(keys)), side="right") - 1
+    _save(db, keys, state, [days[i] for i in last], volumes[last])
+
+
+def record(db: Session, observations):
+    """
+    Atualiza as estatísticas com registros já gravados na mesma transação.
+    `observations`: iterável de (sheep_id, date, volume). Não faz commit.
+    """
+    by_sheep = defaultdict(dict)
+    for sheep_id, day, volume in observations:
+        by_sheep[sheep_id][day] = float(volume)
+    if not by_sheep:
+        return
+
+    sheep_ids = sorted(by_sheep)
+    # FOR UPDATE em ordem de sheep_id: envios concorrentes da mesma ovelha se serializam
+    stored = {
+        row.sheep_id: row._mapping
+        for row in db.execute(
+            select(stats_table)
+            .where(stats_table.c.sheep_id == any_(cast(sheep_ids, ARRAY(Integer))))
+            .order_by(stats_table.c.sheep_id)
+            .with_for_update()
+        )
+    }
+
+    # rollback: o registro mais antigo do envio corrige o último visto; desfaz um passo
+    replay, fast, rollback = [], [], set()
+    for sheep_id in sheep_ids:
+        row = stored.get(sheep_id)
+        first = min(by_sheep[sheep_id]) if row is not None else None
+        if row is not None and first > row["last_date"]:
+            fast.append(sheep_id)
+        elif row is not None and first == row["last_date"] and row["previous_mean"] is not None:
+            fast.append(sheep_id)
+            rollback.add(sheep_id)
+        else:
+            replay.append(sheep_id)
+
+    if fast:
+        def initial(sheep_id):
+            row = stored[sheep_id]
+            if sheep_id in rollback:
+                return row["count"] - 1, row["previous_mean"], row["previous_variance"]
+            return row["count"], row["mean"], row["variance"]
+
+        count, mean, variance = zip(*(initial(sheep_id) for sheep_id in fast))
+        state = {
+            **_empty(len(fast)),
+            "count": np.array(count, dtype=np.int64),
+            "mean": np.array(mean, dtype=np.float64),
+            "variance": np.array(variance, dtype=np.float64),
+        }
+        slots, volumes, last_dates, last_volumes = [], [], [], []
+        for slot, sheep_id in enumerate(fast):
+            days = sorted(by_sheep[sheep_id])
+            slots.extend([slot] * len(days))
+            volumes.extend(by_sheep[sheep_id][day] for day in days)
+            last_dates.append(days[-1])
+            last_volumes.append(by_sheep[sheep_id][days[-1]])
+        advance(state, np.array(slots, dtype=np.int64), np.array(volumes, dtype=np.float64))
+        _save(db, fast, state, last_dates, last_volumes, existing=True)
+
+    if replay:
+        _replay(db, replay)
+
+
+def rebuild(db: Session, farm_id=None):
+    """Recalcula as estatísticas de uma fazenda (ou de todas) a partir do histórico."""
+    scope = []
+    if farm_id is not None:
+        scope.append(milk_table.c.sheep_id.in_(select(sheep_table.c.id).where(sheep_table.c.farm_id == farm_id)))
+    sheep_ids = db.scalars(select(milk_table.c.sheep_id).where(*scope).distinct()).all()
+
+    stale = delete(stats_table).where(stats_table.c.sheep_id.notin_(select(milk_table.c.sheep_id)))
+    if farm_id is not None:
+        stale = stale.where(stats_table.c.sheep_id.in_(select(sheep_table.c.id).where(sheep_table.c.farm_id == farm_id)))
+    db.execute(stale)
+    if sheep_ids:
+        _replay(db, sorted(sheep_ids))
+    return len(sheep_ids)
+
+
+def anomalies_query(farm_id: int, since, threshold: float):
+    """Ovelhas cujo último registro (desde `since`) caiu `threshold` desvios abaixo do esperado."""
+    return (
+        select(stats_table.c.sheep_id, sheep_table.c.group_id, stats_table.c.last_date,
+               stats_table.c.last_volume, stats_table.c.expected, stats_table.c.deviation)
+        .join(sheep_table, sheep_table.c.id == stats_table.c.sheep_id)
+        .where(
+            sheep_table.c.farm_id == farm_id,
+            stats_table.c.deviation <= -threshold,
+            stats_table.c.last_date >= since,
+        )
+        .order_by(stats_table.c.deviation, stats_table.c.sheep_id)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recalcula as estatísticas de produção (EWMA) por ovelha")
+    parser.add_argument("--farm-id", type=int, help="só esta fazenda (padrão: todas)")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        count = rebuild(db, args.farm_id)
+        db.commit()
+    print(f"{count} sheep rebuilt", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
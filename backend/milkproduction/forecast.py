@@ -0,0 +1,227 @@
+"""
+Previsão de produção de leite por fazenda (total) e por grupo.
+
+Modelo: tendência linear + efeito do dia da semana, ajustado por mínimos
+quadrados sobre os últimos HISTORY_DAYS dias de cada grupo (rollup
+milk_daily_farm_group; "sem grupo" é um grupo a mais). Todos os grupos (de uma
+fazenda ou do banco inteiro) são ajustados juntos: as equações normais saem de
+um einsum sobre a matriz grupos x dias e os sistemas são resolvidos de uma vez.
+Grupos com menos de MIN_HISTORY_DAYS dias recebem uma penalidade que reduz a
+previsão à média.
+
+O total da fazenda é a soma das previsões dos grupos: um grupo novo vira um
+degrau no total, que a tendência do total extrapolaria, mas não na série do
+próprio grupo. E a soma dos grupos bate com o total.
+
+O resultado fica em milk_forecast (FORECAST_HORIZON dias a partir do dia
+seguinte a `origin`, o último dia completo) e é só lido por GET
+/milk-production/forecast, que marca a resposta como `stale` e agenda
+`refresh_stale` em segundo plano quando o ajuste noturno ainda não incluiu
+ontem. Fazendas sem histórico recebem só a linha da fazenda com
+history_days = 0, para não serem reajustadas a cada pedido. Reajuste noturno:
+
+    python -m milkproduction.forecast              # todas as fazendas
+    python -m milkproduction.forecast --farm-id 3
+"""
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from farm.model_farm import Farm
+from milkproduction.model_forecast import MilkForecast
+from milkproduction.model_milkdaily import MilkDailyFarmGroup
+
+# janela de histórico usada no ajuste
+HISTORY_DAYS = 56
+# dias previstos e guardados por série
+FORECAST_HORIZON = 30
+# com menos dias observados a série é prevista pela média
+MIN_HISTORY_DAYS = 14
+# intervalo de 95%
+Z_95 = 1.96
+# advisory lock (chave, farm_id) que serializa o reajuste de uma fazenda
+FORECAST_LOCK_KEY = 724516
+
+# tabelas (Core): o job roda sem configurar todos os mappers
+forecast_table = MilkForecast.__table__
+rollup_table = MilkDailyFarmGroup.__table__
+farm_table = Farm.__table__
+
+
+def design(days: np.ndarray, weekdays: np.ndarray) -> np.ndarray:
+    """Colunas: intercepto, tendência (semanas desde a origem) e terça..domingo (segunda = referência)."""
+    columns = [np.ones(len(days)), days / 7.0]
+    columns.extend((weekdays == weekday).astype(np.float64) for weekday in range(1, 7))
+    return np.stack(columns, axis=1)
+
+
+def fit(values: np.ndarray, observed: np.ndarray, origin: date, horizon: int = FORECAST_HORIZON):
+    """
+    `values` e `observed` são séries x dias, terminando em `origin`. Devolve a
+    previsão e a meia largura do intervalo de 95% (séries x `horizon`) e os dias
+    usados por série.
+    """
+    count, length = values.shape
+    history = np.arange(-length + 1, 1)
+    future = np.arange(1, horizon + 1)
+    weekday = origin.weekday()
+    X = design(history, (weekday + history) % 7)
+    F = design(future, (weekday + future) % 7)
+    weights = observed.astype(np.float64)
+    used = weights.sum(axis=1)
+
+    normal = np.einsum("st,tp,tq->spq", weights, X, X)
+    rhs = np.einsum("st,tp->sp", weights * values, X)
+    # penalidade fora do intercepto: mínima para séries longas, dominante para as curtas
+    penalty = np.where(used >= MIN_HISTORY_DAYS, 1e-6, 1e9)
+    ridge = np.zeros((count, X.shape[1], X.shape[1]))
+    ridge[:, np.arange(1, X.shape[1]), np.arange(1, X.shape[1])] = penalty[:, None]
+    ridge[:, 0, 0] = np.where(used > 0, 0.0, 1.0)  # série vazia: sistema ainda inversível
+    inverse = np.linalg.inv(normal + ridge)
+    beta = np.einsum("spq,sq->sp", inverse, rhs)
+
+    residuals = (values - beta @ X.T) * weights
+    parameters = np.where(used >= MIN_HISTORY_DAYS, X.shape[1], 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / np.maximum(used - parameters, 1))
+
+    # intervalo de previsão: ruído + incerteza dos coeficientes (cresce com o horizonte)
+    spread = Z_95 * sigma[:, None] * np.sqrt(1 + np.einsum("hp,spq,hq->sh", F, inverse, F))
+    return np.maximum(beta @ F.T, 0.0), spread, used.astype(np.int64)
+
+
+def totals(owners: np.ndarray, prediction: np.ndarray, spread: np.ndarray, count: int):
+    """Soma as previsões por dono (fazenda); erros dos grupos tratados como independentes."""
+    total = np.zeros((count, prediction.shape[1]))
+    variance = np.zeros((count, prediction.shape[1]))
+    np.add.at(total, owners, prediction)
+    np.add.at(variance, owners, spread ** 2)
+    return total, np.sqrt(variance)
+
+
+def load(db: Session, origin: date, farm_id=None):
+    """
+    Séries dos grupos na janela terminando em `origin`: (chaves (farm_id, group_id),
+    valores, observados), em ordem de fazenda.
+    """
+    start = origin - timedelta(days=HISTORY_DAYS - 1)
+    query = (
+        select(rollup_table.c.farm_id, rollup_table.c.group_id, rollup_table.c.date, rollup_table.c.total)
+        .where(rollup_table.c.date >= start, rollup_table.c.date <= origin)
+    )
+    if farm_id is not None:
+        query = query.where(rollup_table.c.farm_id == farm_id)
+    rows = db.execute(query).all()
+
+    keys = sorted({(row.farm_id, row.group_id) for row in rows}, key=lambda key: (key[0], key[1] or 0))
+    position = {key: i for i, key in enumerate(keys)}
+    values = np.zeros((len(keys), HISTORY_DAYS))
+    for row in rows:
+        values[position[(row.farm_id, row.group_id)], (row.date - start).days] = row.total
+
+    # observado a partir do primeiro dia com registro (dias sem registro depois dele valem 0)
+    recorded = values != 0
+    first = np.where(recorded.any(axis=1), recorded.argmax(axis=1), HISTORY_DAYS)
+    observed = np.arange(HISTORY_DAYS)[None, :] >= first[:, None]
+    return keys, values, observed
+
+
+def refresh(db: Session, farm_id=None, origin: date = None) -> int:
+    """Reajusta e grava as previsões (de uma fazenda ou de todas). Não faz commit."""
+    origin = origin or date.today() - timedelta(days=1)
+    if farm_id is not None:
+        db.execute(select(func.pg_advisory_xact_lock(FORECAST_LOCK_KEY, farm_id)))
+    keys, values, observed = load(db, origin, farm_id)
+
+    if farm_id is not None:
+        farms = [farm_id]
+    else:
+        farms = db.scalars(select(farm_table.c.id).order_by(farm_table.c.id)).all()
+    if keys:
+        prediction, spread, used = fit(values, observed, origin)
+    else:
+        prediction = spread = np.zeros((0, FORECAST_HORIZON))
+        used = np.zeros(0, dtype=np.int64)
+    owners = np.searchsorted(farms, [farm for farm, _ in keys]).astype(np.int64)
+    farm_prediction, farm_spread = totals(owners, prediction, spread, len(farms))
+    farm_used = np.zeros(len(farms), dtype=np.int64)
+    np.maximum.at(farm_used, owners, used)
+
+    fitted_at = datetime.utcnow()
+    rows = []
+    for scope, series_keys, series_prediction, series_spread, series_used in (
+        ("farm", [(farm, None) for farm in farms], farm_prediction, farm_spread, farm_used),
+        ("group", keys, prediction, spread, used),
+    ):
+        lower = np.maximum(series_prediction - series_spread, 0.0)
+        upper = series_prediction + series_spread
+        rows.extend(
+            {
+                "farm_id": farm, "scope": scope, "group_id": group, "origin": origin,
+                "values": series_prediction[i].round(2).tolist(),
+                "lower": lower[i].round(2).tolist(),
+                "upper": upper[i].round(2).tolist(),
+                "history_days": int(series_used[i]), "fitted_at": fitted_at,
+            }
+            for i, (farm, group) in enumerate(series_keys)
+        )
+
+    # séries que deixaram de existir (grupo sem registros na janela)
+    current = {(row["farm_id"], row["scope"], row["group_id"] or 0) for row in rows}
+    query = select(forecast_table.c.id, forecast_table.c.farm_id, forecast_table.c.scope, forecast_table.c.group_id)
+    if farm_id is not None:
+        query = query.where(forecast_table.c.farm_id == farm_id)
+    stored = db.execute(query).all()
+    removed = [row.id for row in stored if (row.farm_id, row.scope, row.group_id or 0) not in current]
+    if removed:
+        db.execute(delete(forecast_table).where(forecast_table.c.id.in_(removed)))
+
+    # upsert: o job noturno e um reajuste em segundo plano não colidem na restrição única
+    if rows:
+        stmt = insert(forecast_table)
+        db.execute(stmt.on_conflict_do_update(
+            constraint="_milk_forecast_series_uc",
+            set_={column: stmt.excluded[column]
+                  for column in ("origin", "values", "lower", "upper", "history_days", "fitted_at")},
+        ), rows)
+    return len(rows)
+
+
+def refresh_stale(db: Session, farm_id: int, origin: date) -> bool:
+    """
+    Reajusta a fazenda se a previsão gravada não parte de `origin`. Se outra
+    transação já está reajustando a fazenda (lock ocupado) não espera nem repete
+    o ajuste. Devolve se reajustou. Não faz commit.
+    """
+    if not db.scalar(select(func.pg_try_advisory_xact_lock(FORECAST_LOCK_KEY, farm_id))):
+        return False
+    fitted = db.scalar(
+        select(forecast_table.c.origin)
+        .where(forecast_table.c.farm_id == farm_id, forecast_table.c.scope == "farm")
+    )
+    if fitted == origin:
+        return False
+    refresh(db, farm_id, origin)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajusta as previsões de produção (fazenda e grupos)")
+    parser.add_argument("--farm-id", type=int, help="só esta fazenda (padrão: todas)")
+    parser.add_argument("--origin", type=date.fromisoformat, help="último dia do histórico (padrão: ontem)")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        count = refresh(db, args.farm_id, args.origin)
+        db.commit()
+    print(f"{count} series forecast", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Curvas de lactação (Wood: y = a * t^b * e^(-c t), t = dias desde o início da lactação).
+
+As séries de milk_production_individual viram arrays NumPy contíguos ordenados
+por (ovelha, data) e o ajuste do rebanho inteiro é um único mínimos quadrados
+em escala log (ln y = ln a + b ln t - c t): as somas das equações normais saem
+de np.bincount por ovelha e os sistemas 3x3 são resolvidos juntos.
+
+Não há data de parto no cadastro: a lactação atual é o último trecho de
+registros sem intervalo maior que LACTATION_GAP_DAYS.
+
+O resultado fica em lactation_curve com uma marca d'água (quantidade, última
+data e soma dos registros); `refresh` só reajusta ovelhas cuja marca mudou.
+As rotas de escrita de leite só marcam as ovelhas em lactation_dirty (`mark`);
+o job consome essa fila, e as rotas de leitura apenas leem as curvas gravadas.
+
+    python -m milkproduction.lactation              # ovelhas marcadas, todas as fazendas
+    python -m milkproduction.lactation --farm-id 3
+    python -m milkproduction.lactation --full       # compara a marca d'água de todas
+"""
+import argparse
+import io
+import sys
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import DateTime, Float, Integer, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from milkproduction.model_lactation import LactationCurve, LactationDirty
+from milkproduction.model_milkproduction import MilkProduction
+from sheep.model_sheep import Sheep
+
+# intervalo sem registros que encerra uma lactação
+LACTATION_GAP_DAYS = 60
+# mínimo de registros para ajustar a curva
+MIN_POINTS = 10
+
+# tabelas (Core): o job roda sem configurar todos os mappers
+curve_table = LactationCurve.__table__
+dirty_table = LactationDirty.__table__
+milk_table = MilkProduction.__table__
+sheep_table = Sheep.__table__
+
+METRICS = ("peak_yield", "days_to_peak", "persistency")
+
+
+def fit(sheep_ids: np.ndarray, days: np.ndarray, volumes: np.ndarray) -> dict:
+    """
+    Ajusta a curva de cada ovelha. Entradas ordenadas por (ovelha, dia), com `days`
+    em dias ordinais. Devolve arrays alinhados com `sheep` (ids em ordem crescente).
+    """
+    positive = volumes > 0
+    sheep_ids, days, volumes = sheep_ids[positive], days[positive], volumes[positive]
+    sheep, index = np.unique(sheep_ids, return_inverse=True)
+    count = len(sheep)
+
+    # trechos: começa um novo a cada ovelha e a cada intervalo maior que o limite
+    starts = np.ones(len(days), dtype=bool)
+    if len(days):
+        starts[1:] = (index[1:] != index[:-1]) | (np.diff(days) > LACTATION_GAP_DAYS)
+    segment = np.cumsum(starts) - 1
+    last = np.zeros(count, dtype=np.int64)
+    np.maximum.at(last, index, segment)  # trechos crescem: o maior é o do último registro
+    current = segment == last[index]
+
+    index, days, volumes = index[current], days[current], volumes[current]
+    start = np.full(count, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(start, index, days)
+    t = (days - start[index] + 1).astype(np.float64)
+    log_t, log_y = np.log(t), np.log(volumes)
+
+    def total(weights=None):
+        return np.bincount(index, weights=weights, minlength=count)
+
+    # equações normais de [1, ln t, -t] por ovelha
+    n = total()
+    s_l, s_t = total(log_t), total(t)
+    s_ll, s_lt, s_tt = total(log_t * log_t), total(log_t * t), total(t * t)
+    matrix = np.stack([
+        np.stack([n, s_l, -s_t], axis=-1),
+        np.stack([s_l, s_ll, -s_lt], axis=-1),
+        np.stack([-s_t, -s_lt, s_tt], axis=-1),
+    ], axis=1)
+    rhs = np.stack([total(log_y), total(log_t * log_y), -total(t * log_y)], axis=-1)
+
+    # determinante relativo à diagonal: descarta séries sem variação suficiente em t
+    scale = np.where(n > 0, n * s_ll * s_tt, 1.0)
+    fitted = (n >= MIN_POINTS) & (np.abs(np.linalg.det(matrix)) > 1e-10 * scale)
+    coefficients = np.full((count, 3), np.nan)
+    if fitted.any():
+        coefficients[fitted] = np.linalg.solve(matrix[fitted], rhs[fitted][..., None])[..., 0]
+
+    a = np.exp(coefficients[:, 0])
+    b, c = coefficients[:, 1], coefficients[:, 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peaked = fitted & (b > 0) & (c > 0)
+        days_to_peak = np.where(peaked, b / c, np.nan)
+        peak_yield = np.where(peaked, a * np.power(days_to_peak, b) * np.exp(-b), np.nan)
+        persistency = np.where(fitted & (c > 0), -(b + 1) * np.log(c), np.nan)
+
+    return {
+        "sheep_id": sheep,
+        "lactation_start": start,
+        "records": n.astype(np.int64),
+        "a": a, "b": b, "c": c,
+        "peak_yield": peak_yield,
+        "days_to_peak": days_to_peak,
+        "persistency": persistency,
+    }
+
+
+def _load_series(db: Session, sheep_ids: list):
+    # COPY ... TO STDOUT direto para np.loadtxt: sem um objeto Python por registro
+    cursor = db.connection().connection.cursor()
+    try:
+        query = cursor.mogrify(
+            "SELECT sheep_id, date - DATE '0001-01-01' + 1, volume FROM milk_production_individual"
+            " WHERE sheep_id = ANY(%s) ORDER BY sheep_id, date",
+            (sheep_ids,),
+        ).decode()
+        buffer = io.StringIO()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT", buffer)
+    finally:
+        cursor.close()
+    buffer.seek(0)
+    table = np.loadtxt(buffer, delimiter="\t", ndmin=2).reshape(-1, 3)
+    # dias no mesmo ordinal de date.toordinal()
+    return table[:, 0].astype(np.int64), table[:, 1].astype(np.int64), table[:, 2]
+
+
+def _value(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def mark(db: Session, sheep_ids):
+    """Marca ovelhas com registros gravados na transação para o próximo ajuste. Não faz commit."""
+    sheep_ids = sorted(set(sheep_ids))
+    if not sheep_ids:
+        return
+    batch = func.unnest(cast(sheep_ids, ARRAY(Integer))).table_valued("sheep_id").render_derived()
+    db.execute(
+        insert(dirty_table)
+        .from_select(["sheep_id", "marked_at"],
+                     select(batch.c.sheep_id, cast(datetime.utcnow(), DateTime)))
+        .on_conflict_do_nothing(index_elements=[dirty_table.c.sheep_id])
+    )
+
+
+def refresh(db: Session, farm_id=None, sheep_ids=None, full: bool = False) -> int:
+    """
+    Reajusta as ovelhas com registros novos/alterados. Por padrão consome a fila
+    lactation_dirty (de uma fazenda ou de todas); com `sheep_ids` ou `full`
+    compara a marca d'água dessas ovelhas / de todas. Não faz commit. Devolve
+    quantas foram reajustadas.
+    """
+    # a fila é consumida no início: uma marca gravada durante o ajuste sobrevive
+    # (o INSERT dela espera este DELETE) e entra no próximo
+    claim = delete(dirty_table).returning(dirty_table.c.sheep_id)
+    if farm_id is not None:
+        claim = claim.where(dirty_table.c.sheep_id.in_(
+            select(sheep_table.c.id).where(sheep_table.c.farm_id == farm_id)
+        ))
+    if sheep_ids is not None:
+        claim = claim.where(dirty_table.c.sheep_id.in_(list(sheep_ids)))
+    claimed = db.scalars(claim).all()
+    if sheep_ids is None and not full:
+        if not claimed:
+            return 0
+        sheep_ids = claimed
+
+    def scoped(column):
+        conditions = []
+        if farm_id is not None:
+            conditions.append(column.in_(select(sheep_table.c.id).where(sheep_table.c.farm_id == farm_id)))
+        if sheep_ids is not None:
+            conditions.append(column.in_(list(sheep_ids)))
+        return conditions
+
+    # soma em double: sum(real) seria real e variaria com a ordem de agregação
+    marks = db.execute(
+        select(milk_table.c.sheep_id, func.count(), func.max(milk_table.c.date),
+               func.sum(cast(milk_table.c.volume, Float)))
+        .where(*scoped(milk_table.c.sheep_id))
+        .group_by(milk_table.c.sheep_id)
+    ).all()
+    stored_query = (
+        select(curve_table.c.sheep_id, curve_table.c.source_count,
+               curve_table.c.source_last_date, curve_table.c.source_total)
+        .where(*scoped(curve_table.c.sheep_id))
+    )
+    stored = {row.sheep_id: tuple(row[1:]) for row in db.execute(stored_query)}
+
+    current = {sheep_id: (count, last, float(volume)) for sheep_id, count, last, volume in marks}
+    dirty = sorted(
+        sheep_id for sheep_id, mark in current.items()
+        if sheep_id not in stored
+        or stored[sheep_id][:2] != mark[:2]
+        or abs(stored[sheep_id][2] - mark[2]) > 1e-6
+    )
+
+    # ovelhas que perderam todos os registros
+    gone = [sheep_id for sheep_id in stored if sheep_id not in current]
+    if gone:
+        db.execute(delete(curve_table).where(curve_table.c.sheep_id.in_(gone)))
+    if not dirty:
+        return 0
+
+    sheep_column, day_column, volume_column = _load_series(db, dirty)
+    result = fit(sheep_column, day_column, volume_column)
+    position = {int(sheep_id): i for i, sheep_id in enumerate(result["sheep_id"])}
+
+    fitted_at = datetime.utcnow()
+    values = []
+    for sheep_id in dirty:
+        count, last, volume = current[sheep_id]
+        row = {
+            "sheep_id": sheep_id,
+            "lactation_start": None, "records": 0,
+            "a": None, "b": None, "c": None,
+            "peak_yield": None, "days_to_peak": None, "persistency": None,
+            "source_count": count, "source_last_date": last, "source_total": volume,
+            "fitted_at": fitted_at,
+        }
+        i = position.get(sheep_id)
+        if i is not None:  # sem isso: só registros com volume zero
+            row["lactation_start"] = date.fromordinal(int(result["lactation_start"][i]))
+            row["records"] = int(result["records"][i])
+            for field in ("a", "b", "c") + METRICS:
+                row[field] = _value(result[field][i])
+        values.append(row)
+
+    stmt = insert(curve_table)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[curve_table.c.sheep_id],
+        set_={column: stmt.excluded[column] for column in values[0] if column != "sheep_id"},
+    ), values)
+    return len(dirty)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajusta as curvas de lactação (Wood)")
+    parser.add_argument("--farm-id", type=int, help="só esta fazenda (padrão: todas)")
+    parser.add_argument("--full", action="store_true",
+                        help="compara a marca d'água de todas as ovelhas, não só das marcadas")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        refitted = refresh(db, args.farm_id, full=args.full)
+        db.commit()
+    print(f"{refitted} curve(s) refitted", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date, DateTime, Float, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import ARRAY
+from database import Base
+
+class MilkForecast(Base):
+    # Previsão diária de produção por fazenda e por grupo, ajustada sobre o rollup
+    # milk_daily_farm_group (`python -m milkproduction.forecast`, todas as noites)
+    __tablename__ = "milk_forecast"
+
+    id = Column(Integer, primary_key=True)
+    farm_id = Column(Integer, ForeignKey("farm.id", ondelete="CASCADE"), nullable=False)
+    scope = Column(String(5), nullable=False)  # "farm" (total) ou "group"
+    group_id = Column(Integer, ForeignKey("sheep_group.id", ondelete="CASCADE"))  # None = sem grupo
+    origin = Column(Date, nullable=False)  # último dia do histórico; values[0] é origin + 1
+    values = Column(ARRAY(Float), nullable=False)
+    lower = Column(ARRAY(Float), nullable=False)  # intervalo de 95%
+    upper = Column(ARRAY(Float), nullable=False)
+    history_days = Column(Integer, nullable=False)  # dias usados no ajuste
+    fitted_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            'farm_id', 'scope', 'group_id',
+            name='_milk_forecast_series_uc',
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
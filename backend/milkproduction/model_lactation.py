@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date, DateTime, Float, Index
+from database import Base
+
+class LactationCurve(Base):
+    # Curva de Wood (y = a * t^b * e^(-c t)) da lactação atual de cada ovelha,
+    # recalculada por `python -m milkproduction.lactation` (ovelhas em lactation_dirty)
+    __tablename__ = "lactation_curve"
+
+    sheep_id = Column(Integer, ForeignKey("sheep.id", ondelete="CASCADE"), primary_key=True)
+    lactation_start = Column(Date)  # primeiro registro da lactação atual
+    records = Column(Integer, nullable=False, default=0)  # pontos usados no ajuste
+    a = Column(Float)
+    b = Column(Float)
+    c = Column(Float)
+    peak_yield = Column(Float)  # None quando a curva ajustada não tem pico
+    days_to_peak = Column(Float)
+    persistency = Column(Float)  # S = -(b + 1) ln c
+
+    # marca d'água dos registros usados: se mudar, a ovelha é reajustada
+    source_count = Column(Integer, nullable=False)
+    source_last_date = Column(Date)
+    source_total = Column(Float, nullable=False)
+    fitted_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_lactation_curve_peak_yield', 'peak_yield'),
+    )
+
+
+class LactationDirty(Base):
+    # Ovelhas com registros de leite gravados desde o último ajuste; marcadas
+    # pelas rotas de escrita e consumidas pelo job de lactação
+    __tablename__ = "lactation_dirty"
+
+    sheep_id = Column(Integer, ForeignKey("sheep.id", ondelete="CASCADE"), primary_key=True)
+    marked_at = Column(DateTime, nullable=False)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date, Float, UniqueConstraint, Index
+from database import Base
+
+class MilkDailyFarmGroup(Base):
+    # Rollup diário (fazenda, grupo, data) de milk_production_individual,
+    # mantido pelas rotas de escrita e reconstruível com `python -m milkproduction.rollup`
+    __tablename__ = "milk_daily_farm_group"
+
+    id = Column(Integer, primary_key=True, index=True)
+    farm_id = Column(Integer, ForeignKey("farm.id", ondelete="CASCADE"), nullable=False)
+    group_id = Column(Integer, ForeignKey("sheep_group.id", ondelete="CASCADE"))  # None = sem grupo
+    date = Column(Date, nullable=False)
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            'farm_id', 'group_id', 'date',
+            name='_milk_daily_farm_group_uc',
+            postgresql_nulls_not_distinct=True,
+        ),
+        Index('ix_milk_daily_farm_group_farm_id_date', 'farm_id', 'date'),
+    )
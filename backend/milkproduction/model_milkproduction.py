@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, ForeignKey, Date, Float
+from sqlalchemy import Column, Integer, ForeignKey, Date, Float, UniqueConstraint, Index
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -11,4 +11,9 @@ class MilkProduction(Base):
     date = Column(Date, nullable=False)
     volume = Column(Float(5, 2), nullable=False)
 
-    sheep = relationship("Sheep", back_populates="milk_productions")
\ No newline at end of file
+    sheep = relationship("Sheep", back_populates="milk_productions")
+
+    __table_args__ = (
+        UniqueConstraint('sheep_id', 'date', name='_sheep_date_uc'),
+        Index('ix_milk_production_individual_date', 'date'),
+    )
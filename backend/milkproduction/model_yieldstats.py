@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date, DateTime, Float, Index
+from database import Base
+
+class MilkYieldStats(Base):
+    # Média/variância móveis exponenciais (EWMA) da produção de cada ovelha,
+    # atualizadas a cada registro (milkproduction/anomalies.py)
+    __tablename__ = "milk_yield_stats"
+
+    sheep_id = Column(Integer, ForeignKey("sheep.id", ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, nullable=False)  # registros vistos
+    mean = Column(Float, nullable=False)
+    variance = Column(Float, nullable=False)
+    last_date = Column(Date, nullable=False)
+    last_volume = Column(Float, nullable=False)
+    # último registro comparado com a média anterior a ele; None durante o aquecimento
+    expected = Column(Float)
+    deviation = Column(Float)  # (volume - esperado) / desvio padrão
+    # estado antes do último registro: correção de last_date desfaz só um passo
+    previous_mean = Column(Float)
+    previous_variance = Column(Float)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_milk_yield_stats_deviation', 'deviation'),
+    )
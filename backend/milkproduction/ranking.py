@@ -0,0 +1,83 @@
+"""
+Ranking de produção por ovelha para GET /milk-production/ranking.
+
+Uma única query: total/média por ovelha na janela (milk_production_individual
+pelo índice de data + sheep da fazenda), posição e percentil por funções de
+janela e os pontos de corte dos quantis (percentile_cont) sobre o mesmo CTE.
+O quantil de cada ovelha sai dos próprios cortes (width_bucket), então valores
+empatados caem sempre no mesmo quantil e o quantil bate com os cortes da
+resposta. Só as `limit` linhas pedidas saem do banco, com o tamanho do rebanho
+e os cortes repetidos em cada uma.
+"""
+from datetime import date
+
+from sqlalchemy import Float, cast, func, literal, select, true
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from milkproduction.model_milkproduction import MilkProduction
+from sheep.model_sheep import Sheep
+
+METRICS = ("total", "average")
+
+# tabelas (Core): a query não depende de todos os mappers configurados
+milk_table = MilkProduction.__table__
+sheep_table = Sheep.__table__
+
+
+def cut_points(buckets: int) -> list:
+    """Frações que dividem o rebanho em `buckets` quantis (ex.: 4 -> 0.25, 0.5, 0.75)."""
+    return [i / buckets for i in range(1, buckets)]
+
+
+def ranking_query(farm_id: int, start: date, end: date, metric: str = "total", order: str = "top",
+                  limit: int = 10, buckets: int = 4, group_id: int = None):
+    """
+    SELECT das `limit` ovelhas do topo (ou da base) com rank, percentil (0-100,
+    100 = maior produção) e quantil (1 = maior produção), herd_size e cutoffs.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+
+    where = [sheep_table.c.farm_id == farm_id, milk_table.c.date >= start, milk_table.c.date <= end]
+    if group_id is not None:
+        where.append(sheep_table.c.group_id == group_id)
+    # volume é real (float4): soma em double precision
+    volume = cast(milk_table.c.volume, Float)
+    per_sheep = (
+        select(
+            sheep_table.c.id.label("sheep_id"),
+            sheep_table.c.group_id,
+            func.sum(volume).label("total"),
+            func.avg(volume).label("average"),
+            func.count().label("days"),
+        )
+        .select_from(milk_table)
+        .join(sheep_table, sheep_table.c.id == milk_table.c.sheep_id)
+        .where(*where)
+        .group_by(sheep_table.c.id)  # group_id depende da chave primária
+        .cte("per_sheep")
+    )
+
+    value = per_sheep.c[metric]
+    descending = (value.desc(), per_sheep.c.sheep_id)
+    position = descending if order == "top" else (value.asc(), per_sheep.c.sheep_id.desc())
+    ranked = select(
+        per_sheep,
+        func.rank().over(order_by=value.desc()).label("rank"),
+        (func.percent_rank().over(order_by=value) * 100).label("percentile"),
+        func.count().over().label("herd_size"),
+        func.row_number().over(order_by=position).label("position"),
+    ).subquery("ranked")
+
+    cutoffs = select(
+        cast(func.percentile_cont(literal(cut_points(buckets), ARRAY(Float))).within_group(value), ARRAY(Float))
+        .label("cutoffs")
+    ).cte("cutoffs")
+    # width_bucket = quantos cortes (crescentes) são <= valor; quantil 1 = acima de todos
+    bucket = buckets - func.width_bucket(cast(ranked.c[metric], Float), cutoffs.c.cutoffs)
+    return (
+        select(ranked, cutoffs.c.cutoffs, bucket.label("bucket"))
+        .select_from(ranked.join(cutoffs, true()))
+        .where(ranked.c.position <= limit)
+        .order_by(ranked.c.position)
+    )
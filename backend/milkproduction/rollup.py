@@ -0,0 +1,119 @@
+"""
+Manutenção do rollup diário milk_daily_farm_group.
+
+As rotas que escrevem produção de leite (ou mudam ovelhas de grupo/fazenda)
+atualizam o rollup na mesma transação. Para reconstruir a partir de
+milk_production_individual:
+
+    python -m milkproduction.rollup            # todas as fazendas
+    python -m milkproduction.rollup --farm-id 3
+"""
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import select, delete, func, or_, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from milkproduction.model_milkdaily import MilkDailyFarmGroup
+from milkproduction.model_milkproduction import MilkProduction
+from sheep.model_sheep import Sheep
+
+
+def apply_deltas(db: Session, deltas):
+    """
+    Soma deltas ao rollup. `deltas` é um iterável de
+    (farm_id, group_id, date, volume_delta, count_delta).
+    """
+    merged = defaultdict(lambda: [0.0, 0])
+    for farm_id, group_id, day, volume_delta, count_delta in deltas:
+        merged[(farm_id, group_id, day)][0] += volume_delta
+        merged[(farm_id, group_id, day)][1] += count_delta
+
+    if not merged:
+        return
+
+    stmt = insert(MilkDailyFarmGroup)
+    stmt = stmt.on_conflict_do_update(
+        constraint="_milk_daily_farm_group_uc",
+        set_={
+            "total": MilkDailyFarmGroup.total + stmt.excluded.total,
+            "count": MilkDailyFarmGroup.count + stmt.excluded.count,
+        },
+    )
+    db.execute(stmt, [
+        {"farm_id": farm_id, "group_id": group_id, "date": day, "total": total, "count": count}
+        for (farm_id, group_id, day), (total, count) in merged.items()
+    ])
+
+
+def _group_filter(column, group_ids):
+    group_ids = set(group_ids)
+    conditions = []
+    if None in group_ids:
+        conditions.append(column.is_(None))
+    if group_ids - {None}:
+        conditions.append(column.in_(group_ids - {None}))
+    return or_(*conditions)
+
+
+def rebuild(db: Session, farm_id=None, group_ids=None, dates=None):
+    """
+    Recalcula o rollup a partir de milk_production_individual. Sem argumentos
+    reconstrói tudo; `farm_id`, `group_ids` (pode conter None) e `dates`
+    restringem o recálculo às células afetadas.
+    """
+    rollup_filters = []
+    source_filters = []
+    if farm_id is not None:
+        rollup_filters.append(MilkDailyFarmGroup.farm_id == farm_id)
+        source_filters.append(Sheep.farm_id == farm_id)
+    if group_ids is not None:
+        if not group_ids:
+            return
+        rollup_filters.append(_group_filter(MilkDailyFarmGroup.group_id, group_ids))
+        source_filters.append(_group_filter(Sheep.group_id, group_ids))
+    if dates is not None:
+        if not dates:
+            return
+        rollup_filters.append(MilkDailyFarmGroup.date.in_(dates))
+        source_filters.append(MilkProduction.date.in_(dates))
+
+    db.execute(delete(MilkDailyFarmGroup).where(and_(True, *rollup_filters)))
+
+    source = (
+        select(
+            Sheep.farm_id,
+            Sheep.group_id,
+            MilkProduction.date,
+            func.sum(MilkProduction.volume),
+            func.count(MilkProduction.id),
+        )
+        .join(Sheep, Sheep.id == MilkProduction.sheep_id)
+        .where(and_(True, *source_filters))
+        .group_by(Sheep.farm_id, Sheep.group_id, MilkProduction.date)
+    )
+    db.execute(
+        insert(MilkDailyFarmGroup).from_select(
+            ["farm_id", "group_id", "date", "total", "count"], source
+        )
+    )
+
+
+def main():
+    from database import SessionLocal
+    import main as app_main  # noqa: F401  registra todos os models
+
+    parser = argparse.ArgumentParser(description="Reconstrói o rollup milk_daily_farm_group")
+    parser.add_argument("--farm-id", type=int, default=None)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        rebuild(db, farm_id=args.farm_id)
+        db.commit()
+        rows = db.query(func.count(MilkDailyFarmGroup.id)).scalar()
+    print(f"milk_daily_farm_group: {rows} linhas")
+
+
+if __name__ == "__main__":
+    main()
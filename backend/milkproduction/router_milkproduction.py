@@ -1,44 +1,55 @@
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Body, Query, Request, Response
 from sqlalchemy.orm import Session
-from database import get_db
+from database import SessionLocal, get_db, get_read_db, get_async_read_db
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
 from milkproduction.model_milkproduction import MilkProduction
-from farmer.model_farmer import Farmer
+from milkproduction.model_milkdaily import MilkDailyFarmGroup
+from milkproduction.model_forecast import MilkForecast
 from sheep.model_sheep import Sheep
 from farm.model_farm import Farm
 from sheepgroup.model_sheepgroup import SheepGroup
-from sqlalchemy import func, text
+from sqlalchemy import func, text, select
 from datetime import date
-from auth.router_auth import get_current_user, get_db
-from milkproduction.schema_milkproduction import MilkProductionCreate, MilkProductionResponse, MilkProductionUpdate
+from auth.router_auth import get_current_user, get_current_farmer, get_db
+from milkproduction.schema_milkproduction import MilkProductionCreate, MilkProductionResponse, MilkProductionUpdate, MilkBulkResponse, MilkSeriesResponse, MilkAnomaly, MilkForecastResponse, MilkRankingResponse
 from auth.schema_auth import TokenUser
 from datetime import timedelta, date
 from collections import defaultdict
+from typing import List, Literal, Optional
+import hashlib
+import json
+import os
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import literal_column, cast, Integer, Date, Float
+from sqlalchemy.dialects.postgresql import insert, ARRAY
+from milkproduction import rollup, series, anomalies, forecast, ranking, lactation
+from bulk_upload import read_bulk_rows
+import response_cache
 
 router = APIRouter()
 
+# limite de linhas por envio em POST /milk-production/bulk (acima dele, 413)
+MAX_BULK_ROWS = int(os.getenv("MILK_BULK_MAX_ROWS", "50000"))
+# limite de buckets (pontos por série) em GET /milk-production/series
+MAX_SERIES_BUCKETS = 1000
+
 @router.get("/total-today")
 async def get_total_milk_today(
-    db: Session = Depends(get_db),
-    current_user: TokenUser = Depends(get_current_user)  # ainda retorna TokenUser
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_farmer)  # ainda retorna TokenUser
 ):
     today = date.today()
 
-    # Buscar o Farmer completo usando o email do TokenUser
-    farmer = db.query(Farmer).filter(Farmer.email == current_user.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    # Só considerar produção de ovelhas da fazenda do usuário
-    total_volume = (
-        db.query(func.sum(MilkProduction.volume))
-        .join(Sheep, Sheep.id == MilkProduction.sheep_id)
-        .filter(
-            Sheep.farm_id == farmer.farm_id,
-            MilkProduction.date == today
+    # Só considerar produção de ovelhas da fazenda do usuário (lido do rollup diário)
+    total_volume = await db.scalar(
+        select(func.sum(MilkDailyFarmGroup.total))
+        .where(
+            MilkDailyFarmGroup.farm_id == current_user.farm_id,
+            MilkDailyFarmGroup.date == today
         )
-        .scalar()
     )
 
     if total_volume is None:
@@ -54,66 +65,53 @@ async def get_total_milk_today(
 
 @router.get("/total-today-by-group")
 async def get_total_today_by_group(
-    db: Session = Depends(get_db),
-    current_user: TokenUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_farmer)
 ):
-    from sheepgroup.model_sheepgroup import SheepGroup
     today = date.today()
 
-    # Obter o fazendeiro com farm_id
-    farmer = db.query(Farmer).filter(Farmer.email == current_user.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    # Join de ovelha -> grupo e somar volume
-    results = (
-        db.query(Sheep.group_id, func.sum(MilkProduction.volume).label("total_volume"))
-        .join(MilkProduction, Sheep.id == MilkProduction.sheep_id)
-        .filter(
-            MilkProduction.date == today,
-            Sheep.farm_id == farmer.farm_id,
-            Sheep.group_id != None
+    # Rollup do dia por grupo, já com o nome do grupo
+    results = (await db.execute(
+        select(
+            SheepGroup.id.label("group_id"),
+            SheepGroup.name.label("group_name"),
+            func.sum(MilkDailyFarmGroup.total).label("total_volume")
         )
-        .group_by(Sheep.group_id)
-        .all()
-    )
-
-    response = []
-    for row in results:
-        group = db.query(SheepGroup).filter(SheepGroup.id == row.group_id).first()
-        if group:
-            response.append({
-                "group_id": group.id,
-                "group_name": group.name,
-                "total_volume": round(row.total_volume, 2)
-            })
+        .join(SheepGroup, SheepGroup.id == MilkDailyFarmGroup.group_id)
+        .where(
+            MilkDailyFarmGroup.date == today,
+            MilkDailyFarmGroup.farm_id == current_user.farm_id
+        )
+        .group_by(SheepGroup.id, SheepGroup.name)
+    )).all()
 
-    return response
+    return [
+        {
+            "group_id": row.group_id,
+            "group_name": row.group_name,
+            "total_volume": round(row.total_volume, 2)
+        }
+        for row in results
+    ]
 
 
 
 
 @router.get("/sum-last-7-days")
 async def sum_last_7_days(
-    db: Session = Depends(get_db),
-    current_user: TokenUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_farmer)
 ):
     today = date.today()
     start_date = today - timedelta(days=7)
 
-    farmer = db.query(Farmer).filter(Farmer.email == current_user.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    total_volume = (
-        db.query(func.coalesce(func.sum(MilkProduction.volume), 0))
-        .join(Sheep, Sheep.id == MilkProduction.sheep_id)
-        .filter(
-            Sheep.farm_id == farmer.farm_id,
-            MilkProduction.date >= start_date,
-            MilkProduction.date <= today
+    total_volume = await db.scalar(
+        select(func.coalesce(func.sum(MilkDailyFarmGroup.total), 0))
+        .where(
+            MilkDailyFarmGroup.farm_id == current_user.farm_id,
+            MilkDailyFarmGroup.date >= start_date,
+            MilkDailyFarmGroup.date <= today
         )
-        .scalar()
     )
 
     return {
@@ -126,26 +124,20 @@ async def sum_last_7_days(
 
 @router.get("/sum-2-weeks-ago")
 async def sum_2_weeks_ago(
-    db: Session = Depends(get_db),
-    current_user: TokenUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_farmer)
 ):
     today = date.today()
     start_date = today - timedelta(days=14)
     end_date = today - timedelta(days=8)
 
-    farmer = db.query(Farmer).filter(Farmer.email == current_user.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    total_volume = (
-        db.query(func.coalesce(func.sum(MilkProduction.volume), 0))
-        .join(Sheep, Sheep.id == MilkProduction.sheep_id)
-        .filter(
-            Sheep.farm_id == farmer.farm_id,
-            MilkProduction.date >= start_date,
-            MilkProduction.date <= end_date
+    total_volume = await db.scalar(
+        select(func.coalesce(func.sum(MilkDailyFarmGroup.total), 0))
+        .where(
+            MilkDailyFarmGroup.farm_id == current_user.farm_id,
+            MilkDailyFarmGroup.date >= start_date,
+            MilkDailyFarmGroup.date <= end_date
         )
-        .scalar()
     )
 
     return {
@@ -158,23 +150,23 @@ async def sum_2_weeks_ago(
 
 @router.get("/daily-total-last-7-days")
 async def daily_total_last_7_days(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: TokenUser = Depends(get_current_user)
 ):
     today = date.today()
     days = [today - timedelta(days=i) for i in range(7)]
 
-    result = db.query(
-        MilkProduction.date,
-        func.sum(MilkProduction.volume).label('total_volume')
-    ).join(Sheep, Sheep.id == MilkProduction.sheep_id) \
-     .filter(
-         MilkProduction.date.in_(days),
-         Sheep.farm_id == current_user.farm_id
-     ) \
-     .group_by(MilkProduction.date) \
-     .order_by(MilkProduction.date) \
-     .all()
+    result = (await db.execute(
+        select(
+            MilkDailyFarmGroup.date,
+            func.sum(MilkDailyFarmGroup.total).label('total_volume')
+        ).where(
+            MilkDailyFarmGroup.date.in_(days),
+            MilkDailyFarmGroup.farm_id == current_user.farm_id
+        )
+        .group_by(MilkDailyFarmGroup.date)
+        .order_by(MilkDailyFarmGroup.date)
+    )).all()
 
     return [
         {"date": str(r[0]), "total_volume": round(r[1], 2) if r[1] is not None else 0}
@@ -185,29 +177,31 @@ async def daily_total_last_7_days(
 
 @router.get("/daily-by-group-last-7-days")
 async def daily_by_group_last_7_days(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: TokenUser = Depends(get_current_user)
 ):
     today = date.today()
     days = [today - timedelta(days=i) for i in range(6, -1, -1)]  # ordem cronológica (6 dias atrás até hoje)
 
     # Buscar todos os grupos da fazenda
-    groups = db.query(SheepGroup.name).join(Sheep).filter(Sheep.farm_id == current_user.farm_id).distinct().all()
+    groups = (await db.execute(
+        select(SheepGroup.name).join(Sheep).where(Sheep.farm_id == current_user.farm_id).distinct()
+    )).all()
     group_names = [g.name for g in groups]
 
     # Obter os dados reais de produção
-    result = db.query(
-        MilkProduction.date,
-        SheepGroup.name.label('group_name'),
-        func.sum(MilkProduction.volume).label('total_volume')
-    ).join(Sheep, Sheep.id == MilkProduction.sheep_id) \
-     .join(SheepGroup, Sheep.group_id == SheepGroup.id) \
-     .filter(
-         MilkProduction.date.in_(days),
-         Sheep.farm_id == current_user.farm_id
-     ) \
-     .group_by(MilkProduction.date, SheepGroup.name) \
-     .all()
+    result = (await db.execute(
+        select(
+            MilkDailyFarmGroup.date,
+            SheepGroup.name.label('group_name'),
+            func.sum(MilkDailyFarmGroup.total).label('total_volume')
+        ).join(SheepGroup, MilkDailyFarmGroup.group_id == SheepGroup.id)
+        .where(
+            MilkDailyFarmGroup.date.in_(days),
+            MilkDailyFarmGroup.farm_id == current_user.farm_id
+        )
+        .group_by(MilkDailyFarmGroup.date, SheepGroup.name)
+    )).all()
 
     # Organizar dados por data e grupo
     data_dict = defaultdict(lambda: defaultdict(float))
@@ -224,4 +218,369 @@ async def daily_by_group_last_7_days(
                 "total_volume": round(data_dict[d][group], 2)
             })
 
-    return final_result
\ No newline at end of file
+    return final_result
+
+
+
+@router.get("/series", response_model=MilkSeriesResponse)
+async def get_milk_series(
+    start: Optional[date] = Query(None, alias="from", description="Padrão: 30 dias antes de `to`"),
+    end: Optional[date] = Query(None, alias="to", description="Padrão: hoje"),
+    granularity: Literal["day", "week", "month", "year"] = Query("day"),
+    group_by: Literal["farm", "group", "sheep", "gender", "birth_year"] = Query("farm"),
+    limit: int = Query(50, ge=1, le=500, description="Máximo de séries (as de maior volume)"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="`from` must be before `to`")
+
+    bucket_list = series.buckets(start, end, granularity)
+    if len(bucket_list) > MAX_SERIES_BUCKETS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_SERIES_BUCKETS} buckets per series; use a coarser granularity")
+
+    keys = None
+    truncated = False
+    if group_by == "sheep":
+        # só as `limit` ovelhas de maior volume entram no GROUP BY por bucket
+        keys = (await db.execute(
+            series.top_keys_query(current_user.farm_id, start, end, limit + 1)
+        )).scalars().all()
+        truncated = len(keys) > limit
+        keys = keys[:limit]
+
+    rows = (await db.execute(
+        series.series_query(current_user.farm_id, start, end, granularity, group_by, keys)
+    )).all()
+    result, more = series.assemble(rows, bucket_list, limit)
+    if group_by == "farm" and not result:
+        result = [{"key": None, "label": None, "values": [0.0] * len(bucket_list), "total": 0.0}]
+
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "group_by": group_by,
+        "source": "rollup" if group_by in series.ROLLUP_GROUP_BYS else "individual",
+        "buckets": bucket_list,
+        "series": result,
+        "truncated": truncated or more,
+    }
+
+
+
+# GET /milk-production/ranking - topo/base do rebanho, percentis e quantis calculados no banco
+@router.get("/ranking", response_model=MilkRankingResponse)
+async def get_milk_ranking(
+    start: Optional[date] = Query(None, alias="from", description="Padrão: 30 dias antes de `to`"),
+    end: Optional[date] = Query(None, alias="to", description="Padrão: hoje"),
+    metric: Literal["total", "average"] = Query("total"),
+    order: Literal["top", "bottom"] = Query("top"),
+    limit: int = Query(10, ge=1, le=500),
+    buckets: int = Query(4, ge=2, le=100, description="Quantis (4 = quartis, 10 = decis)"),
+    group_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="`from` must be before `to`")
+
+    rows = (await db.execute(
+        ranking.ranking_query(current_user.farm_id, start, end, metric, order, limit, buckets, group_id)
+    )).all()
+
+    return {
+        "start": start,
+        "end": end,
+        "metric": metric,
+        "order": order,
+        "buckets": buckets,
+        "herd_size": rows[0].herd_size if rows else 0,
+        "cutoffs": [round(value, 2) for value in rows[0].cutoffs] if rows else [],
+        "sheep": [
+            {
+                "sheep_id": row.sheep_id,
+                "group_id": row.group_id,
+                "rank": row.rank,
+                "total": round(row.total, 2),
+                "average": round(row.average, 2),
+                "days": row.days,
+                "percentile": round(row.percentile, 1),
+                "bucket": row.bucket,
+            }
+            for row in rows
+        ],
+    }
+
+
+
+# GET /milk-production/forecast - previsão diária da fazenda ou de cada grupo (milkproduction/forecast.py)
+def _refit_forecast(farm_id: int, origin: date):
+    # roda depois da resposta, no primário; o lock evita ajustes repetidos
+    with SessionLocal() as db:
+        refit = forecast.refresh_stale(db, farm_id, origin)
+        db.commit()
+    if refit:
+        response_cache.bump_farm(farm_id)
+
+
+@router.get("/forecast", response_model=MilkForecastResponse)
+def get_milk_forecast(
+    background_tasks: BackgroundTasks,
+    days: int = Query(14, ge=1, le=forecast.FORECAST_HORIZON),
+    group_by: Literal["farm", "group"] = Query("farm"),
+    db: Session = Depends(get_read_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    expected = date.today() - timedelta(days=1)
+
+    # a linha da fazenda sempre existe depois de um ajuste (history_days = 0 se não há histórico)
+    fitted = db.execute(
+        select(MilkForecast.origin, MilkForecast.fitted_at)
+        .where(MilkForecast.farm_id == current_user.farm_id, MilkForecast.scope == "farm")
+    ).first()
+    stale = fitted is None or fitted.origin != expected
+    if stale:
+        # o ajuste noturno ainda não incluiu ontem (ou a fazenda é nova): serve o que há
+        # e reajusta só esta fazenda em segundo plano
+        background_tasks.add_task(_refit_forecast, current_user.farm_id, expected)
+    origin = fitted.origin if fitted is not None else expected
+
+    rows = db.execute(
+        select(MilkForecast, SheepGroup.name)
+        .outerjoin(SheepGroup, SheepGroup.id == MilkForecast.group_id)
+        .where(
+            MilkForecast.farm_id == current_user.farm_id,
+            MilkForecast.scope == group_by,
+            MilkForecast.history_days > 0
+        )
+    ).all()
+
+    result = [
+        {
+            "key": stored_forecast.group_id,
+            "label": name,
+            "values": stored_forecast.values[:days],
+            "lower": stored_forecast.lower[:days],
+            "upper": stored_forecast.upper[:days],
+            "total": round(sum(stored_forecast.values[:days]), 2),
+        }
+        for stored_forecast, name in rows
+    ]
+    result.sort(key=lambda entry: (-entry["total"], str(entry["key"])))
+
+    return {
+        "origin": origin,
+        "fitted_at": fitted.fitted_at if fitted is not None else None,
+        "stale": stale,
+        "days": days,
+        "group_by": group_by,
+        "dates": [origin + timedelta(days=i) for i in range(1, days + 1)],
+        "series": result,
+    }
+
+
+# GET /milk-production/anomalies - ovelhas cujo último registro caiu muito abaixo da média móvel
+@router.get("/anomalies", response_model=List[MilkAnomaly])
+async def get_milk_anomalies(
+    threshold: float = Query(anomalies.ANOMALY_THRESHOLD, gt=0, description="Queda mínima, em desvios padrão"),
+    days: int = Query(7, ge=1, le=365, description="Só registros dos últimos N dias"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    # lê só milk_yield_stats (uma linha por ovelha), sem varrer o histórico
+    since = date.today() - timedelta(days=days - 1)
+    rows = (await db.execute(anomalies.anomalies_query(current_user.farm_id, since, threshold))).all()
+    return [
+        {
+            "sheep_id": row.sheep_id,
+            "group_id": row.group_id,
+            "date": row.last_date,
+            "volume": row.last_volume,
+            "expected": round(row.expected, 2),
+            "deviation": round(row.deviation, 2),
+            "drop": round(1 - row.last_volume / row.expected, 4) if row.expected else None,
+        }
+        for row in rows
+    ]
+
+
+@router.get("/summary")
+def get_dashboard_summary(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    # Todos os números do dashboard a partir de uma única query agrupada
+    # sobre os últimos 14 dias do rollup diário
+    today = date.today()
+    window_start = today - timedelta(days=14)
+
+    rows = (
+        db.query(
+            MilkDailyFarmGroup.date,
+            MilkDailyFarmGroup.group_id,
+            SheepGroup.name.label("group_name"),
+            func.sum(MilkDailyFarmGroup.total).label("total_volume")
+        )
+        .outerjoin(SheepGroup, SheepGroup.id == MilkDailyFarmGroup.group_id)
+        .filter(
+            MilkDailyFarmGroup.farm_id == current_user.farm_id,
+            MilkDailyFarmGroup.date >= window_start,
+            MilkDailyFarmGroup.date <= today
+        )
+        .group_by(MilkDailyFarmGroup.date, MilkDailyFarmGroup.group_id, SheepGroup.name)
+        .all()
+    )
+
+    last_7_start = today - timedelta(days=7)
+    two_weeks_start, two_weeks_end = today - timedelta(days=14), today - timedelta(days=8)
+    daily_start = today - timedelta(days=6)
+
+    total_today = 0.0
+    sum_last_7 = 0.0
+    sum_2_weeks_ago = 0.0
+    by_group_today = []
+    daily = defaultdict(float)
+
+    for row in rows:
+        volume = float(row.total_volume or 0)
+        if row.date == today:
+            total_today += volume
+            if row.group_id is not None:
+                by_group_today.append({
+                    "group_id": row.group_id,
+                    "group_name": row.group_name,
+                    "total_volume": round(volume, 2)
+                })
+        if last_7_start <= row.date <= today:
+            sum_last_7 += volume
+        if two_weeks_start <= row.date <= two_weeks_end:
+            sum_2_weeks_ago += volume
+        if row.date >= daily_start:
+            daily[row.date] += volume
+
+    summary = {
+        "total_today": {
+            "total_volume": round(total_today, 2),
+            "date": str(today)
+        },
+        "total_today_by_group": sorted(by_group_today, key=lambda g: g["group_id"]),
+        "sum_last_7_days": {
+            "total_volume": round(sum_last_7, 2),
+            "start_date": str(last_7_start),
+            "end_date": str(today)
+        },
+        "sum_2_weeks_ago": {
+            "total_volume": round(sum_2_weeks_ago, 2),
+            "start_date": str(two_weeks_start),
+            "end_date": str(two_weeks_end)
+        },
+        "daily_total_last_7_days": [
+            {"date": str(d), "total_volume": round(daily[d], 2)}
+            for d in sorted(daily)
+        ]
+    }
+
+    etag = '"' + hashlib.sha1(json.dumps(summary, sort_keys=True).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return summary
+
+
+
+def _ingest_milk_rows(db: Session, farm_id: int, rows):
+    results = [None] * len(rows)
+    valid = {}
+
+    # validação linha a linha; a última linha de um mesmo (sheep_id, date) vale
+    for index, raw in enumerate(rows):
+        try:
+            record = MilkProductionCreate.model_validate(raw)
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            results[index] = {"index": index, "status": "rejected",
+                              "error": f"{'.'.join(str(p) for p in error['loc'])}: {error['msg']}"}
+            continue
+        key = (record.sheep_id, record.date)
+        if key in valid:
+            previous_index = valid[key][0]
+            results[previous_index] = {"index": previous_index, "sheep_id": record.sheep_id,
+                                       "date": record.date, "status": "superseded"}
+        valid[key] = (index, record)
+
+    # posse das ovelhas validada com uma única query
+    sheep_ids = {sheep_id for sheep_id, _ in valid}
+    owned = set()
+    if sheep_ids:
+        owned = set(db.scalars(
+            select(Sheep.id).where(Sheep.farm_id == farm_id, Sheep.id.in_(sheep_ids))
+        ))
+
+    to_write = []
+    for (sheep_id, day), (index, record) in valid.items():
+        if sheep_id not in owned:
+            results[index] = {"index": index, "sheep_id": sheep_id, "date": day, "status": "rejected",
+                              "error": "Sheep not found or not authorized"}
+        else:
+            to_write.append((index, record))
+
+    if to_write:
+        # um único INSERT ... SELECT FROM unnest(arrays): 3 parâmetros em vez de 3 por linha
+        batch = func.unnest(
+            cast([record.sheep_id for _, record in to_write], ARRAY(Integer)),
+            cast([record.date for _, record in to_write], ARRAY(Date)),
+            cast([record.volume for _, record in to_write], ARRAY(Float))
+        ).table_valued("sheep_id", "date", "volume").render_derived()
+        stmt = insert(MilkProduction).from_select(
+            ["sheep_id", "date", "volume"],
+            select(batch.c.sheep_id, batch.c.date, batch.c.volume)
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="_sheep_date_uc",
+            set_={"volume": stmt.excluded.volume}
+        ).returning(MilkProduction.sheep_id, MilkProduction.date, literal_column("xmax = 0").label("inserted"))
+
+        written = db.execute(stmt).all()
+        inserted = {(row.sheep_id, row.date): row.inserted for row in written}
+
+        for index, record in to_write:
+            results[index] = {"index": index, "sheep_id": record.sheep_id, "date": record.date,
+                              "status": "created" if inserted[(record.sheep_id, record.date)] else "updated"}
+
+        rollup.rebuild(db, farm_id=farm_id, dates={record.date for _, record in to_write})
+        anomalies.record(db, [(record.sheep_id, record.date, record.volume) for _, record in to_write])
+        lactation.mark(db, [record.sheep_id for _, record in to_write])
+
+    db.commit()
+
+    return {
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "updated": sum(1 for r in results if r["status"] == "updated"),
+        "rejected": sum(1 for r in results if r["status"] == "rejected"),
+        "rows": results
+    }
+
+
+@router.post("/bulk", response_model=MilkBulkResponse)
+async def bulk_record_milk(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_farmer)  # só o dono da fazenda registra ordenha
+):
+    # Recebe uma sessão inteira da ordenha: JSON [{sheep_id, date, volume}, ...],
+    # NDJSON ou text/csv com cabeçalho sheep_id,date,volume
+    rows = await read_bulk_rows(request, MAX_BULK_ROWS)
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per request")
+
+    return await run_in_threadpool(_ingest_milk_rows, db, current_user.farm_id, rows)
@@ -1,6 +1,8 @@
 
 from pydantic import BaseModel, ConfigDict
 from datetime import date
+import datetime
+from typing import List, Literal, Optional, Union
 
 class MilkProductionCreate(BaseModel):
     sheep_id: int  # ID da ovelha
@@ -24,3 +26,102 @@ class MilkProductionUpdate(BaseModel):
     volume: float  # Volume de leite produzido
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class MilkBulkRowResult(BaseModel):
+    index: int  # posição da linha no envio (0 = primeira linha de dados)
+    sheep_id: Optional[int] = None
+    date: Optional[datetime.date] = None
+    status: Literal["created", "updated", "superseded", "rejected"]
+    error: Optional[str] = None
+
+
+class MilkBulkResponse(BaseModel):
+    created: int
+    updated: int
+    rejected: int
+    rows: List[MilkBulkRowResult]
+
+
+class MilkSeries(BaseModel):
+    key: Optional[Union[int, str]] = None  # group_id, sheep_id, sexo ou ano; None = fazenda/sem grupo
+    label: Optional[str] = None  # nome do grupo
+    values: List[float]  # um valor por bucket
+    total: float
+
+
+class MilkSeriesResponse(BaseModel):
+    start: date
+    end: date
+    granularity: Literal["day", "week", "month", "year"]
+    group_by: Literal["farm", "group", "sheep", "gender", "birth_year"]
+    source: Literal["rollup", "individual"]
+    buckets: List[date]  # início de cada período (date_trunc)
+    series: List[MilkSeries]
+    truncated: bool  # mais séries que `limit`
+
+
+class MilkForecastSeries(BaseModel):
+    key: Optional[int] = None  # group_id; None = fazenda/sem grupo
+    label: Optional[str] = None  # nome do grupo
+    values: List[float]  # um valor por dia previsto
+    lower: List[float]  # intervalo de 95%
+    upper: List[float]
+    total: float
+
+
+class MilkForecastResponse(BaseModel):
+    origin: date  # último dia do histórico usado
+    fitted_at: Optional[datetime.datetime] = None
+    stale: bool  # a previsão gravada não inclui ontem; o reajuste foi agendado
+    days: int
+    group_by: Literal["farm", "group"]
+    dates: List[date]
+    series: List[MilkForecastSeries]
+
+
+class MilkAnomaly(BaseModel):
+    sheep_id: int
+    group_id: Optional[int] = None
+    date: date  # último registro da ovelha
+    volume: float
+    expected: float  # média móvel (EWMA) antes do registro
+    deviation: float  # (volume - esperado) / desvio padrão
+    drop: Optional[float] = None  # fração abaixo do esperado
+
+
+class MilkRankingEntry(BaseModel):
+    sheep_id: int
+    group_id: Optional[int] = None
+    rank: int  # 1 = maior produção (empates dividem a posição)
+    total: float
+    average: float  # litros por dia com registro
+    days: int  # dias com registro na janela
+    percentile: float  # 0-100, fração do rebanho com produção menor
+    bucket: int  # quantil, 1 = maior produção
+
+
+class MilkRankingResponse(BaseModel):
+    start: date
+    end: date
+    metric: Literal["total", "average"]
+    order: Literal["top", "bottom"]
+    buckets: int
+    herd_size: int  # ovelhas com registro na janela
+    cutoffs: List[float]  # limites entre quantis, crescentes
+    sheep: List[MilkRankingEntry]
+
+
+class LactationCurveResponse(BaseModel):
+    sheep_id: int
+    lactation_start: Optional[date] = None  # primeiro registro da lactação atual
+    records: int  # registros usados no ajuste
+    a: Optional[float] = None  # y = a * t^b * e^(-c t)
+    b: Optional[float] = None
+    c: Optional[float] = None
+    peak_yield: Optional[float] = None  # litros/dia no pico
+    days_to_peak: Optional[float] = None
+    persistency: Optional[float] = None  # -(b + 1) ln c
+    fitted_at: datetime.datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,129 @@
+"""
+Séries temporais de produção de leite para GET /milk-production/series.
+
+Cada pedido vira um único GROUP BY (date_trunc(granularidade, data), chave).
+Agrupamentos por fazenda e por grupo leem o rollup diário milk_daily_farm_group;
+por ovelha, sexo e ano de nascimento leem milk_production_individual + sheep.
+A saída é colunar (lista de buckets + um vetor de valores por série),
+preenchida com zeros.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import Date, DateTime, Integer, cast, extract, func, literal_column, select
+
+from milkproduction.model_milkdaily import MilkDailyFarmGroup
+from milkproduction.model_milkproduction import MilkProduction
+from sheep.model_sheep import Sheep
+from sheepgroup.model_sheepgroup import SheepGroup
+
+GRANULARITIES = ("day", "week", "month", "year")
+GROUP_BYS = ("farm", "group", "sheep", "gender", "birth_year")
+ROLLUP_GROUP_BYS = ("farm", "group")
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    # mesma convenção do date_trunc do Postgres (semana começa na segunda)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "year":
+        return day.replace(month=1, day=1)
+    return day
+
+
+def buckets(start: date, end: date, granularity: str) -> list:
+    result = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        result.append(current)
+        if granularity == "day":
+            current += timedelta(days=1)
+        elif granularity == "week":
+            current += timedelta(days=7)
+        elif granularity == "month":
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current = current.replace(year=current.year + 1)
+    return result
+
+
+def series_query(farm_id: int, start: date, end: date, granularity: str, group_by: str, keys=None):
+    """SELECT (bucket, key, label, total) para o agrupamento pedido; `keys` restringe as séries."""
+    if group_by in ROLLUP_GROUP_BYS:
+        day, volume = MilkDailyFarmGroup.date, MilkDailyFarmGroup.total
+        source = MilkDailyFarmGroup
+        where = [MilkDailyFarmGroup.farm_id == farm_id]
+    else:
+        day, volume = MilkProduction.date, MilkProduction.volume
+        source = MilkProduction
+        where = [Sheep.farm_id == farm_id]
+
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    # granularidade como literal: o mesmo texto no SELECT e no GROUP BY (com bind seriam $1 e $2)
+    # date -> timestamp sem fuso: date_trunc(text, date) usaria timestamptz e o fuso da sessão
+    bucket = cast(func.date_trunc(literal_column(f"'{granularity}'"), cast(day, DateTime)), Date).label("bucket")
+    if group_by == "farm":
+        key, label = None, None
+    elif group_by == "group":
+        key, label = MilkDailyFarmGroup.group_id, SheepGroup.name
+    elif group_by == "sheep":
+        key, label = Sheep.id, None
+    elif group_by == "gender":
+        key, label = Sheep.gender, None
+    else:
+        key, label = cast(extract("year", Sheep.birth_date), Integer), None
+
+    columns = [bucket]
+    group = [bucket]
+    if key is not None:
+        columns.append(key.label("key"))
+        group.append(key)
+    if label is not None:
+        columns.append(label.label("label"))
+        group.append(label)
+    columns.append(func.sum(volume).label("total"))
+
+    query = select(*columns).select_from(source)
+    if group_by == "group":
+        query = query.outerjoin(SheepGroup, SheepGroup.id == MilkDailyFarmGroup.group_id)
+    elif group_by not in ROLLUP_GROUP_BYS:
+        query = query.join(Sheep, Sheep.id == MilkProduction.sheep_id)
+    if keys is not None:
+        where.append(key.in_(keys))
+
+    return query.where(*where, day >= start, day <= end).group_by(*group)
+
+
+def top_keys_query(farm_id: int, start: date, end: date, limit: int):
+    """Ovelhas com maior produção no período (séries de group_by=sheep)."""
+    return (
+        select(MilkProduction.sheep_id)
+        .join(Sheep, Sheep.id == MilkProduction.sheep_id)
+        .where(Sheep.farm_id == farm_id, MilkProduction.date >= start, MilkProduction.date <= end)
+        .group_by(MilkProduction.sheep_id)
+        .order_by(func.sum(MilkProduction.volume).desc(), MilkProduction.sheep_id)
+        .limit(limit)
+    )
+
+
+def assemble(rows, bucket_list, limit: int) -> tuple:
+    """(séries zero-preenchidas ordenadas pelo total, truncado?) a partir das linhas do GROUP BY."""
+    position = {bucket: i for i, bucket in enumerate(bucket_list)}
+    series = {}
+    for row in rows:
+        mapping = row._mapping
+        key = mapping.get("key")
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = {"key": key, "label": mapping.get("label"), "values": [0.0] * len(bucket_list)}
+        entry["values"][position[row.bucket]] += float(row.total or 0)
+
+    ordered = []
+    for entry in series.values():
+        entry["values"] = [round(value, 2) for value in entry["values"]]
+        entry["total"] = round(sum(entry["values"]), 2)
+        ordered.append(entry)
+    ordered.sort(key=lambda entry: (-entry["total"], str(entry["key"])))
+    return ordered[:limit], len(ordered) > limit
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+# Cache em memória (por processo) do usuário autenticado, indexado pelo token.
+# Evita o SELECT em farmer/veterinarian a cada requisição em get_current_user.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (expira_em, usuário)
+_tokens_by_email: Dict[str, Set[str]] = {}
+
+
+def get_principal(token: str):
+    with _lock:
+        entry = _entries.get(token)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            _remove(token)
+            return None
+        _entries.move_to_end(token)
+        return user
+
+
+def set_principal(token: str, user, token_exp: Optional[float] = None):
+    # nunca guarda além da expiração do próprio JWT
+    ttl = PRINCIPAL_CACHE_TTL
+    if token_exp is not None:
+        ttl = min(ttl, token_exp - time.time())
+    if ttl <= 0:
+        return
+
+    with _lock:
+        _remove(token)
+        _entries[token] = (time.monotonic() + ttl, user)
+        _tokens_by_email.setdefault(user.email, set()).add(token)
+        while len(_entries) > PRINCIPAL_CACHE_SIZE:
+            _remove(next(iter(_entries)))
+
+
+def invalidate_token(token: str):
+    with _lock:
+        _remove(token)
+
+
+def invalidate_email(*emails: str):
+    # usado quando farmer/veterinarian é criado ou alterado, e no login
+    with _lock:
+        for email in emails:
+            for token in list(_tokens_by_email.get(email, ())):
+                _remove(token)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _tokens_by_email.clear()
+
+
+def _remove(token: str):
+    entry = _entries.pop(token, None)
+    if entry is None:
+        return
+    email = entry[1].email
+    tokens = _tokens_by_email.get(email)
+    if tokens is not None:
+        tokens.discard(token)
+        if not tokens:
+            del _tokens_by_email[email]
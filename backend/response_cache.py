@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from fastapi import Request
+from fastapi.responses import Response
+
+import principal_cache
+from blacklist import is_token_blacklisted
+
+# Cache das respostas GET por fazenda. A chave inclui a versão da fazenda, que é
+# incrementada a cada escrita bem-sucedida de um usuário dela: entradas antigas
+# deixam de ser usadas e saem pelo LRU/TTL. A chave inclui também a data, para as
+# rotas relativas a "hoje" (total-today, sum-last-7-days...) virarem à meia-noite.
+# RESPONSE_CACHE_BACKEND=memory (padrão, por processo) | sqlite (compartilhado) | off
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# workers do uvicorn/gunicorn (ambos leem WEB_CONCURRENCY como padrão de --workers)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# rotas de leitura cacheadas (GET) e as que, ao escrever, invalidam a fazenda
+CACHED_PREFIXES = ("/milk-production/", "/sheep-group/", "/sheep/", "/inventory/", "/sensor/")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+STORED_HEADERS = ("content-type", "etag", "cache-control", "x-next-cursor")
+
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chave -> (expira_em, entrada)
+        self._versions = {}
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, entry: dict, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, farm_id: int) -> int:
+        return self._versions.get(farm_id, 0)
+
+    def bump(self, farm_id: int):
+        with self._lock:
+            self._versions[farm_id] = self._versions.get(farm_id, 0) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    PURGE_INTERVAL = 60  # segundos entre limpezas (expirados + mais antigas além do limite)
+
+    def __init__(self, path: str, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._next_purge = 0.0
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, expires REAL NOT NULL, created REAL NOT NULL, "
+                "status INTEGER NOT NULL, headers TEXT NOT NULL, body BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_created ON response_cache (created)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS farm_version (farm_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT status, headers, body FROM response_cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "headers": json.loads(row[1]), "body": row[2]}
+
+    def set(self, key: str, entry: dict, ttl: float):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, expires, created, status, headers, body) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, now + ttl, now, entry["status"], json.dumps(entry["headers"]), entry["body"])
+            )
+            if now >= self._next_purge:
+                self._next_purge = now + self.PURGE_INTERVAL
+                conn.execute("DELETE FROM response_cache WHERE expires <= ?", (now,))
+                conn.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    "SELECT key FROM response_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def version(self, farm_id: int) -> int:
+        row = self._connection().execute(
+            "SELECT version FROM farm_version WHERE farm_id = ?", (farm_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, farm_id: int):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO farm_version (farm_id, version) VALUES (?, 1) "
+                "ON CONFLICT (farm_id) DO UPDATE SET version = version + 1",
+                (farm_id,)
+            )
+
+    def __len__(self):
+        return self._connection().execute("SELECT count(*) FROM response_cache").fetchone()[0]
+
+
+class CacheMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def create_backend():
+    if RESPONSE_CACHE_BACKEND == "off":
+        return None
+    if RESPONSE_CACHE_BACKEND == "memory":
+        # versões por processo: a escrita num worker não invalidaria os outros
+        if WEB_CONCURRENCY > 1:
+            raise RuntimeError(
+                "RESPONSE_CACHE_BACKEND=memory is per process; with WEB_CONCURRENCY > 1 "
+                "use RESPONSE_CACHE_BACKEND=sqlite (shared) or off"
+            )
+        return MemoryCacheBackend()
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend(RESPONSE_CACHE_PATH)
+    raise RuntimeError(f"Unknown RESPONSE_CACHE_BACKEND: {RESPONSE_CACHE_BACKEND}")
+
+
+backend = create_backend()
+metrics = CacheMetrics()
+
+
+def bump_farm(farm_id: int):
+    if backend is not None:
+        backend.bump(farm_id)
+        metrics.incr("invalidations")
+
+
+def _principal(request: Request):
+    # só o principal já validado por get_current_user (cache de principal) é usado;
+    # sem ele a requisição segue o caminho normal e a autenticação completa
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token or is_token_blacklisted(token):
+        return None
+    return principal_cache.get_principal(token)
+
+
+def _cache_key(request: Request, user) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    version = backend.version(user.farm_id)
+    return f"{user.farm_id}:{version}:{date.today().isoformat()}:{user.role}:{request.url.path}?{query}"
+
+
+def _from_entry(request: Request, entry: dict) -> Response:
+    headers = dict(entry["headers"])
+    etag = headers.get("etag")
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "content-type"})
+    return Response(content=entry["body"], status_code=entry["status"], headers=headers)
+
+
+async def cache_responses(request: Request, call_next):
+    if backend is None or not request.url.path.startswith(CACHED_PREFIXES):
+        return await call_next(request)
+
+    if request.method in WRITE_METHODS:
+        response = await call_next(request)
+        user = _principal(request)
+        if user is not None and response.status_code < 400:
+            bump_farm(user.farm_id)
+        return response
+
+    if request.method != "GET":
+        return await call_next(request)
+
+    user = _principal(request)
+    if user is None:
+        metrics.incr("bypassed")
+        return await call_next(request)
+
+    key = _cache_key(request, user)
+    entry = backend.get(key)
+    if entry is not None:
+        metrics.incr("hits")
+        return _from_entry(request, entry)
+
+    metrics.incr("misses")
+    # a rota pode responder 304 ao If-None-Match; para preencher o cache pedimos a resposta completa
+    conditional = request.headers.get("if-none-match")
+    if conditional:
+        request.scope["headers"] = [(k, v) for k, v in request.scope["headers"] if k != b"if-none-match"]
+
+    response = await call_next(request)
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {k: v for k, v in response.headers.items() if k in STORED_HEADERS}
+    if response.status_code == 200:
+        backend.set(key, {"status": 200, "headers": headers, "body": body}, RESPONSE_CACHE_TTL)
+        if conditional and headers.get("etag") == conditional:
+            return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "content-type"})
+    return Response(content=body, status_code=response.status_code, headers=dict(response.headers))
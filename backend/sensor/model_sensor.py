@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, TIMESTAMP, func
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, TIMESTAMP, func, Index
 from database import Base
 
 class Sensor(Base):
@@ -12,3 +12,7 @@ class Sensor(Base):
     max_value = Column(Float(5, 2))
     current_value = Column(Float(5, 2), nullable=False)
     timestamp = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_sensor_farm_id_name', 'farm_id', 'name'),
+    )
@@ -0,0 +1,209 @@
+"""
+Importação em lote do rebanho (cadastro inicial de uma fazenda).
+
+Cada linha traz uma chave externa (`key`) e pode apontar pai/mãe por chave do
+mesmo envio (father_key/mother_key) ou por id já cadastrado (father_id/mother_id).
+A validação é feita em conjunto: uma query para grupos, uma para os pais já
+cadastrados e a checagem de integridade do pedigree (sheep.integrity) sobre o
+lote inteiro. Linhas inválidas (e os descendentes delas no lote) são rejeitadas;
+as demais entram numa única transação: reserva dos ids na sequence (um SELECT)
+e COPY das ovelhas e das linhas de sheep_parentage.
+
+Uso como CLI (a partir de backend/):
+    python -m sheep.herd_import --farm 3 rebanho.csv     # .csv, .ndjson/.jsonl ou .json
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from sheep import integrity
+from sheep.model_sheep import Sheep
+from sheep.model_sheepparentage import SheepParentage
+from sheep.schema_sheep import SheepImportRow
+from sheepgroup.model_sheepgroup import SheepGroup
+
+# limite de linhas por envio em POST /sheep/import
+MAX_IMPORT_ROWS = 50_000
+
+# tabelas (Core): a importação também roda como CLI, sem configurar todos os mappers
+sheep_table = Sheep.__table__
+parentage_table = SheepParentage.__table__
+group_table = SheepGroup.__table__
+
+
+def _copy(db: Session, table, columns, rows):
+    # COPY FROM STDIN na conexão da sessão (mesma transação); valores são números,
+    # datas e os sexos do Literal, sem tab/quebra de linha para escapar
+    if not rows:
+        return
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def import_herd(db: Session, farm_id: int, rows) -> dict:
+    results = [None] * len(rows)
+    records = {}  # key -> (índice, linha validada)
+
+    def reject(index, key, error):
+        results[index] = {"index": index, "key": key, "status": "rejected", "error": error}
+
+    for index, raw in enumerate(rows):
+        if isinstance(raw, dict):
+            # CSV: coluna vazia = campo ausente
+            raw = {field: value for field, value in raw.items() if value not in ("", None)}
+        try:
+            record = SheepImportRow.model_validate(raw)
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            key = raw.get("key") if isinstance(raw, dict) else None
+            location = ".".join(str(p) for p in error["loc"])
+            reject(index, None if key is None else str(key),
+                   f"{location}: {error['msg']}" if location else error["msg"])
+            continue
+        if record.key in records:
+            reject(index, record.key, "Duplicate key")
+            continue
+        records[record.key] = (index, record)
+
+    # grupos e pais já cadastrados, validados com uma query cada
+    group_ids = {record.group_id for _, record in records.values() if record.group_id is not None}
+    groups = set()
+    if group_ids:
+        groups = set(db.scalars(
+            select(group_table.c.id).where(group_table.c.farm_id == farm_id, group_table.c.id.in_(group_ids))
+        ))
+    parent_ids = {
+        parent_id for _, record in records.values()
+        for parent_id in (record.father_id, record.mother_id) if parent_id is not None
+    }
+    existing = {}
+    if parent_ids:
+        existing = {
+            row.id: (row.gender, row.birth_date)
+            for row in db.execute(
+                select(sheep_table.c.id, sheep_table.c.gender, sheep_table.c.birth_date)
+                .where(sheep_table.c.farm_id == farm_id, sheep_table.c.id.in_(parent_ids))
+            )
+        }
+
+    # pedigree do lote: chaves (str) para linhas do envio, ids (int) para animais existentes
+    rejected = {}
+    animals = dict(existing)
+    edges = []
+    batch_parents = {}
+    for key, (index, record) in records.items():
+        animals[key] = (record.gender, record.birth_date)
+        if record.group_id is not None and record.group_id not in groups:
+            rejected[key] = "Group not found"
+        for role, parent_key, parent_id in (("Father", record.father_key, record.father_id),
+                                            ("Mother", record.mother_key, record.mother_id)):
+            if parent_key is not None:
+                if parent_key not in records:
+                    rejected.setdefault(key, f"{role} key {parent_key} not found")
+                    continue
+                batch_parents.setdefault(key, []).append(parent_key)
+                edges.append((parent_key, key, role.lower()))
+            elif parent_id is not None:
+                if parent_id not in existing:
+                    rejected.setdefault(key, f"{role} not found")
+                    continue
+                edges.append((parent_id, key, role.lower()))
+
+    for violation in integrity.check(animals, edges):
+        members = violation.related if violation.kind == "cycle" else (violation.sheep_id,)
+        for key in members:
+            rejected.setdefault(key, f"{violation.kind}: {violation.detail}")
+
+    # filhos de linhas rejeitadas também são rejeitados
+    changed = True
+    while changed:
+        changed = False
+        for key, parent_keys in batch_parents.items():
+            if key in rejected:
+                continue
+            bad = next((parent_key for parent_key in parent_keys if parent_key in rejected), None)
+            if bad is not None:
+                rejected[key] = f"Parent {bad} rejected"
+                changed = True
+
+    accepted = [(index, record) for key, (index, record) in records.items() if key not in rejected]
+    for key, error in rejected.items():
+        reject(records[key][0], key, error)
+
+    if accepted:
+        # ids reservados de uma vez: os filhos do lote já sabem o id dos pais antes do INSERT
+        new_ids = db.scalars(
+            select(func.nextval(func.pg_get_serial_sequence("sheep", "id")))
+            .select_from(func.generate_series(1, len(accepted)))
+        ).all()
+        ids = {record.key: sheep_id for (_, record), sheep_id in zip(accepted, new_ids)}
+
+        _copy(db, sheep_table, ["id", "farm_id", "birth_date", "feeding_hay", "feeding_feed", "gender", "group_id"], [
+            (sheep_id, farm_id, record.birth_date, record.feeding_hay, record.feeding_feed, record.gender,
+             record.group_id)
+            for (_, record), sheep_id in zip(accepted, new_ids)
+        ])
+        _copy(db, parentage_table, ["parent_id", "offspring_id"], [
+            (ids.get(parent, parent), ids[offspring])
+            for parent, offspring, _ in edges if offspring in ids
+        ])
+
+        for index, record in accepted:
+            results[index] = {"index": index, "key": record.key, "status": "created", "sheep_id": ids[record.key]}
+
+    db.commit()
+
+    return {
+        "created": len(accepted),
+        "rejected": len(rows) - len(accepted),
+        "rows": results,
+    }
+
+
+def _read_file(path: str) -> list:
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        if path.endswith(".csv"):
+            return list(csv.DictReader(file))
+        if path.endswith((".ndjson", ".jsonl")):
+            return [json.loads(line) for line in file if line.strip()]
+        return json.load(file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa o rebanho de um arquivo CSV/NDJSON/JSON")
+    parser.add_argument("--farm", type=int, required=True)
+    parser.add_argument("path")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório completo em JSON")
+    args = parser.parse_args(argv)
+
+    rows = _read_file(args.path)
+    with SessionLocal() as db:
+        report = import_herd(db, args.farm, rows)
+
+    if args.json:
+        print(json.dumps(report, default=str, indent=2))
+    else:
+        for row in report["rows"]:
+            if row["status"] == "rejected":
+                print(f"line {row['index'] + 1} ({row['key']}): {row['error']}")
+        print(f"{report['created']} created, {report['rejected']} rejected", file=sys.stderr)
+    return 1 if report["rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
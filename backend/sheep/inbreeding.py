@@ -0,0 +1,174 @@
+"""
+Coeficientes de endogamia (F de Wright) e parentesco (kinship) do rebanho.
+
+Usa a decomposição A = T D T' da matriz de parentesco aditivo: T' e_i são as
+frações dos genes de i vindas de cada ancestral (uma série esparsa P'^k, com P
+a matriz pai/mãe de peso 0.5) e D é a variância mendeliana de cada animal.
+F é calculado geração a geração: F_i = A[pai, mãe] / 2, e A[pai, mãe] só
+depende de D dos ancestrais, já conhecidos. Assim o custo é proporcional ao
+número de ancestrais de cada pai, não ao número de caminhos do pedigree.
+
+O resultado fica em cache por fazenda e é recalculado quando a versão do
+pedigree (animais + registros de sheep_parentage) muda.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from sheep.model_sheep import Sheep
+from sheep.model_sheepparentage import SheepParentage
+
+PEDIGREE_CACHE_SIZE = int(os.getenv("PEDIGREE_CACHE_SIZE", "32"))
+
+
+class PedigreeCycleError(ValueError):
+    pass
+
+
+class HerdPedigree:
+    def __init__(self, sheep_ids, parent_ids, offspring_ids):
+        sheep_ids = np.asarray(sheep_ids, dtype=np.int64)
+        parent_ids = np.asarray(parent_ids, dtype=np.int64)
+        offspring_ids = np.asarray(offspring_ids, dtype=np.int64)
+
+        # pais de outras fazendas entram como fundadores
+        ids = np.unique(np.concatenate([sheep_ids, parent_ids, offspring_ids]))
+        parents = np.searchsorted(ids, parent_ids)
+        offspring = np.searchsorted(ids, offspring_ids)
+
+        # geração = 1 + geração do pai mais novo; relaxada até estabilizar
+        layer = np.zeros(len(ids), dtype=np.int64)
+        for _ in range(len(ids) + 1):
+            updated = np.zeros_like(layer)
+            np.maximum.at(updated, offspring, layer[parents] + 1)
+            if np.array_equal(updated, layer):
+                break
+            layer = updated
+        else:
+            raise PedigreeCycleError("Pedigree contains a cycle")
+
+        # ordem topológica: pais sempre antes dos filhos
+        order = np.lexsort((ids, layer))
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+
+        self.ids = ids[order]
+        self.layer = layer[order]
+        self.index = {int(sheep_id): i for i, sheep_id in enumerate(self.ids)}
+        parents, offspring = position[parents], position[offspring]
+
+        n = len(self.ids)
+        # P'[pai, filho] = 0.5
+        self._up = sparse.csr_matrix((np.full(len(parents), 0.5), (parents, offspring)), shape=(n, n))
+        self._parents = [[] for _ in range(n)]
+        for parent, child in zip(parents.tolist(), offspring.tolist()):
+            self._parents[child].append(parent)
+
+        self.inbreeding = np.zeros(n)
+        self._mendelian = np.ones(n)
+        self._compute()
+
+    def _contributions(self, columns):
+        # colunas de T' para os animais dados: e_i + P' e_i + P'^2 e_i + ...
+        n = len(self.ids)
+        step = sparse.csr_matrix(
+            (np.ones(len(columns)), (columns, np.arange(len(columns)))), shape=(n, len(columns))
+        )
+        total = step
+        while step.nnz:
+            step = self._up @ step
+            total = total + step
+        return total.tocsc()
+
+    def _relationship(self, left, right):
+        # A[left[k], right[k]] para cada par k
+        needed = np.unique(np.concatenate([left, right]))
+        contributions = self._contributions(needed)
+        weighted = sparse.diags(self._mendelian) @ contributions
+        left_cols = np.searchsorted(needed, left)
+        right_cols = np.searchsorted(needed, right)
+        return np.asarray(
+            contributions[:, left_cols].multiply(weighted[:, right_cols]).sum(axis=0)
+        ).ravel()
+
+    def _compute(self):
+        boundaries = np.flatnonzero(np.diff(self.layer)) + 1
+        for members in np.split(np.arange(len(self.ids)), boundaries):
+            both = [i for i in members if len(self._parents[i]) == 2]
+            if both:
+                sires, dams = np.array([self._parents[i] for i in both]).T
+                self.inbreeding[both] = self._relationship(sires, dams) / 2
+
+            # variância mendeliana depende do F dos pais (já calculado)
+            for i in members:
+                parents = self._parents[i]
+                self._mendelian[i] = 1.0 - 0.25 * sum(1 + self.inbreeding[p] for p in parents)
+
+    def positions(self, sheep_ids):
+        return np.array([self.index[int(sheep_id)] for sheep_id in sheep_ids], dtype=np.int64)
+
+    def coefficients(self, sheep_ids) -> dict:
+        return dict(zip(map(int, sheep_ids), self.inbreeding[self.positions(sheep_ids)].tolist()))
+
+    def kinship(self, rams, ewes) -> np.ndarray:
+        """Matriz len(rams) x len(ewes) de coeficientes de parentesco (= F de um filho do par)."""
+        rams, ewes = self.positions(rams), self.positions(ewes)
+        if not len(rams) or not len(ewes):
+            return np.zeros((len(rams), len(ewes)))
+        left = self._contributions(rams)
+        right = sparse.diags(self._mendelian) @ self._contributions(ewes)
+        return (left.T @ right).toarray() / 2
+
+
+def pedigree_version(db: Session, farm_id: int):
+    # muda com qualquer animal ou registro de parentesco inserido/removido na fazenda
+    sheep = db.execute(
+        select(func.count(Sheep.id), func.coalesce(func.sum(Sheep.id), 0)).where(Sheep.farm_id == farm_id)
+    ).one()
+    parentage = db.execute(
+        select(func.count(SheepParentage.id), func.coalesce(func.sum(SheepParentage.id), 0))
+        .join(Sheep, Sheep.id == SheepParentage.offspring_id)
+        .where(Sheep.farm_id == farm_id)
+    ).one()
+    return (*sheep, *parentage)
+
+
+def _load(db: Session, farm_id: int) -> HerdPedigree:
+    sheep_ids = db.execute(select(Sheep.id).where(Sheep.farm_id == farm_id)).scalars().all()
+    edges = db.execute(
+        select(SheepParentage.parent_id, SheepParentage.offspring_id)
+        .join(Sheep, Sheep.id == SheepParentage.offspring_id)
+        .where(Sheep.farm_id == farm_id)
+    ).all()
+    return HerdPedigree(sheep_ids, [edge[0] for edge in edges], [edge[1] for edge in edges])
+
+
+_lock = threading.Lock()
+_cache: "OrderedDict[int, tuple]" = OrderedDict()  # farm_id -> (versão, HerdPedigree)
+
+
+def herd_pedigree(db: Session, farm_id: int) -> HerdPedigree:
+    version = pedigree_version(db, farm_id)
+    with _lock:
+        entry = _cache.get(farm_id)
+        if entry is not None and entry[0] == version:
+            _cache.move_to_end(farm_id)
+            return entry[1]
+
+    herd = _load(db, farm_id)
+    with _lock:
+        _cache[farm_id] = (version, herd)
+        _cache.move_to_end(farm_id)
+        while len(_cache) > PEDIGREE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return herd
+
+
+def clear():
+    with _lock:
+        _cache.clear()
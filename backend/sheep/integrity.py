@@ -0,0 +1,190 @@
+"""
+Verificação de integridade do pedigree (sheep_parentage).
+
+Carrega o pedigree uma vez e roda checagens lineares no número de animais e
+arestas:
+  - self_parent: animal registrado como pai/mãe de si mesmo
+  - missing_parent: aresta para um animal que não existe
+  - too_many_parents: mais de dois pais
+  - parent_gender: dois pais do mesmo sexo, ou papel (father/mother) que não
+    bate com o sexo do animal
+  - birth_order: pai/mãe nascido no mesmo dia ou depois do filho
+  - cycle: animal que é ancestral de si mesmo (componente fortemente conexo)
+
+Uso como job (a partir de backend/):
+    python -m sheep.integrity              # banco inteiro
+    python -m sheep.integrity --farm 3 --json
+
+Como checagem antes do commit (importação em lote): inserir as linhas, dar
+flush e chamar `check_farm(db, farm_id)` na mesma transação.
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from sheep.model_sheep import Sheep
+from sheep.model_sheepparentage import SheepParentage
+
+ROLE_GENDERS = {"father": "Macho", "mother": "Fêmea"}
+
+
+class Violation(NamedTuple):
+    kind: str
+    sheep_id: int  # filho (ou um membro do ciclo)
+    detail: str
+    related: Tuple[int, ...] = ()
+
+
+def check(animals: dict, edges) -> list:
+    """
+    `animals`: id -> (gender, birth_date). `edges`: (parent_id, offspring_id) ou
+    (parent_id, offspring_id, role) com role "father"/"mother" quando conhecido.
+    """
+    violations = []
+    parents = defaultdict(list)
+    children = defaultdict(list)
+
+    for edge in edges:
+        parent_id, offspring_id = edge[0], edge[1]
+        role = edge[2] if len(edge) > 2 else None
+        if parent_id == offspring_id:
+            violations.append(Violation("self_parent", offspring_id, "registered as its own parent"))
+            continue
+        missing = [sheep_id for sheep_id in (parent_id, offspring_id) if sheep_id not in animals]
+        if missing:
+            violations.append(Violation("missing_parent", offspring_id,
+                                        f"unknown sheep {missing[0]}", (parent_id,)))
+            continue
+        parents[offspring_id].append((parent_id, role))
+        children[parent_id].append(offspring_id)
+
+    for offspring_id, offspring_parents in parents.items():
+        ids = tuple(parent_id for parent_id, _ in offspring_parents)
+        if len(offspring_parents) > 2:
+            violations.append(Violation("too_many_parents", offspring_id,
+                                        f"{len(offspring_parents)} parents", ids))
+
+        for parent_id, role in offspring_parents:
+            gender = animals[parent_id][0]
+            if role is not None and gender != ROLE_GENDERS[role]:
+                violations.append(Violation("parent_gender", offspring_id,
+                                            f"{role} {parent_id} is {gender}", (parent_id,)))
+        genders = [animals[parent_id][0] for parent_id in ids]
+        if len(ids) == 2 and genders[0] == genders[1] and genders[0] is not None:
+            violations.append(Violation("parent_gender", offspring_id,
+                                        f"both parents are {genders[0]}", ids))
+
+        born = animals[offspring_id][1]
+        for parent_id in ids:
+            parent_born = animals[parent_id][1]
+            if born is not None and parent_born is not None and parent_born >= born:
+                violations.append(Violation("birth_order", offspring_id,
+                                            f"parent {parent_id} born {parent_born}, offspring born {born}",
+                                            (parent_id,)))
+
+    for component in _cycles(children):
+        violations.append(Violation("cycle", component[0], f"{len(component)} sheep are their own ancestors",
+                                    tuple(component)))
+
+    return violations
+
+
+def _cycles(children: dict) -> list:
+    # Tarjan iterativo: componentes fortemente conexos com mais de um animal
+    index, low, on_stack = {}, {}, set()
+    stack, components = [], []
+    counter = 0
+
+    for root in list(children):
+        if root in index:
+            continue
+        work = [(root, iter(children.get(root, ())))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(children.get(successor, ()))))
+                    advanced = True
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1:
+                    components.append(sorted(component))
+
+    return sorted(components)
+
+
+def load(db: Session, farm_id: Optional[int] = None):
+    """(animals, edges) do banco inteiro ou de uma fazenda, em duas queries."""
+    # tabelas (Core) em vez dos models: o job roda sem configurar todos os mappers
+    sheep, parentage = Sheep.__table__, SheepParentage.__table__
+    sheep_query = select(sheep.c.id, sheep.c.gender, sheep.c.birth_date)
+    edge_query = select(parentage.c.parent_id, parentage.c.offspring_id)
+    if farm_id is not None:
+        farm_sheep = select(sheep.c.id).where(sheep.c.farm_id == farm_id)
+        edge_query = edge_query.where(parentage.c.offspring_id.in_(farm_sheep))
+        # pais de outra fazenda também entram, para não virarem "missing_parent"
+        sheep_query = sheep_query.where(
+            (sheep.c.farm_id == farm_id) | sheep.c.id.in_(select(parentage.c.parent_id)
+                                                         .where(parentage.c.offspring_id.in_(farm_sheep)))
+        )
+
+    animals = {row.id: (row.gender, row.birth_date) for row in db.execute(sheep_query)}
+    edges = [tuple(row) for row in db.execute(edge_query)]
+    return animals, edges
+
+
+def check_farm(db: Session, farm_id: Optional[int] = None) -> list:
+    return check(*load(db, farm_id))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica a integridade do pedigree")
+    parser.add_argument("--farm", type=int, help="só esta fazenda (padrão: banco inteiro)")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        violations = check_farm(db, args.farm)
+
+    if args.json:
+        print(json.dumps([violation._asdict() for violation in violations], default=str, indent=2))
+    else:
+        for violation in violations:
+            related = f" ({', '.join(map(str, violation.related))})" if violation.related else ""
+            print(f"{violation.kind:<18} sheep {violation.sheep_id}: {violation.detail}{related}")
+        print(f"{len(violations)} violation(s)", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
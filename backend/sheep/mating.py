@@ -0,0 +1,56 @@
+"""
+Plano de acasalamento: cada ovelha recebe um carneiro minimizando a endogamia
+esperada total dos filhos, respeitando quantas ovelhas cada carneiro pode cobrir.
+
+A capacidade vira colunas repetidas (um "slot" por cobertura) e o problema é
+uma atribuição retangular resolvida por scipy.optimize.linear_sum_assignment.
+Os slots de cada carneiro são limitados sem perder o ótimo: algum plano ótimo
+põe cada ovelha num dos seus carneiros preferidos cujas capacidades somadas
+chegam ao tamanho do rebanho (nesse prefixo sempre sobra vaga para ela), então
+um carneiro nunca precisa de mais slots que o número de ovelhas em cujo prefixo
+ele aparece. Capacidades enormes não aumentam a matriz expandida.
+"""
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# maior matriz expandida (ovelhas x slots) aceita pelo solver, O(n³)
+MAX_ASSIGNMENT_CELLS = 4_000_000
+
+
+def assign(expected: np.ndarray, capacities) -> np.ndarray:
+    """
+    `expected` é ovelhas x carneiros (F esperado do filho de cada par).
+    Devolve, para cada ovelha, o índice do carneiro ou -1 se faltar capacidade.
+    ValueError se a matriz expandida passar de MAX_ASSIGNMENT_CELLS.
+    """
+    herd = expected.shape[0]
+    capacities = np.minimum(np.asarray(capacities, dtype=np.int64), herd)
+    result = np.full(herd, -1, dtype=np.int64)
+    if not herd or not capacities.sum():
+        return result
+
+    # sem disputa: se o melhor carneiro de cada ovelha comporta todas que o
+    # escolheram, essa escolha já é o ótimo e o solver não é necessário
+    best = np.where(capacities > 0, expected, np.inf).argmin(axis=1)
+    demand = np.bincount(best, minlength=len(capacities))
+    if (demand <= capacities).all():
+        return best
+
+    # prefixo de cada ovelha: carneiros em ordem de preferência até a capacidade cobrir o rebanho
+    order = np.argsort(expected, axis=1, kind="stable")
+    ordered = capacities[order]
+    in_prefix = np.cumsum(ordered, axis=1) - ordered < herd
+    capacities = np.minimum(capacities, np.bincount(order[in_prefix], minlength=len(capacities)))
+    rams = np.repeat(np.arange(len(capacities)), capacities)
+    if herd * len(rams) > MAX_ASSIGNMENT_CELLS:
+        raise ValueError(f"At most {MAX_ASSIGNMENT_CELLS} ewe x slot cells per mating plan")
+
+    ewes, slots = linear_sum_assignment(expected[:, rams])
+    result[ewes] = rams[slots]
+    return result
+
+
+def ranked(expected: np.ndarray, count: int) -> np.ndarray:
+    """Índices dos `count` carneiros de menor F esperado para cada ovelha."""
+    # argsort estável: empates ficam na ordem dos carneiros pedidos
+    return np.argsort(expected, axis=1, kind="stable")[:, :count]
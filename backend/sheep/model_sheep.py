@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Index
 from database import Base
 from sqlalchemy.orm import relationship
 from typing import Optional
@@ -28,4 +28,9 @@ class Sheep(Base):
         "SheepParentage",
         foreign_keys="[SheepParentage.offspring_id]",
         back_populates="offspring"
-    )
\ No newline at end of file
+    )
+
+    __table_args__ = (
+        Index('ix_sheep_farm_id_id', 'farm_id', 'id'),
+        Index('ix_sheep_farm_id_group_id', 'farm_id', 'group_id'),
+    )
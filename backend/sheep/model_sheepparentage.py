@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint, Index
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -14,4 +14,5 @@ class SheepParentage(Base):
 
     __table_args__ = (
         UniqueConstraint('parent_id', 'offspring_id', name='_parent_offspring_uc'),
+        Index('ix_sheep_parentage_offspring_id_parent_id', 'offspring_id', 'parent_id'),
     )
@@ -0,0 +1,76 @@
+"""
+Consultas de pedigree sobre sheep_parentage com CTE recursiva.
+
+`ancestors` sobe (pais, avós, ...) e `descendants` desce (filhos, netos, ...) até
+`depth` gerações. Cada aresta (pai, filho) aparece uma vez por geração, então
+pedigrees com consanguinidade não explodem em caminhos repetidos. A caminhada só
+passa por animais da fazenda pedida: um pai ou filho de outra fazenda encerra o
+ramo e não aparece no grafo.
+"""
+from sqlalchemy import select, literal
+from sqlalchemy.orm import Session
+
+from sheep.model_sheep import Sheep
+from sheep.model_sheepparentage import SheepParentage
+
+
+def _walk(db: Session, sheep_id: int, farm_id: int, depth: int, upward: bool):
+    parentage = SheepParentage.__table__
+    sheep = Sheep.__table__
+    # upward: anda de filho para pai; downward: de pai para filho
+    start, step = (parentage.c.offspring_id, parentage.c.parent_id) if upward else \
+        (parentage.c.parent_id, parentage.c.offspring_id)
+
+    walk = (
+        select(
+            parentage.c.parent_id,
+            parentage.c.offspring_id,
+            step.label("node_id"),
+            literal(1).label("generation"),
+        )
+        .join(sheep, sheep.c.id == step)
+        .where(start == sheep_id, sheep.c.farm_id == farm_id)
+        .cte("pedigree_walk", recursive=True)
+    )
+    walk = walk.union(
+        select(
+            parentage.c.parent_id,
+            parentage.c.offspring_id,
+            step,
+            walk.c.generation + 1,
+        )
+        .join(walk, start == walk.c.node_id)
+        .join(sheep, sheep.c.id == step)
+        .where(walk.c.generation < depth, sheep.c.farm_id == farm_id)
+    )
+
+    rows = db.execute(
+        select(walk.c.parent_id, walk.c.offspring_id, walk.c.generation,
+               Sheep.id, Sheep.gender, Sheep.birth_date)
+        .join(Sheep, Sheep.id == walk.c.node_id)
+    ).all()
+
+    # geração de cada animal = menor distância até a raiz
+    nodes = {}
+    edges = set()
+    for row in rows:
+        edges.add((row.parent_id, row.offspring_id))
+        node = nodes.get(row.id)
+        if node is None or row.generation < node["generation"]:
+            nodes[row.id] = {"id": row.id, "gender": row.gender, "birth_date": row.birth_date,
+                             "generation": row.generation}
+
+    return (
+        sorted(nodes.values(), key=lambda node: (node["generation"], node["id"])),
+        sorted(edges, key=lambda edge: (edge[1], edge[0])),
+    )
+
+
+def ancestors(db: Session, sheep_id: int, farm_id: int, depth: int):
+    """(nodes, edges) dos ancestrais de `sheep_id` na fazenda até `depth` gerações acima."""
+    return _walk(db, sheep_id, farm_id, depth, upward=True)
+
+
+def descendants(db: Session, sheep_id: int, farm_id: int, depth: int):
+    """(nodes, edges) dos descendentes de `sheep_id` na fazenda até `depth` gerações abaixo."""
+    return _walk(db, sheep_id, farm_id, depth, upward=False)
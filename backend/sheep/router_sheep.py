@@ -1,34 +1,41 @@
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import func, and_, or_, select, literal, literal_column, true
+from sqlalchemy.dialects.postgresql import insert
+from database import get_db, get_async_db
+from sqlalchemy.ext.asyncio import AsyncSession
 from sheep.model_sheep import Sheep
 from farm.model_farm import Farm
 from inventory.model_inventory import FarmInventory
-from farmer.model_farmer import Farmer
 from milkproduction.model_milkproduction import MilkProduction
+from milkproduction import rollup, lactation, anomalies
+from milkproduction.model_lactation import LactationCurve
 from sheep.model_sheepparentage import SheepParentage
-from sheep.schema_sheep import SheepCreate, SheepResponse, SheepUpdate
-from milkproduction.schema_milkproduction import MilkProductionCreate, MilkProductionResponse, MilkProductionUpdate
-from typing import List, Optional
-from auth.router_auth import get_current_user
+from sheep.schema_sheep import (
+    SheepCreate, SheepResponse, SheepUpdate, PedigreeGraph, InbreedingResponse, KinshipResponse,
+    MatingPlanRequest, MatingPlanResponse, SheepImportResponse, SheepDetailResponse
+)
+from sheep import pedigree, inbreeding, mating, herd_import
+import response_cache
+from bulk_upload import read_bulk_rows
+from sheepgroup.model_sheepgroup import SheepGroup
+from milkproduction.schema_milkproduction import (
+    MilkProductionCreate, MilkProductionResponse, MilkProductionUpdate, LactationCurveResponse
+)
+from typing import List, Optional, Literal
+from auth.router_auth import get_current_user, get_current_farmer
 from auth.schema_auth import TokenUser
 from pydantic import BaseModel
-from database import SessionLocal
 from datetime import date
 from datetime import date as Date
 
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post("/", response_model=SheepResponse)
 def create_sheep(
     sheep: SheepCreate,
@@ -61,32 +68,265 @@ def create_sheep(
     return new_sheep
 
 
+@router.post("/import", response_model=SheepImportResponse)
+async def import_sheep(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    # Cadastro do rebanho em lote: JSON [{key, birth_date, gender, father_key, ...}, ...],
+    # NDJSON ou text/csv com essas colunas. Tudo numa única transação.
+    if current_user.role != "farmer":
+        raise HTTPException(status_code=403, detail="Access forbidden")
+
+    rows = await read_bulk_rows(request, herd_import.MAX_IMPORT_ROWS)
+    if len(rows) > herd_import.MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {herd_import.MAX_IMPORT_ROWS} rows per request")
+
+    return await run_in_threadpool(herd_import.import_herd, db, current_user.farm_id, rows)
+
+
+# colunas que podem ser pedidas em GET /sheep/?fields=
+SHEEP_LIST_FIELDS = ("id", "birth_date", "farm_id", "feeding_hay", "feeding_feed", "gender", "group_id")
+
+
 @router.get("/", response_model=List[SheepResponse])
 def get_all_sheep(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Tamanho da página"),
+    cursor: Optional[int] = Query(None, description="Id da última ovelha da página anterior (X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula, ex: id,gender,milk_production"),
+    gender: Optional[Literal["Macho", "Fêmea"]] = Query(None),
+    group_id: Optional[int] = Query(None),
+    born_from: Optional[Date] = Query(None, description="Nascidas a partir de (YYYY-MM-DD)"),
+    born_to: Optional[Date] = Query(None, description="Nascidas até (YYYY-MM-DD)"),
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    if current_user.role not in ["farmer", "veterinarian"]:
+        raise HTTPException(status_code=403, detail="Access forbidden")
+
+    if fields:
+        requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = set(requested) - set(SHEEP_LIST_FIELDS) - {"milk_production"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    else:
+        requested = [*SHEEP_LIST_FIELDS, "milk_production"]
+
+    # Filtros e paginação (keyset em Sheep.id) feitos no banco
+    filters = [Sheep.farm_id == current_user.farm_id]
+    if cursor is not None:
+        filters.append(Sheep.id > cursor)
+    if gender is not None:
+        filters.append(Sheep.gender == gender)
+    if group_id is not None:
+        filters.append(Sheep.group_id == group_id)
+    if born_from is not None:
+        filters.append(Sheep.birth_date >= born_from)
+    if born_to is not None:
+        filters.append(Sheep.birth_date <= born_to)
+
+    page_ids = select(Sheep.id).where(*filters).order_by(Sheep.id)
+    if limit is not None:
+        # uma linha a mais para saber se existe próxima página
+        page_ids = page_ids.limit(limit + 1)
+
+    columns = [getattr(Sheep, f) for f in SHEEP_LIST_FIELDS if f == "id" or f in requested]
+    query = db.query(*columns).filter(Sheep.id.in_(page_ids))
+
+    if "milk_production" in requested:
+        # Última produção de cada ovelha da página numa única query (window function),
+        # em vez de carregar o histórico inteiro de cada animal
+        latest_milk = (
+            db.query(
+                MilkProduction.sheep_id.label("sheep_id"),
+                MilkProduction.volume.label("volume"),
+                func.row_number().over(
+                    partition_by=MilkProduction.sheep_id,
+                    order_by=(MilkProduction.date.desc(), MilkProduction.id.desc())
+                ).label("rn")
+            )
+            .filter(MilkProduction.sheep_id.in_(page_ids))
+            .subquery()
+        )
+        query = (
+            query.add_columns(latest_milk.c.volume.label("milk_production"))
+            .outerjoin(
+                latest_milk,
+                and_(latest_milk.c.sheep_id == Sheep.id, latest_milk.c.rn == 1)
+            )
+        )
+
+    rows = [row._asdict() for row in query.order_by(Sheep.id).all()]
+
+    headers = {}
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1]["id"])
+
+    if fields:
+        # projeção parcial não passa pelo SheepResponse
+        return JSONResponse(content=jsonable_encoder(rows), headers=headers)
+
+    response.headers.update(headers)
+    return rows
+
+
+# limite de células da matriz em GET /sheep/kinship
+MAX_KINSHIP_PAIRS = 250_000
+
+
+def _farm_genders(db: Session, farm_id: int) -> dict:
+    return dict(db.query(Sheep.id, Sheep.gender).filter(Sheep.farm_id == farm_id).all())
+
+
+def _herd_pedigree(db: Session, farm_id: int):
+    try:
+        return inbreeding.herd_pedigree(db, farm_id)
+    except inbreeding.PedigreeCycleError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+
+
+# GET /sheep/inbreeding - F de Wright de cada animal da fazenda
+@router.get("/inbreeding", response_model=List[InbreedingResponse])
+def get_inbreeding(
+    min_coefficient: float = Query(0.0, ge=0, le=1, description="Só animais com F >= valor"),
     db: Session = Depends(get_db),
     current_user: TokenUser = Depends(get_current_user)
 ):
     if current_user.role not in ["farmer", "veterinarian"]:
         raise HTTPException(status_code=403, detail="Access forbidden")
 
-    sheep_list = db.query(Sheep).filter(Sheep.farm_id == current_user.farm_id).all()
-    enriched_list = []
+    herd = _herd_pedigree(db, current_user.farm_id)
+    coefficients = herd.coefficients(sorted(_farm_genders(db, current_user.farm_id)))
+    return [
+        {"sheep_id": sheep_id, "inbreeding": round(value, 6)}
+        for sheep_id, value in coefficients.items()
+        if value >= min_coefficient
+    ]
+
+
+# GET /sheep/kinship?rams=1&rams=2&ewes=3 - parentesco de cada par carneiro x ovelha
+# (sem rams/ewes: todos os machos/fêmeas da fazenda)
+@router.get("/kinship", response_model=KinshipResponse)
+def get_kinship(
+    rams: Optional[List[int]] = Query(None),
+    ewes: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    if current_user.role not in ["farmer", "veterinarian"]:
+        raise HTTPException(status_code=403, detail="Access forbidden")
+
+    genders = _farm_genders(db, current_user.farm_id)
+    rams = list(dict.fromkeys(rams)) if rams else sorted(i for i, g in genders.items() if g == "Macho")
+    ewes = list(dict.fromkeys(ewes)) if ewes else sorted(i for i, g in genders.items() if g == "Fêmea")
+    if any(sheep_id not in genders for sheep_id in rams + ewes):
+        raise HTTPException(status_code=404, detail="Sheep not found")
+    if len(rams) * len(ewes) > MAX_KINSHIP_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_KINSHIP_PAIRS} ram x ewe pairs per request")
 
-    for sheep in sheep_list:
-        latest_milk = None
-        if sheep.milk_productions:
-            latest_milk = max(sheep.milk_productions, key=lambda m: m.date)
+    herd = _herd_pedigree(db, current_user.farm_id)
+    matrix = herd.kinship(rams, ewes).round(6)
+    return {"rams": rams, "ewes": ewes, "kinship": matrix.tolist()}
 
-        sheep_data = {
-            **sheep.__dict__,
-            "milk_production": latest_milk.volume if latest_milk else None
-        }
-        enriched_list.append(sheep_data)
 
-    return enriched_list
+# POST /sheep/mating-plan - carneiro para cada ovelha do grupo com a menor endogamia esperada
+@router.post("/mating-plan", response_model=MatingPlanResponse)
+def create_mating_plan(
+    plan: MatingPlanRequest,
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    if current_user.role not in ["farmer", "veterinarian"]:
+        raise HTTPException(status_code=403, detail="Access forbidden")
 
+    group = db.query(SheepGroup.id).filter(
+        SheepGroup.id == plan.group_id, SheepGroup.farm_id == current_user.farm_id
+    ).first()
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+
+    ewes = db.execute(
+        select(Sheep.id)
+        .where(Sheep.farm_id == current_user.farm_id, Sheep.group_id == plan.group_id, Sheep.gender == "Fêmea")
+        .order_by(Sheep.id)
+    ).scalars().all()
+
+    genders = _farm_genders(db, current_user.farm_id)
+    if plan.ram_ids:
+        rams = list(dict.fromkeys(plan.ram_ids))
+        if any(genders.get(ram_id) != "Macho" for ram_id in rams):
+            raise HTTPException(status_code=404, detail="Ram not found")
+    else:
+        rams = sorted(sheep_id for sheep_id, gender in genders.items() if gender == "Macho")
+    if not rams:
+        raise HTTPException(status_code=400, detail="No candidate rams")
+    if set(plan.capacities) - set(rams):
+        raise HTTPException(status_code=400, detail="Capacities given for rams that are not candidates")
+    if len(rams) * len(ewes) > MAX_KINSHIP_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_KINSHIP_PAIRS} ram x ewe pairs per request")
+
+    default_capacity = plan.capacity if plan.capacity is not None else -(-len(ewes) // len(rams))
+    capacities = [plan.capacities.get(ram_id, default_capacity) for ram_id in rams]
+
+    # F esperado do filho = parentesco do par; uma única operação matricial ovelhas x carneiros
+    expected = _herd_pedigree(db, current_user.farm_id).kinship(rams, ewes).T
+    try:
+        chosen = mating.assign(expected, capacities)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    candidates = mating.ranked(expected, min(plan.alternatives, len(rams)))
+
+    assignments = []
+    for i, ewe_id in enumerate(ewes):
+        ram = chosen[i]
+        assignments.append({
+            "ewe_id": ewe_id,
+            "ram_id": rams[ram] if ram >= 0 else None,
+            "expected_inbreeding": round(float(expected[i, ram]), 6) if ram >= 0 else None,
+            "candidates": [
+                {"ram_id": rams[j], "expected_inbreeding": round(float(expected[i, j]), 6)}
+                for j in candidates[i]
+            ],
+        })
+
+    assigned = chosen >= 0
+    return {
+        "group_id": plan.group_id,
+        "assignments": assignments,
+        "unassigned": int((~assigned).sum()),
+        "mean_expected_inbreeding": round(float(expected[assigned, chosen[assigned]].mean()), 6)
+        if assigned.any() else None,
+    }
+
+
+# GET /sheep/lactation-ranking?by=persistency - ovelhas da fazenda pela curva de lactação atual
+@router.get("/lactation-ranking", response_model=List[LactationCurveResponse])
+def get_lactation_ranking(
+    by: Literal["peak_yield", "persistency", "days_to_peak"] = Query("peak_yield"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    if current_user.role not in ["farmer", "veterinarian"]:
+        raise HTTPException(status_code=403, detail="Access forbidden")
 
-@router.get("/{sheep_id}", response_model=SheepResponse)
+    # só lê as curvas gravadas; o reajuste é do job (python -m milkproduction.lactation)
+    column = getattr(LactationCurve, by)
+    return (
+        db.query(LactationCurve)
+        .join(Sheep, Sheep.id == LactationCurve.sheep_id)
+        .filter(Sheep.farm_id == current_user.farm_id, column.isnot(None))
+        .order_by(column.desc() if order == "desc" else column.asc(), LactationCurve.sheep_id)
+        .limit(limit)
+        .all()
+    )
+
+
+@router.get("/{sheep_id}", response_model=SheepDetailResponse)
 def get_sheep_by_id(
     sheep_id: int,
     db: Session = Depends(get_db),
@@ -129,9 +369,59 @@ def get_sheep_by_id(
         "milk_production": milk_today.volume if milk_today else None
     }
 
+    sheep_data["lactation"] = db.get(LactationCurve, sheep_id)
+
     return sheep_data
 
 
+# pai = parente macho, mãe = parente fêmea (sheep_parentage não guarda o papel)
+PARENT_GENDERS = {"father_id": "Macho", "mother_id": "Fêmea"}
+
+
+def _update_parentage(db: Session, sheep_id: int, parents: dict):
+    """
+    Aplica father_id/mother_id como diferença sobre as arestas atuais: remove só o
+    pai/mãe substituído e insere só o novo. Sem mudança, nenhuma escrita (e a versão
+    do pedigree usada pelo cache de endogamia não muda).
+    """
+    requested = {parent_id for parent_id in parents.values() if parent_id is not None}
+    if sheep_id in requested:
+        raise HTTPException(status_code=400, detail="A sheep cannot be its own parent")
+
+    # pais atuais e pedidos, com o sexo de cada um, numa única query
+    rows = (
+        db.query(Sheep.id, Sheep.gender, SheepParentage.id.label("edge_id"))
+        .outerjoin(SheepParentage, and_(SheepParentage.parent_id == Sheep.id,
+                                        SheepParentage.offspring_id == sheep_id))
+        .filter(or_(Sheep.id.in_(requested), SheepParentage.id.isnot(None)))
+        .all()
+    )
+    genders = {row.id: row.gender for row in rows}
+    current = {row.id: row.edge_id for row in rows if row.edge_id is not None}
+
+    removed, added = set(), set()
+    for field, parent_id in parents.items():
+        role = "Father" if field == "father_id" else "Mother"
+        gender = PARENT_GENDERS[field]
+        if parent_id is not None:
+            if parent_id not in genders:
+                raise HTTPException(status_code=404, detail=f"{role} not found")
+            if genders[parent_id] != gender:
+                raise HTTPException(status_code=400, detail=f"{role} must be {gender}")
+            if parent_id not in current:
+                added.add(parent_id)
+        removed.update(
+            edge_parent for edge_parent in current
+            if genders[edge_parent] == gender and edge_parent != parent_id
+        )
+
+    if removed:
+        db.query(SheepParentage).filter(
+            SheepParentage.id.in_([current[parent_id] for parent_id in removed])
+        ).delete(synchronize_session=False)
+    db.add_all([SheepParentage(parent_id=parent_id, offspring_id=sheep_id) for parent_id in added])
+
+
 @router.put("/{sheep_id}", response_model=SheepResponse)
 def update_sheep(
     sheep_id: int,
@@ -143,21 +433,33 @@ def update_sheep(
     if not sheep:
         raise HTTPException(status_code=404, detail="Sheep not found")
 
-    for field, value in data.dict(exclude_unset=True).items():
+    previous_placement = (sheep.farm_id, sheep.group_id)
+    changes = data.dict(exclude_unset=True)
+
+    for field, value in changes.items():
         if field not in ["father_id", "mother_id"]:
             setattr(sheep, field, value)
 
-    db.query(SheepParentage).filter(SheepParentage.offspring_id == sheep_id).delete()
-
-    if data.father_id:
-        parentage = SheepParentage(parent_id=data.father_id, offspring_id=sheep_id)
-        db.add(parentage)
-    if data.mother_id:
-        parentage = SheepParentage(parent_id=data.mother_id, offspring_id=sheep_id)
-        db.add(parentage)
+    # Só mexe no parentesco se father_id/mother_id vieram no corpo
+    parents = {field: changes[field] for field in PARENT_GENDERS if field in changes}
+    if parents:
+        _update_parentage(db, sheep_id, parents)
+
+    # Mudou de grupo/fazenda: a produção histórica passa a contar no novo grupo
+    if (sheep.farm_id, sheep.group_id) != previous_placement:
+        db.flush()
+        old_farm_id, old_group_id = previous_placement
+        if old_farm_id == sheep.farm_id:
+            rollup.rebuild(db, farm_id=sheep.farm_id, group_ids=[old_group_id, sheep.group_id])
+        else:
+            rollup.rebuild(db, farm_id=old_farm_id, group_ids=[old_group_id])
+            rollup.rebuild(db, farm_id=sheep.farm_id, group_ids=[sheep.group_id])
 
     db.commit()
     db.refresh(sheep)
+    if sheep.farm_id != previous_placement[0]:
+        # o middleware invalida só a fazenda de quem escreveu (a antiga)
+        response_cache.bump_farm(sheep.farm_id)
     return sheep
 
 
@@ -176,6 +478,8 @@ def delete_sheep(
         db.delete(milk_production)
 
     db.delete(sheep)
+    db.flush()
+    rollup.rebuild(db, farm_id=sheep.farm_id, group_ids=[sheep.group_id])
     db.commit()
     return
 
@@ -184,44 +488,73 @@ def delete_sheep(
 async def update_milk_yield(
     sheep_id: int,
     milk_yield: MilkProductionUpdate = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: TokenUser = Depends(get_current_user)
 ):
-    sheep = db.query(Sheep).filter(Sheep.id == sheep_id).first()
-    if sheep.farm_id != current_user.farm_id:
-        raise HTTPException(status_code=403, detail="Access forbidden: sheep does not belong to your farm")
+    # Um único INSERT ... ON CONFLICT (sheep_id, date) DO UPDATE ... RETURNING:
+    # só insere se a ovelha for da fazenda do usuário. O volume anterior vem da
+    # CTE `previous`, que trava a linha (FOR UPDATE espera gravações concorrentes
+    # e devolve o valor já confirmado); ela entra no SELECT de origem para rodar
+    # antes do upsert, e o RETURNING a lê de novo (CTE materializada, uma vez só)
+    previous = (
+        select(MilkProduction.volume)
+        .join(Sheep, Sheep.id == MilkProduction.sheep_id)
+        .where(
+            MilkProduction.sheep_id == sheep_id,
+            MilkProduction.date == milk_yield.date,
+            Sheep.farm_id == current_user.farm_id
+        )
+        .with_for_update(of=MilkProduction)
+        .cte("previous")
+    )
+    owned_sheep = (
+        select(Sheep.id, literal(milk_yield.date), literal(milk_yield.volume))
+        .outerjoin(previous, true())
+        .where(Sheep.id == sheep_id, Sheep.farm_id == current_user.farm_id)
+    )
+    stmt = insert(MilkProduction).from_select(["sheep_id", "date", "volume"], owned_sheep)
+    stmt = stmt.on_conflict_do_update(
+        constraint="_sheep_date_uc",
+        set_={"volume": stmt.excluded.volume}
+    ).returning(
+        MilkProduction.id,
+        MilkProduction.volume,
+        MilkProduction.date,
+        literal_column("xmax = 0").label("inserted"),
+        select(Sheep.group_id).where(Sheep.id == sheep_id).scalar_subquery().label("group_id"),
+        select(previous.c.volume).scalar_subquery().label("previous_volume")
+    )
+    recorded = (await db.execute(stmt)).first()
 
-    if not sheep:
-        raise HTTPException(status_code=404, detail="Sheep not found")
+    if recorded is None:
+        sheep = await db.scalar(select(Sheep.farm_id).where(Sheep.id == sheep_id))
+        if sheep is None:
+            raise HTTPException(status_code=404, detail="Sheep not found")
+        raise HTTPException(status_code=403, detail="Access forbidden: sheep does not belong to your farm")
 
-    existing_milk_production = db.query(MilkProduction).filter(
-        MilkProduction.sheep_id == sheep_id,
-        MilkProduction.date == milk_yield.date
-    ).first()
-
-    if existing_milk_production:
-        existing_milk_production.volume = milk_yield.volume
-        db.commit()
-        db.refresh(existing_milk_production)
-        return {
-            "id": existing_milk_production.id,
-            "milk_production": existing_milk_production.volume,
-            "date": existing_milk_production.date
-        }
-
-    new_milk_production = MilkProduction(
-        sheep_id=sheep_id,
-        volume=milk_yield.volume,
-        date=milk_yield.date
-    )
-    db.add(new_milk_production)
-    db.commit()
-    db.refresh(new_milk_production)
+    # rollup é código síncrono: run_sync executa na mesma conexão/transação
+    if recorded.inserted:
+        await db.run_sync(rollup.apply_deltas, [
+            (current_user.farm_id, recorded.group_id, recorded.date, milk_yield.volume, 1)
+        ])
+    elif recorded.previous_volume is not None:
+        await db.run_sync(rollup.apply_deltas, [(
+            current_user.farm_id, recorded.group_id, recorded.date,
+            milk_yield.volume - float(recorded.previous_volume), 0
+        )])
+    else:
+        # a linha foi criada por outra transação concorrente depois do snapshot do comando
+        await db.run_sync(
+            rollup.rebuild, farm_id=current_user.farm_id, group_ids=[recorded.group_id], dates=[recorded.date]
+        )
+    await db.run_sync(anomalies.record, [(sheep_id, recorded.date, recorded.volume)])
+    await db.run_sync(lactation.mark, [sheep_id])
+    await db.commit()
 
     return {
-        "id": new_milk_production.id,
-        "milk_production": new_milk_production.volume,
-        "date": new_milk_production.date
+        "id": recorded.id,
+        "milk_production": float(recorded.volume),
+        "date": recorded.date
     }
 
 
@@ -257,27 +590,54 @@ def get_children_of_sheep(
     return child_sheep
 
 
+def _pedigree_response(db: Session, sheep_id: int, farm_id: int, depth: int, direction: str):
+    owned = db.query(Sheep.id).filter(Sheep.id == sheep_id, Sheep.farm_id == farm_id).first()
+    if not owned:
+        raise HTTPException(status_code=404, detail="Sheep not found")
+
+    nodes, edges = getattr(pedigree, direction)(db, sheep_id, farm_id, depth)
+    return {"root": sheep_id, "direction": direction, "depth": depth, "nodes": nodes, "edges": edges}
+
+
+# GET /sheep/{id}/ancestors?depth= - pedigree graph up to `depth` generations back
+@router.get("/{sheep_id}/ancestors", response_model=PedigreeGraph)
+def get_sheep_ancestors(
+    sheep_id: int,
+    depth: int = Query(5, ge=1, le=30, description="Número de gerações"),
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    return _pedigree_response(db, sheep_id, current_user.farm_id, depth, "ancestors")
+
+
+# GET /sheep/{id}/descendants?depth= - offspring graph up to `depth` generations down
+@router.get("/{sheep_id}/descendants", response_model=PedigreeGraph)
+def get_sheep_descendants(
+    sheep_id: int,
+    depth: int = Query(5, ge=1, le=30, description="Número de gerações"),
+    db: Session = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    return _pedigree_response(db, sheep_id, current_user.farm_id, depth, "descendants")
+
+
 @router.get("/{sheep_id}/milk-yield", response_model=List[MilkProductionResponse])
 async def get_sheep_milk_production(
     sheep_id: int,
     date: Optional[Date] = Query(None, description="Data da produção no formato YYYY-MM-DD"),
-    db: Session = Depends(get_db),
-    current_user: TokenUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_farmer),
 ):
 
-    farmer = db.query(Farmer).filter(Farmer.email == current_user.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    sheep = db.query(Sheep).filter(Sheep.id == sheep_id, Sheep.farm_id == farmer.farm_id).first()
-    if not sheep:
+    sheep = await db.scalar(select(Sheep.id).where(Sheep.id == sheep_id, Sheep.farm_id == current_user.farm_id))
+    if sheep is None:
         raise HTTPException(status_code=404, detail="Sheep not found or not authorized")
 
-    query = db.query(MilkProduction).filter(MilkProduction.sheep_id == sheep_id)
+    query = select(MilkProduction).where(MilkProduction.sheep_id == sheep_id)
 
     if date:
-        query = query.filter(MilkProduction.date == date)
+        query = query.where(MilkProduction.date == date)
 
-    productions = query.order_by(MilkProduction.date.desc()).all()
+    productions = (await db.scalars(query.order_by(MilkProduction.date.desc()))).all()
 
     return productions
\ No newline at end of file
@@ -1,7 +1,9 @@
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, NonNegativeInt, model_validator
 from datetime import date
-from typing import Optional, Literal
+from typing import Dict, Optional, Literal, List, Tuple
+
+from milkproduction.schema_milkproduction import LactationCurveResponse
 
 
 class SheepCreate(BaseModel):
@@ -20,6 +22,10 @@ class SheepResponse(SheepCreate):
     
     model_config = ConfigDict(from_attributes=True)
 
+
+class SheepDetailResponse(SheepResponse):
+    lactation: Optional[LactationCurveResponse] = None  # None: sem registros de leite
+
 class SheepUpdate(BaseModel):
     birth_date: Optional[date] = None
     feeding_hay: Optional[float] = None
@@ -28,4 +34,87 @@ class SheepUpdate(BaseModel):
     group_id: Optional[int] = None
     farm_id: Optional[int] = None
     father_id: Optional[int] = None
-    mother_id: Optional[int] = None
\ No newline at end of file
+    mother_id: Optional[int] = None
+
+
+class PedigreeNode(BaseModel):
+    id: int
+    gender: Optional[str] = None
+    birth_date: Optional[date] = None
+    generation: int
+
+class PedigreeGraph(BaseModel):
+    root: int
+    direction: Literal["ancestors", "descendants"]
+    depth: int
+    nodes: List[PedigreeNode]
+    edges: List[Tuple[int, int]]  # (parent_id, offspring_id)
+
+class InbreedingResponse(BaseModel):
+    sheep_id: int
+    inbreeding: float
+
+class KinshipResponse(BaseModel):
+    rams: List[int]
+    ewes: List[int]
+    kinship: List[List[float]]  # kinship[i][j] = parentesco rams[i] x ewes[j]
+
+class MatingPlanRequest(BaseModel):
+    group_id: int  # grupo das ovelhas a acasalar
+    # carneiros candidatos (padrão: todos os machos da fazenda)
+    ram_ids: Optional[List[int]] = Field(None, max_length=500)
+    capacity: Optional[int] = Field(None, ge=0)  # ovelhas por carneiro (padrão: divide igualmente)
+    # capacidade por carneiro, sobrepõe `capacity`
+    capacities: Dict[int, NonNegativeInt] = Field({}, max_length=500)
+    alternatives: int = Field(3, ge=0, le=20)  # melhores carneiros listados por ovelha
+
+class MatingCandidate(BaseModel):
+    ram_id: int
+    expected_inbreeding: float
+
+class MatingAssignment(BaseModel):
+    ewe_id: int
+    ram_id: Optional[int] = None  # None = sem capacidade disponível
+    expected_inbreeding: Optional[float] = None
+    candidates: List[MatingCandidate]
+
+class MatingPlanResponse(BaseModel):
+    group_id: int
+    assignments: List[MatingAssignment]
+    unassigned: int
+    mean_expected_inbreeding: Optional[float] = None
+
+
+class SheepImportRow(BaseModel):
+    key: str = Field(min_length=1)  # chave externa (brinco, registro), única no envio
+    birth_date: date
+    gender: Literal["Macho", "Fêmea"]
+    feeding_hay: float = 0
+    feeding_feed: float = 0
+    group_id: Optional[int] = None
+    father_key: Optional[str] = None  # pai no mesmo envio
+    mother_key: Optional[str] = None
+    father_id: Optional[int] = None  # pai já cadastrado na fazenda
+    mother_id: Optional[int] = None
+
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    @model_validator(mode="after")
+    def one_reference_per_parent(self):
+        if self.father_key is not None and self.father_id is not None:
+            raise ValueError("father_key and father_id are mutually exclusive")
+        if self.mother_key is not None and self.mother_id is not None:
+            raise ValueError("mother_key and mother_id are mutually exclusive")
+        return self
+
+class SheepImportRowResult(BaseModel):
+    index: int  # posição da linha no envio (0 = primeira linha de dados)
+    key: Optional[str] = None
+    status: Literal["created", "rejected"]
+    sheep_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SheepImportResponse(BaseModel):
+    created: int
+    rejected: int
+    rows: List[SheepImportRowResult]
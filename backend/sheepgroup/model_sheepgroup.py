@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Index
 from database import Base
 
 class SheepGroup(Base):
@@ -7,4 +7,8 @@ class SheepGroup(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     description = Column(Text)
-    farm_id = Column(Integer, ForeignKey("farm.id"), nullable=False)
\ No newline at end of file
+    farm_id = Column(Integer, ForeignKey("farm.id"), nullable=False)
+
+    __table_args__ = (
+        Index('ix_sheep_group_farm_id', 'farm_id'),
+    )
@@ -2,34 +2,40 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from database import get_db
+from database import get_db, get_read_db
 from sheep.model_sheep import Sheep
-from farmer.model_farmer import Farmer
 from sheepgroup.model_sheepgroup import SheepGroup
+from milkproduction import rollup
 from sheep.schema_sheep import SheepCreate, SheepResponse
 from sheep.schema_sheep import SheepResponse
 from sheepgroup.schema_sheepgroup import SheepGroupCreate, SheepGroupResponse
 from typing import List
-from auth.router_auth import get_current_user
+from auth.router_auth import get_current_user, get_current_farmer
 from pydantic import BaseModel
 from typing import Optional
 
 router = APIRouter()
 
+
+def _current_groups(db: Session, farm_id: int, sheep_ids: List[int]) -> set:
+    # grupos atuais das ovelhas, para recalcular o rollup de leite depois de movê-las
+    rows = db.query(Sheep.group_id).filter(
+        Sheep.id.in_(sheep_ids),
+        Sheep.farm_id == farm_id
+    ).distinct()
+    return {row.group_id for row in rows}
+
+
 @router.post("/", response_model=SheepGroupResponse)
 def create_sheep_group(
     group: SheepGroupCreate,
     db: Session = Depends(get_db),
-    current_farmer = Depends(get_current_user)
+    current_farmer = Depends(get_current_farmer)
 ):
-    farmer = db.query(Farmer).filter(Farmer.email == current_farmer.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
     sheep_group = SheepGroup(
         name=group.name,
         description=group.description,
-        farm_id=farmer.farm_id
+        farm_id=current_farmer.farm_id
     )
     db.add(sheep_group)
     db.commit()
@@ -37,10 +43,12 @@ def create_sheep_group(
 
     # Atualiza as ovelhas com esse group_id
     if group.sheep_ids:
+        previous_groups = _current_groups(db, current_farmer.farm_id, group.sheep_ids)
         db.query(Sheep).filter(
             Sheep.id.in_(group.sheep_ids),
-            Sheep.farm_id == farmer.farm_id
+            Sheep.farm_id == current_farmer.farm_id
         ).update({"group_id": sheep_group.id}, synchronize_session=False)
+        rollup.rebuild(db, farm_id=current_farmer.farm_id, group_ids=previous_groups | {sheep_group.id})
         db.commit()
 
     return sheep_group
@@ -50,13 +58,9 @@ def create_sheep_group(
 @router.get("/", response_model=List[SheepGroupResponse])
 def get_sheep_groups(
     db: Session = Depends(get_db),
-    current_farmer = Depends(get_current_user)
+    current_farmer = Depends(get_current_farmer)
 ):
-    farmer = db.query(Farmer).filter(Farmer.email == current_farmer.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    groups = db.query(SheepGroup).filter(SheepGroup.farm_id == farmer.farm_id).all()
+    groups = db.query(SheepGroup).filter(SheepGroup.farm_id == current_farmer.farm_id).all()
     return groups
 
 
@@ -65,13 +69,11 @@ def update_sheep_group(
     group_id: int,
     group_data: SheepGroupCreate,  # Ou crie um `SheepGroupUpdate` schema se quiser campos opcionais
     db: Session = Depends(get_db),
-    current_farmer = Depends(get_current_user)
+    current_farmer = Depends(get_current_farmer)
 ):
-    farmer = db.query(Farmer).filter(Farmer.email == current_farmer.email).first()
-
     group = db.query(SheepGroup).filter(
         SheepGroup.id == group_id,
-        SheepGroup.farm_id == farmer.farm_id
+        SheepGroup.farm_id == current_farmer.farm_id
     ).first()
 
     if not group:
@@ -102,8 +104,10 @@ def delete_sheep_group(
     for sheep in sheep_in_group:
         sheep.group_id = None
 
-    # Deleta o grupo
+    # Deleta o grupo (as linhas do rollup do grupo saem em cascata)
     db.delete(group)
+    db.flush()
+    rollup.rebuild(db, farm_id=current_farmer.farm_id, group_ids=[None])
     db.commit()
 
     return {"message": "Grupo excluído com sucesso"}
@@ -131,24 +135,20 @@ def count_sheep_in_group(
 
 @router.get("/sheep-count-by-group")
 def get_sheep_count_by_group(
-    db: Session = Depends(get_db),
-    current_farmer = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_farmer = Depends(get_current_farmer)
 ):
-    farmer = db.query(Farmer).filter(Farmer.email == current_farmer.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
     # Contagem por grupo, incluindo aqueles com group_id == None
     result = (
         db.query(Sheep.group_id, func.count(Sheep.id).label("count"))
-        .filter(Sheep.farm_id == farmer.farm_id)
+        .filter(Sheep.farm_id == current_farmer.farm_id)
         .group_by(Sheep.group_id)
         .all()
     )
 
     group_map = {
         g.id: g.name
-        for g in db.query(SheepGroup).filter(SheepGroup.farm_id == farmer.farm_id)
+        for g in db.query(SheepGroup).filter(SheepGroup.farm_id == current_farmer.farm_id)
     }
 
     response = []
@@ -166,13 +166,11 @@ def get_sheep_count_by_group(
 def get_sheep_group_by_id(
     group_id: int,
     db: Session = Depends(get_db),
-    current_farmer = Depends(get_current_user)
+    current_farmer = Depends(get_current_farmer)
 ):
-    farmer = db.query(Farmer).filter(Farmer.email == current_farmer.email).first()
-
     group = db.query(SheepGroup).filter(
         SheepGroup.id == group_id,
-        SheepGroup.farm_id == farmer.farm_id
+        SheepGroup.farm_id == current_farmer.farm_id
     ).first()
 
     if not group:
@@ -222,7 +220,10 @@ def change_sheep_group(
         if not group:
             raise HTTPException(status_code=404, detail="Sheep group not found")
 
+    previous_group_id = sheep.group_id
     sheep.group_id = new_group_id
+    db.flush()
+    rollup.rebuild(db, farm_id=sheep.farm_id, group_ids=[previous_group_id, new_group_id])
     db.commit()
     db.refresh(sheep)
     return {"message": f"Sheep {sheep.id} moved to group {new_group_id}"}
@@ -233,30 +234,29 @@ def update_sheep_in_group(
     group_id: int,
     sheep_ids: List[int] = Body(..., embed=True),
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_farmer)
 ):
-    farmer = db.query(Farmer).filter(Farmer.email == current_user.email).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
     group = db.query(SheepGroup).filter(
         SheepGroup.id == group_id,
-        SheepGroup.farm_id == farmer.farm_id
+        SheepGroup.farm_id == current_user.farm_id
     ).first()
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
+    previous_groups = _current_groups(db, current_user.farm_id, sheep_ids)
+
     # Remove todas as ovelhas do grupo
     db.query(Sheep).filter(
         Sheep.group_id == group_id,
-        Sheep.farm_id == farmer.farm_id
+        Sheep.farm_id == current_user.farm_id
     ).update({ "group_id": None }, synchronize_session=False)
 
     # Adiciona as novas ovelhas ao grupo
     db.query(Sheep).filter(
         Sheep.id.in_(sheep_ids),
-        Sheep.farm_id == farmer.farm_id
+        Sheep.farm_id == current_user.farm_id
     ).update({ "group_id": group_id }, synchronize_session=False)
 
+    rollup.rebuild(db, farm_id=current_user.farm_id, group_ids=previous_groups | {group_id, None})
     db.commit()
     return {"message": f"Group {group_id} sheep updated"}
@@ -4,9 +4,13 @@ from database import SessionLocal
 from farmer.model_farmer import Farmer
 from veterinarian.model_veterinarian import Veterinarian
 from farm.model_farm import Farm
-from utils import hash_password
+from utils import hash_password, pwd_context, BCRYPT_ROUNDS
 from main import app
-from sqlalchemy import text
+from sqlalchemy import text, event
+from database import engine
+import principal_cache
+import time
+from blacklist import MemoryRevocationStore, SQLiteRevocationStore
 
 def reset_database():
     with SessionLocal() as db:
@@ -119,3 +123,108 @@ async def test_login_invalid_credentials():
 
         login_resp = await ac.post("/auth/login", json={"email": "noone@test.com", "password": "whatever"})
         assert login_resp.status_code == 401
+
+@pytest.mark.asyncio
+async def test_principal_cache_skips_user_query_and_is_invalidated():
+    reset_database()
+    farmer = create_test_farmer()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_resp = await ac.post("/auth/login", json={"email": farmer.email, "password": "farmer123"})
+        headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            first = await ac.get("/auth/me", headers=headers)
+            queries_first = len(statements)
+            statements.clear()
+            second = await ac.get("/auth/me", headers=headers)
+            queries_second = len(statements)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert first.json() == second.json()
+        assert queries_first == 1
+        assert queries_second == 0
+
+        # alterar o fazendeiro invalida o principal em cache
+        update_resp = await ac.put(f"/farmer/{farmer.id}", json={
+            "name": "Renamed Farmer",
+            "email": farmer.email,
+            "password": farmer.password,
+            "farm_id": farmer.farm_id
+        })
+        assert update_resp.status_code == 200
+        me_resp = await ac.get("/auth/me", headers=headers)
+        assert me_resp.json()["name"] == "Renamed Farmer"
+
+        # logout remove o token do cache
+        await ac.post("/auth/logout", headers=headers)
+        assert principal_cache.get_principal(headers["Authorization"].split()[1]) is None
+
+@pytest.mark.asyncio
+async def test_logout_revokes_token():
+    reset_database()
+    farmer = create_test_farmer()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        first = await ac.post("/auth/login", json={"email": farmer.email, "password": "farmer123"})
+        second = await ac.post("/auth/login", json={"email": farmer.email, "password": "farmer123"})
+        revoked = {"Authorization": f"Bearer {first.json()['access_token']}"}
+        other = {"Authorization": f"Bearer {second.json()['access_token']}"}
+
+        assert (await ac.get("/auth/me", headers=revoked)).status_code == 200
+        await ac.post("/auth/logout", headers=revoked)
+
+        me_resp = await ac.get("/auth/me", headers=revoked)
+        assert me_resp.status_code == 401
+        assert me_resp.json()["detail"] == "Token has been revoked"
+        # outras sessões do mesmo usuário continuam válidas (jti diferente)
+        assert (await ac.get("/auth/me", headers=other)).status_code == 200
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_revocation_store_expires_entries(backend, tmp_path):
+    if backend == "memory":
+        store = MemoryRevocationStore()
+    else:
+        store = SQLiteRevocationStore(str(tmp_path / "blacklist.sqlite3"))
+        store.PURGE_INTERVAL = 0
+
+    now = time.time()
+    store.revoke("expired", now - 1)
+    store.revoke("active", now + 60)
+    assert not store.is_revoked("expired")
+    assert store.is_revoked("active")
+    assert not store.is_revoked("unknown")
+
+    # revogações novas limpam as já expiradas
+    store.revoke("other", now + 60)
+    assert len(store) == 2
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_when_cost_changes():
+    reset_database()
+    farmer = create_test_farmer()
+    with SessionLocal() as db:
+        db.query(Farmer).filter(Farmer.id == farmer.id).update(
+            {"password": pwd_context.handler("bcrypt").using(rounds=4).hash("farmer123")}
+        )
+        db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_resp = await ac.post("/auth/login", json={"email": farmer.email, "password": "farmer123"})
+        assert login_resp.status_code == 200
+
+    with SessionLocal() as db:
+        stored = db.query(Farmer.password).filter(Farmer.id == farmer.id).scalar()
+    assert stored.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert pwd_context.verify("farmer123", stored)
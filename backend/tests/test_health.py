@@ -0,0 +1,72 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from database import SessionLocal, engine
+from farm.model_farm import Farm
+from farmer.model_farmer import Farmer
+from utils import hash_password
+from main import app
+from sqlalchemy import text
+
+def reset_database():
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM milk_production_individual"))
+        db.execute(text("DELETE FROM sheep_parentage"))
+        db.execute(text("DELETE FROM appointment_sheep"))
+        db.execute(text("DELETE FROM sheep"))
+        db.execute(text("DELETE FROM sheep_group"))
+        db.execute(text("DELETE FROM veterinarian"))
+        db.execute(text("DELETE FROM farmer"))
+        db.execute(text("DELETE FROM farm_inventory"))
+        db.execute(text("DELETE FROM sensor"))
+        db.execute(text("DELETE FROM farm"))
+        db.commit()
+
+def create_test_user():
+    with SessionLocal() as db:
+        farm = Farm(name="Health Farm", location="Pasture")
+        db.add(farm)
+        db.commit()
+        db.refresh(farm)
+
+        farmer = Farmer(
+            name="Health Farmer",
+            email="health@test.com",
+            password=hash_password("health123"),
+            farm_id=farm.id
+        )
+        db.add(farmer)
+        db.commit()
+        return farm.id
+
+
+@pytest.mark.asyncio
+async def test_health_db_reports_pool_usage():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.get("/health/db")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ok"
+    for pool in (data["pool"], data["async_pool"]):
+        assert {"size", "checked_out", "overflow", "overflow_max", "checkouts",
+                "timeouts", "wait_avg_ms", "wait_max_ms"} <= pool.keys()
+    # a conexão da própria requisição ainda está em uso
+    assert data["async_pool"]["checked_out"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sync_route_uses_a_single_connection():
+    reset_database()
+    create_test_user()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "health@test.com", "password": "health123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        # cache de principal frio: get_current_user e a rota dividem a mesma sessão
+        before = engine.pool.stats.checkouts
+        response = await ac.get("/sheep/", headers=headers)
+        assert response.status_code == 200
+        assert engine.pool.stats.checkouts - before == 1
@@ -1,15 +1,21 @@
+import asyncio
+import threading
 import pytest
 from httpx import AsyncClient, ASGITransport
 from datetime import date, timedelta
 from database import SessionLocal
+import database
+import response_cache
 from main import app
 from farm.model_farm import Farm
 from farmer.model_farmer import Farmer
 from sheep.model_sheep import Sheep
 from milkproduction.model_milkproduction import MilkProduction
+from milkproduction.model_milkdaily import MilkDailyFarmGroup
+from milkproduction import rollup
 from sheepgroup.model_sheepgroup import SheepGroup
 from utils import hash_password
-from sqlalchemy import text
+from sqlalchemy import text, event
 from fastapi.testclient import TestClient
 
 
@@ -79,6 +85,8 @@ async def test_total_today_endpoint():
         ]
         db.add_all(milk_records)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     # Faz login e acessa o endpoint
     transport = ASGITransport(app=app)
@@ -143,6 +151,8 @@ async def test_total_today_by_group_endpoint():
         ]
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     # Acessar o endpoint
     transport = ASGITransport(app=app)
@@ -221,6 +231,8 @@ async def test_total_last_7_days_endpoint():
         ]
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     # Acessar o endpoint
     transport = ASGITransport(app=app)
@@ -298,6 +310,8 @@ async def test_total_week_before_endpoint():
         ]
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     # Acessar o endpoint
     transport = ASGITransport(app=app)
@@ -372,6 +386,8 @@ async def test_total_yesterday_endpoint():
         ]
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -433,6 +449,8 @@ async def test_sum_last_7_days_endpoint():
         milk_data.append(MilkProduction(sheep_id=sheep.id, date=today - timedelta(days=8), volume=99.0))  # fora do intervalo
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -495,6 +513,8 @@ async def test_sum_2_weeks_ago_endpoint():
 
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -554,6 +574,8 @@ async def test_daily_total_last_7_days_endpoint():
         ]
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -618,6 +640,8 @@ async def test_daily_by_group_last_7_days_endpoint():
         ]
         db.add_all(milk_data)
         db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -637,3 +661,673 @@ async def test_daily_by_group_last_7_days_endpoint():
         assert isinstance(data, list)
         assert any(item["date"] == str(day_1) and item["group_name"] == "Grupo A" and item["total_volume"] == 4.5 for item in data)
         assert any(item["date"] == str(day_2) and item["group_name"] == "Grupo A" and item["total_volume"] == 3.0 for item in data)
+
+
+def reset_milk_database():
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM milk_production_individual"))
+        db.execute(text("DELETE FROM sheep_parentage"))
+        db.execute(text("DELETE FROM appointment_sheep"))
+        db.execute(text("DELETE FROM sheep"))
+        db.execute(text("DELETE FROM sheep_group"))
+        db.execute(text("DELETE FROM veterinarian"))
+        db.execute(text("DELETE FROM farmer"))
+        db.execute(text("DELETE FROM farm_inventory"))
+        db.execute(text("DELETE FROM sensor"))
+        db.execute(text("DELETE FROM farm"))
+        db.commit()
+
+
+def create_other_farm():
+    with SessionLocal() as db:
+        farm = Farm(name="Other Farm", location="Elsewhere")
+        db.add(farm)
+        db.commit()
+        return farm.id
+
+
+def create_herd(farm_id, groups=("Grupo A",), sheep_per_group=1, ungrouped=0):
+    with SessionLocal() as db:
+        group_ids = []
+        sheep_ids = []
+        for name in groups:
+            group = SheepGroup(name=name, farm_id=farm_id)
+            db.add(group)
+            db.flush()
+            group_ids.append(group.id)
+            for _ in range(sheep_per_group):
+                sheep = Sheep(birth_date=date(2022, 1, 1), gender="Fêmea", feeding_hay=1.0,
+                              feeding_feed=1.0, farm_id=farm_id, group_id=group.id)
+                db.add(sheep)
+                db.flush()
+                sheep_ids.append(sheep.id)
+        for _ in range(ungrouped):
+            sheep = Sheep(birth_date=date(2022, 1, 1), gender="Fêmea", feeding_hay=1.0,
+                          feeding_feed=1.0, farm_id=farm_id)
+            db.add(sheep)
+            db.flush()
+            sheep_ids.append(sheep.id)
+        db.commit()
+        return group_ids, sheep_ids
+
+
+@pytest.mark.asyncio
+async def test_daily_rollup_follows_writes():
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    (group_id,), (grouped_id, loose_id) = create_herd(farm_id, ungrouped=1)
+    today = date.today()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+        await ac.patch(f"/sheep/{grouped_id}/milk-yield", json={"date": str(today), "volume": 2.0}, headers=headers)
+        await ac.patch(f"/sheep/{grouped_id}/milk-yield", json={"date": str(today), "volume": 3.5}, headers=headers)
+        await ac.patch(f"/sheep/{loose_id}/milk-yield", json={"date": str(today), "volume": 1.5}, headers=headers)
+        await ac.patch(f"/sheep/{loose_id}/milk-yield", json={"date": str(today - timedelta(days=3)), "volume": 4.0}, headers=headers)
+
+        response = await ac.get("/milk-production/total-today", headers=headers)
+        assert response.json()["total_volume"] == 5.0
+
+        response = await ac.get("/milk-production/total-today-by-group", headers=headers)
+        assert response.json() == [{"group_id": group_id, "group_name": "Grupo A", "total_volume": 3.5}]
+
+        response = await ac.get("/milk-production/sum-last-7-days", headers=headers)
+        assert response.json()["total_volume"] == 9.0
+
+        # mover a ovelha leva a produção histórica junto para o novo grupo
+        response = await ac.patch(f"/sheep-group/{loose_id}/change-group", json={"new_group_id": group_id}, headers=headers)
+        assert response.status_code == 200
+
+        response = await ac.get("/milk-production/total-today-by-group", headers=headers)
+        assert response.json()[0]["total_volume"] == 5.0
+
+    with SessionLocal() as db:
+        incremental = db.query(MilkDailyFarmGroup.group_id, MilkDailyFarmGroup.date,
+                               MilkDailyFarmGroup.total, MilkDailyFarmGroup.count).order_by(MilkDailyFarmGroup.date).all()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
+        rebuilt = db.query(MilkDailyFarmGroup.group_id, MilkDailyFarmGroup.date,
+                           MilkDailyFarmGroup.total, MilkDailyFarmGroup.count).order_by(MilkDailyFarmGroup.date).all()
+        assert incremental == rebuilt
+        assert [row.count for row in rebuilt] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_milk_yield_patch_waits_for_concurrent_writer():
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    (group_id,), (sheep_id,) = create_herd(farm_id)
+    today = date.today()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        await ac.patch(f"/sheep/{sheep_id}/milk-yield", json={"date": str(today), "volume": 2.0}, headers=headers)
+
+        # outra transação altera o registro (e o rollup) e segura a linha
+        statements = []
+        async_engine = database.get_async_engine().sync_engine
+        capture = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(async_engine, "before_cursor_execute", capture)
+        with SessionLocal() as other:
+            other.query(MilkProduction).filter_by(sheep_id=sheep_id, date=today).update({"volume": 5.0})
+            rollup.apply_deltas(other, [(farm_id, group_id, today, 3.0, 0)])
+            patch = asyncio.create_task(ac.patch(f"/sheep/{sheep_id}/milk-yield",
+                                                 json={"date": str(today), "volume": 4.0}, headers=headers))
+            await asyncio.sleep(0.5)
+            assert not patch.done()
+            other.commit()
+        response = await patch
+        event.remove(async_engine, "before_cursor_execute", capture)
+        assert response.status_code == 200
+        # volume anterior e upsert num único comando
+        assert len([statement for statement in statements if "milk_production_individual" in statement]) == 1
+
+    with SessionLocal() as db:
+        # o delta parte do valor confirmado pela outra transação (5.0), não do snapshot (2.0)
+        assert db.query(MilkDailyFarmGroup.total).filter_by(farm_id=farm_id, date=today).scalar() == 4.0
+
+
+@pytest.mark.asyncio
+async def test_dashboard_summary_and_etag():
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    (group_id,), (sheep_id,) = create_herd(farm_id)
+    today = date.today()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+        for days_ago, volume in [(0, 2.0), (1, 3.0), (7, 1.0), (10, 4.0), (20, 9.0)]:
+            await ac.patch(f"/sheep/{sheep_id}/milk-yield", json={
+                "date": str(today - timedelta(days=days_ago)), "volume": volume
+            }, headers=headers)
+
+        response = await ac.get("/milk-production/summary", headers=headers)
+        assert response.status_code == 200
+        summary = response.json()
+        assert summary["total_today"]["total_volume"] == 2.0
+        assert summary["total_today_by_group"] == [{"group_id": group_id, "group_name": "Grupo A", "total_volume": 2.0}]
+        assert summary["sum_last_7_days"]["total_volume"] == 6.0
+        assert summary["sum_2_weeks_ago"]["total_volume"] == 4.0
+        assert [d["total_volume"] for d in summary["daily_total_last_7_days"]] == [3.0, 2.0]
+
+        # o resumo bate com os endpoints individuais
+        for section, path in [
+            ("total_today", "/milk-production/total-today"),
+            ("total_today_by_group", "/milk-production/total-today-by-group"),
+            ("sum_last_7_days", "/milk-production/sum-last-7-days"),
+            ("sum_2_weeks_ago", "/milk-production/sum-2-weeks-ago"),
+            ("daily_total_last_7_days", "/milk-production/daily-total-last-7-days"),
+        ]:
+            single = await ac.get(path, headers=headers)
+            assert single.json() == summary[section]
+
+        by_group = await ac.get("/milk-production/daily-by-group-last-7-days", headers=headers)
+        assert [day["total_volume"] for day in by_group.json()] == [0.0, 0.0, 0.0, 0.0, 0.0, 3.0, 2.0]
+
+        etag = response.headers["etag"]
+        cached = await ac.get("/milk-production/summary", headers={**headers, "If-None-Match": etag})
+        assert cached.status_code == 304
+
+        await ac.patch(f"/sheep/{sheep_id}/milk-yield", json={"date": str(today), "volume": 2.5}, headers=headers)
+        changed = await ac.get("/milk-production/summary", headers={**headers, "If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_bulk_milk_ingestion_json_and_csv():
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    _, (sheep_a, sheep_b) = create_herd(farm_id, sheep_per_group=2)
+    _, (foreign_sheep,) = create_herd(create_other_farm(), sheep_per_group=1)
+    today = date.today()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+        response = await ac.post("/milk-production/bulk", json=[
+            {"sheep_id": sheep_a, "date": str(today), "volume": 1.0},
+            {"sheep_id": sheep_b, "date": str(today), "volume": 2.0},
+            {"sheep_id": sheep_a, "date": str(today), "volume": 1.5},
+            {"sheep_id": foreign_sheep, "date": str(today), "volume": 9.0},
+            {"sheep_id": sheep_b, "date": "not-a-date", "volume": 2.0},
+        ], headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        assert [r["status"] for r in body["rows"]] == ["superseded", "created", "created", "rejected", "rejected"]
+        assert (body["created"], body["updated"], body["rejected"]) == (2, 0, 2)
+
+        csv_body = f"sheep_id,date,volume\n{sheep_a},{today},2.5\n{sheep_b},{today - timedelta(days=1)},1.0\n"
+        response = await ac.post("/milk-production/bulk", content=csv_body.encode(),
+                                 headers={**headers, "Content-Type": "text/csv"})
+        assert response.status_code == 200
+        assert [r["status"] for r in response.json()["rows"]] == ["updated", "created"]
+
+        response = await ac.get("/milk-production/total-today", headers=headers)
+        assert response.json()["total_volume"] == 4.5
+        response = await ac.get("/milk-production/sum-last-7-days", headers=headers)
+        assert response.json()["total_volume"] == 5.5
+
+
+@pytest.mark.asyncio
+async def test_bulk_milk_ingestion_requires_farmer_and_row_limit(monkeypatch):
+    from milkproduction import router_milkproduction
+    from veterinarian.model_veterinarian import Veterinarian
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    _, (sheep_id,) = create_herd(farm_id)
+    with SessionLocal() as db:
+        farmer_id = db.query(Farmer.id).filter(Farmer.farm_id == farm_id).scalar()
+        db.add(Veterinarian(name="Vet", email="vet@test.com", password=hash_password("vet123"),
+                            farm_id=farm_id, farmer_id=farmer_id))
+        db.commit()
+    rows = [{"sheep_id": sheep_id, "date": str(date.today() - timedelta(days=days)), "volume": 1.0}
+            for days in range(3)]
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "vet@test.com", "password": "vet123"})
+        vet_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        response = await ac.post("/milk-production/bulk", json=rows, headers=vet_headers)
+        assert response.status_code == 404
+
+        login = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        monkeypatch.setattr(router_milkproduction, "MAX_BULK_ROWS", 2)
+        response = await ac.post("/milk-production/bulk", json=rows, headers=headers)
+        assert response.status_code == 413
+        response = await ac.post("/milk-production/bulk", json=rows[:2], headers=headers)
+        assert response.status_code == 200
+
+    with SessionLocal() as db:
+        assert db.query(MilkProduction).filter(MilkProduction.sheep_id == sheep_id).count() == 2
+
+
+@pytest.mark.asyncio
+async def test_analytics_read_from_replica_with_fallback(monkeypatch):
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    _, (sheep_id,) = create_herd(farm_id)
+    today = date.today()
+    with SessionLocal() as db:
+        db.add(MilkProduction(sheep_id=sheep_id, date=today, volume=2.0))
+        db.flush()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
+
+    # só Postgres: outra base passaria no teste de lag e falharia nas consultas
+    with pytest.raises(ValueError):
+        database.configure_replicas(["sqlite:///replica.sqlite3"])
+    assert database.replicas == []
+
+    # "réplica" = o próprio banco de teste; a outra URL não responde e deve ser ignorada
+    database.configure_replicas([database.DATABASE_URL, "postgresql://replica@127.0.0.1:1/sheep"])
+    try:
+        replica, unreachable = database.replicas
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+            headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+            for _ in range(2):  # o round-robin passa pelas duas réplicas
+                before = replica.engine.pool.stats.checkouts
+                response = await ac.get("/milk-production/summary", headers=headers)
+                assert response.json()["total_today"]["total_volume"] == 2.0
+                assert replica.engine.pool.stats.checkouts > before
+            assert replica.healthy and not unreachable.healthy
+
+            response = await ac.get("/milk-production/total-today", headers=headers)
+            assert response.json()["total_volume"] == 2.0
+            assert database.get_async_engine(replica.async_url).pool.stats.checkouts > 0
+
+            # read-your-writes: quem acabou de escrever lê do primário
+            await ac.patch(f"/sheep/{sheep_id}/milk-yield", json={"date": str(today), "volume": 3.0}, headers=headers)
+            before = replica.engine.pool.stats.checkouts
+            response = await ac.get("/milk-production/summary", headers=headers)
+            assert response.json()["total_today"]["total_volume"] == 3.0
+            assert replica.engine.pool.stats.checkouts == before
+
+            # réplica atrasada além do limite: outro token também cai no primário
+            login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+            other = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+            monkeypatch.setattr(database, "DB_REPLICA_MAX_LAG", -1)
+            replica.checked_at = float("-inf")
+            response = await ac.get("/sheep-group/sheep-count-by-group", headers=other)
+            assert response.status_code == 200
+            assert not replica.healthy
+    finally:
+        database.configure_replicas([])
+
+
+@pytest.mark.asyncio
+async def test_milk_series():
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    (group_a, group_b), (sheep_a, sheep_b, loose) = create_herd(farm_id, groups=("Grupo A", "Grupo B"), ungrouped=1)
+
+    with SessionLocal() as db:
+        db.add_all([
+            MilkProduction(sheep_id=sheep_a, date=date(2024, 1, 30), volume=2.0),
+            MilkProduction(sheep_id=sheep_a, date=date(2024, 2, 2), volume=1.0),
+            MilkProduction(sheep_id=sheep_b, date=date(2024, 2, 1), volume=4.0),
+            MilkProduction(sheep_id=loose, date=date(2024, 2, 5), volume=3.5),
+        ])
+        db.flush()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+        # semanas começam na segunda (29/01 e 05/02); 30/01 fica fora do intervalo
+        response = await ac.get("/milk-production/series?from=2024-01-31&to=2024-02-05&granularity=week",
+                                headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["source"] == "rollup"
+        assert data["buckets"] == ["2024-01-29", "2024-02-05"]
+        assert data["series"] == [{"key": None, "label": None, "values": [5.0, 3.5], "total": 8.5}]
+
+        response = await ac.get("/milk-production/series?from=2024-01-31&to=2024-02-05&granularity=week"
+                                "&group_by=group", headers=headers)
+        assert [(s["key"], s["label"], s["values"]) for s in response.json()["series"]] == [
+            (group_b, "Grupo B", [4.0, 0.0]), (None, None, [0.0, 3.5]), (group_a, "Grupo A", [1.0, 0.0])
+        ]
+
+        # dias sem produção saem zerados
+        response = await ac.get("/milk-production/series?from=2024-02-01&to=2024-02-03", headers=headers)
+        assert response.json()["series"][0]["values"] == [4.0, 1.0, 0.0]
+
+        response = await ac.get("/milk-production/series?from=2024-01-01&to=2024-02-29&granularity=month"
+                                "&group_by=sheep&limit=2", headers=headers)
+        data = response.json()
+        assert data["source"] == "individual" and data["truncated"] is True
+        assert [(s["key"], s["values"]) for s in data["series"]] == [(sheep_b, [0.0, 4.0]), (loose, [0.0, 3.5])]
+
+        response = await ac.get("/milk-production/series?from=2024-01-01&to=2024-12-31&granularity=year"
+                                "&group_by=birth_year", headers=headers)
+        assert response.json()["series"] == [{"key": 2022, "label": None, "values": [10.5], "total": 10.5}]
+
+        response = await ac.get("/milk-production/series?from=2024-01-01&to=2024-12-31&group_by=gender",
+                                headers=headers)
+        assert [(s["key"], s["total"]) for s in response.json()["series"]] == [("Fêmea", 10.5)]
+
+        response = await ac.get("/milk-production/series?from=2000-01-01&to=2024-12-31", headers=headers)
+        assert response.status_code == 400
+        response = await ac.get("/milk-production/series?from=2024-02-01&to=2024-01-01", headers=headers)
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_milk_yield_anomalies(monkeypatch):
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    _, (sheep_a, sheep_b, sheep_c) = create_herd(farm_id, sheep_per_group=3)
+    from milkproduction import anomalies
+    from milkproduction.model_yieldstats import MilkYieldStats
+    today = date.today()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+        # 20 dias de histórico estável (sem estado: calculado a partir do histórico)
+        history = [
+            {"sheep_id": sheep_id, "date": str(today - timedelta(days=d)), "volume": 2.0 + (0.05 if d % 2 else -0.05)}
+            for sheep_id in (sheep_a, sheep_b, sheep_c) for d in range(20, 0, -1)
+        ]
+        response = await ac.post("/milk-production/bulk", json=history, headers=headers)
+        assert response.json()["created"] == 60
+        response = await ac.get("/milk-production/anomalies", headers=headers)
+        assert response.json() == []
+
+        # ordenha de hoje: só a ovelha A cai
+        response = await ac.post("/milk-production/bulk", json=[
+            {"sheep_id": sheep_a, "date": str(today), "volume": 0.8},
+            {"sheep_id": sheep_b, "date": str(today), "volume": 2.0},
+            {"sheep_id": sheep_c, "date": str(today), "volume": 1.9},
+        ], headers=headers)
+        assert response.status_code == 200
+
+        response = await ac.get("/milk-production/anomalies", headers=headers)
+        data = response.json()
+        assert [row["sheep_id"] for row in data] == [sheep_a]
+        assert data[0]["date"] == str(today)
+        assert data[0]["expected"] == pytest.approx(2.0, abs=0.05)
+        assert data[0]["deviation"] < -anomalies.ANOMALY_THRESHOLD
+        assert data[0]["drop"] == pytest.approx(0.6, abs=0.02)
+        response = await ac.get("/milk-production/anomalies?threshold=100", headers=headers)
+        assert response.json() == []
+
+        # atualização incremental == recálculo a partir do histórico
+        def snapshot():
+            with SessionLocal() as db:
+                return {
+                    row.sheep_id: (row.count, row.mean, row.variance, row.last_date, row.expected, row.deviation)
+                    for row in db.query(MilkYieldStats).all()
+                }
+
+        incremental = snapshot()
+        with SessionLocal() as db:
+            assert anomalies.rebuild(db, farm_id) == 3
+            db.commit()
+        rebuilt = snapshot()
+        assert incremental.keys() == rebuilt.keys() == {sheep_a, sheep_b, sheep_c}
+        for sheep_id, values in incremental.items():
+            assert values[0] == rebuilt[sheep_id][0] == 21
+            assert values[3] == rebuilt[sheep_id][3]
+            assert values[1:3] + values[4:] == pytest.approx(rebuilt[sheep_id][1:3] + rebuilt[sheep_id][4:])
+
+        # correção do registro de hoje (mesma data) e reenvio da ordenha: desfaz só o último passo
+        replay = anomalies._replay
+
+        def no_replay(db, sheep_ids):
+            raise AssertionError(f"history replayed for {sheep_ids}")
+
+        monkeypatch.setattr(anomalies, "_replay", no_replay)
+        response = await ac.patch(f"/sheep/{sheep_a}/milk-yield", json={"date": str(today), "volume": 2.0},
+                                  headers=headers)
+        assert response.status_code == 200
+        response = await ac.post("/milk-production/bulk", json=[
+            {"sheep_id": sheep_b, "date": str(today), "volume": 2.0},
+            {"sheep_id": sheep_c, "date": str(today), "volume": 1.9},
+            {"sheep_id": sheep_c, "date": str(today + timedelta(days=1)), "volume": 2.0},
+        ], headers=headers)
+        assert response.status_code == 200
+        response = await ac.get("/milk-production/anomalies", headers=headers)
+        assert response.json() == []
+
+        incremental = snapshot()
+        monkeypatch.setattr(anomalies, "_replay", replay)
+        with SessionLocal() as db:
+            anomalies.rebuild(db, farm_id)
+            db.commit()
+        rebuilt = snapshot()
+        assert incremental[sheep_a][0] == 21 and incremental[sheep_c][0] == 22
+        for sheep_id, values in incremental.items():
+            assert values[0] == rebuilt[sheep_id][0]
+            assert values[3] == rebuilt[sheep_id][3]
+            assert values[1:3] + values[4:] == pytest.approx(rebuilt[sheep_id][1:3] + rebuilt[sheep_id][4:])
+
+        # registro atrasado (anterior ao último): recalculado a partir do histórico
+        response = await ac.patch(f"/sheep/{sheep_a}/milk-yield",
+                                  json={"date": str(today - timedelta(days=30)), "volume": 2.0}, headers=headers)
+        assert response.status_code == 200
+        assert snapshot()[sheep_a][0] == 22
+
+
+@pytest.mark.asyncio
+async def test_milk_forecast(monkeypatch):
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    (group_a, group_b), (sheep_a, sheep_b, sheep_new) = create_herd(
+        farm_id, groups=("Grupo A", "Grupo B"), sheep_per_group=1, ungrouped=1
+    )
+    from milkproduction import forecast
+    from milkproduction.model_forecast import MilkForecast
+    refresh = forecast.refresh
+    origin = date.today() - timedelta(days=1)
+
+    # A: padrão semanal (mais leite nos fins de semana); B: queda linear; sem grupo: 5 dias de histórico
+    def volume_a(day):
+        return 2.0 + (0.5 if day.weekday() >= 5 else 0.0)
+
+    def volume_b(day):
+        return round(3.0 - 0.01 * (day - origin).days, 2)
+
+    with SessionLocal() as db:
+        for d in range(forecast.HISTORY_DAYS):
+            day = origin - timedelta(days=d)
+            db.add(MilkProduction(sheep_id=sheep_a, date=day, volume=volume_a(day)))
+            db.add(MilkProduction(sheep_id=sheep_b, date=day, volume=volume_b(day)))
+            if d < 5:
+                db.add(MilkProduction(sheep_id=sheep_new, date=day, volume=1.0))
+        db.commit()
+        rollup.rebuild(db, farm_id=farm_id)
+        db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+        # sem previsão gravada: a leitura responde vazia e agenda o ajuste em segundo plano
+        refits = []
+        monkeypatch.setattr(forecast, "refresh", lambda *args, **kwargs: refits.append(args) or refresh(*args, **kwargs))
+        response = await ac.get("/milk-production/forecast?days=14&group_by=group", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["stale"], data["fitted_at"], data["series"]) == (True, None, [])
+        assert len(refits) == 1
+
+        response = await ac.get("/milk-production/forecast?days=14&group_by=group", headers=headers)
+        data = response.json()
+        assert data["origin"] == str(origin) and data["stale"] is False
+        assert len(refits) == 1
+        assert data["dates"][0] == str(origin + timedelta(days=1)) and len(data["dates"]) == 14
+        series = {entry["key"]: entry for entry in data["series"]}
+        assert series.keys() == {group_a, group_b, None}
+        assert series[group_a]["label"] == "Grupo A"
+
+        dates = [date.fromisoformat(day) for day in data["dates"]]
+        assert series[group_a]["values"] == pytest.approx([volume_a(day) for day in dates], abs=0.01)
+        # tendência de -0.01/dia continua depois da origem
+        assert series[group_b]["values"] == pytest.approx([volume_b(day) for day in dates], abs=0.01)
+        assert series[None]["values"] == pytest.approx([1.0] * 14)  # histórico curto: média
+        for entry in series.values():
+            assert all(low <= value <= high for low, value, high in zip(entry["lower"], entry["values"], entry["upper"]))
+
+        response = await ac.get("/milk-production/forecast?days=7", headers=headers)
+        (total,) = response.json()["series"]
+        assert total["key"] is None and len(total["values"]) == 7
+        assert total["values"] == pytest.approx(
+            [sum(entry["values"][i] for entry in series.values()) for i in range(7)], abs=0.02
+        )
+
+        # previsão do dia já gravada: lida sem reajuste; obsoleta: servida como está
+        # (stale) e reajustada depois da resposta
+        with SessionLocal() as db:
+            fitted_at = {row.fitted_at for row in db.query(MilkForecast).filter(MilkForecast.farm_id == farm_id)}
+            assert len(fitted_at) == 1
+            refresh(db, farm_id, origin - timedelta(days=1))
+            db.commit()
+        response_cache.bump_farm(farm_id)
+
+        response = await ac.get("/milk-production/forecast?days=30&group_by=group", headers=headers)
+        assert response.json()["origin"] == str(origin - timedelta(days=1))
+        assert response.json()["stale"] is True
+        response = await ac.get("/milk-production/forecast?days=30&group_by=group", headers=headers)
+        assert response.json()["origin"] == str(origin) and response.json()["stale"] is False
+        assert len(refits) == 2
+        with SessionLocal() as db:
+            stored = db.query(MilkForecast).filter(MilkForecast.farm_id == farm_id).all()
+            assert {row.origin for row in stored} == {origin}
+            assert len(stored) == 4
+            assert all(len(row.values) == forecast.FORECAST_HORIZON for row in stored)
+
+        response = await ac.get("/milk-production/forecast?days=31", headers=headers)
+        assert response.status_code == 422
+
+    # dois reajustes concorrentes da previsão obsoleta: o segundo não espera nem repete o ajuste
+    with SessionLocal() as db:
+        refresh(db, farm_id, origin - timedelta(days=1))
+        db.commit()
+    outcome = {}
+
+    def concurrent():
+        with SessionLocal() as db:
+            outcome["refit"] = forecast.refresh_stale(db, farm_id, origin)
+            db.commit()
+
+    with SessionLocal() as first:
+        assert forecast.refresh_stale(first, farm_id, origin) is True
+        thread = threading.Thread(target=concurrent)
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive()
+        first.commit()
+    assert outcome == {"refit": False}
+    with SessionLocal() as db:
+        assert forecast.refresh_stale(db, farm_id, origin) is False
+
+    # fazenda sem histórico: marca de ajuste gravada, sem reajuste a cada pedido
+    empty_farm_id = create_other_farm()
+    with SessionLocal() as db:
+        assert forecast.refresh_stale(db, empty_farm_id, origin) is True
+        db.commit()
+        assert forecast.refresh_stale(db, empty_farm_id, origin) is False
+        (marker,) = db.query(MilkForecast).filter(MilkForecast.farm_id == empty_farm_id).all()
+        assert (marker.scope, marker.group_id, marker.history_days) == ("farm", None, 0)
+
+
+@pytest.mark.asyncio
+async def test_milk_ranking():
+    reset_milk_database()
+    farm_id = create_test_user_and_farm()
+    (_, group_b), sheep = create_herd(farm_id, groups=("Grupo A", "Grupo B"), sheep_per_group=3)
+    other_farm_id = create_other_farm()
+    _, (outsider,) = create_herd(other_farm_id)
+    today = date.today()
+
+    # totais na janela: 4, 8, 12, 16, 20 e 16 (a última ovelha em só 2 dias, média 8)
+    rows = [
+        {"sheep_id": sheep_id, "date": str(today - timedelta(days=d)), "volume": float(i + 1)}
+        for i, sheep_id in enumerate(sheep[:5]) for d in range(1, 5)
+    ]
+    rows += [{"sheep_id": sheep[5], "date": str(today - timedelta(days=d)), "volume": 8.0} for d in (1, 2)]
+    rows.append({"sheep_id": sheep[0], "date": str(today - timedelta(days=40)), "volume": 100.0})
+    with SessionLocal() as db:
+        db.add(MilkProduction(sheep_id=outsider, date=today - timedelta(days=1), volume=50.0))
+        db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_response = await ac.post("/auth/login", json={"email": "milk@test.com", "password": "milk123"})
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        response = await ac.post("/milk-production/bulk", json=rows, headers=headers)
+        assert response.json()["created"] == len(rows)
+
+        response = await ac.get("/milk-production/ranking?limit=3&buckets=2", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["herd_size"] == 6
+        assert data["cutoffs"] == [14.0]
+        assert [row["sheep_id"] for row in data["sheep"]] == [sheep[4], sheep[3], sheep[5]]
+        assert [row["rank"] for row in data["sheep"]] == [1, 2, 2]
+        assert [row["percentile"] for row in data["sheep"]] == [100.0, 60.0, 60.0]
+        assert [row["bucket"] for row in data["sheep"]] == [1, 1, 1]
+        assert data["sheep"][2] == {
+            "sheep_id": sheep[5], "group_id": group_b, "rank": 2, "total": 16.0, "average": 8.0,
+            "days": 2, "percentile": 60.0, "bucket": 1,
+        }
+
+        # empate (16 e 16) em cima de um corte: as duas no mesmo quantil, coerente com os cortes
+        response = await ac.get("/milk-production/ranking?limit=6&buckets=3", headers=headers)
+        data = response.json()
+        assert data["cutoffs"] == [10.67, 16.0]
+        assert [(row["total"], row["bucket"]) for row in data["sheep"]] == [
+            (20.0, 1), (16.0, 1), (16.0, 1), (12.0, 2), (8.0, 3), (4.0, 3),
+        ]
+        for row in data["sheep"]:
+            assert row["bucket"] == 1 + sum(cutoff > row["total"] for cutoff in data["cutoffs"])
+
+        response = await ac.get("/milk-production/ranking?order=bottom&limit=2&buckets=2", headers=headers)
+        data = response.json()
+        assert [(row["sheep_id"], row["rank"], row["percentile"], row["bucket"]) for row in data["sheep"]] == [
+            (sheep[0], 6, 0.0, 2), (sheep[1], 5, 20.0, 2),
+        ]
+
+        response = await ac.get("/milk-production/ranking?metric=average&limit=1", headers=headers)
+        assert [row["sheep_id"] for row in response.json()["sheep"]] == [sheep[5]]
+        assert len(response.json()["cutoffs"]) == 3
+
+        response = await ac.get(f"/milk-production/ranking?group_id={group_b}&limit=500", headers=headers)
+        data = response.json()
+        assert data["herd_size"] == 3
+        assert [row["sheep_id"] for row in data["sheep"]] == [sheep[4], sheep[3], sheep[5]]
+
+        # janela maior inclui o registro antigo
+        start = today - timedelta(days=60)
+        response = await ac.get(f"/milk-production/ranking?from={start}&limit=1", headers=headers)
+        assert response.json()["sheep"][0]["sheep_id"] == sheep[0]
+        assert response.json()["sheep"][0]["total"] == 104.0
+
+        response = await ac.get(f"/milk-production/ranking?from={today - timedelta(days=100)}&to={start}",
+                                headers=headers)
+        assert response.json()["herd_size"] == 0
+        assert response.json()["sheep"] == []
+        response = await ac.get(f"/milk-production/ranking?from={today}&to={start}", headers=headers)
+        assert response.status_code == 400
@@ -0,0 +1,176 @@
+import json
+import re
+import pytest
+from datetime import date, timedelta
+from httpx import AsyncClient, ASGITransport
+import database
+import response_cache
+from database import SessionLocal, engine, get_async_engine
+from farm.model_farm import Farm
+from farmer.model_farmer import Farmer
+from sheep.model_sheep import Sheep
+from sheep.model_sheepparentage import SheepParentage
+from sheepgroup.model_sheepgroup import SheepGroup
+from utils import hash_password
+from sqlalchemy import text, event
+from main import app
+
+# Endpoints quentes e os índices que os planos das suas queries precisam usar
+# (os da migração 0003 e as restrições únicas do upsert/rollup); uma tupla
+# aceita qualquer um dos índices dela
+ENDPOINTS = {
+    "/sheep/": {"ix_sheep_farm_id_id"},
+    "/sheep/?limit=10&gender=F%C3%AAmea": {"ix_sheep_farm_id_id"},
+    "/sheep/{sheep_id}": {"ix_sheep_parentage_offspring_id_parent_id"},
+    "/sheep/{sheep_id}/parents": {"ix_sheep_parentage_offspring_id_parent_id"},
+    "/sheep/{sheep_id}/children": {"_parent_offspring_uc"},
+    "/sheep/{sheep_id}/milk-yield": {"_sheep_date_uc"},
+    "/sheep-group/": {"ix_sheep_group_farm_id"},
+    "/sheep-group/sheep-count-by-group": {"ix_sheep_group_farm_id", "ix_sheep_farm_id_group_id"},
+    "/sheep-group/{group_id}/sheep": {"ix_sheep_farm_id_group_id"},
+    "/milk-production/summary": {"ix_milk_daily_farm_group_farm_id_date"},
+    "/milk-production/total-today": {"ix_milk_daily_farm_group_farm_id_date"},
+    "/milk-production/total-today-by-group": {"_milk_daily_farm_group_uc"},
+    "/milk-production/sum-last-7-days": {"ix_milk_daily_farm_group_farm_id_date"},
+    "/milk-production/sum-2-weeks-ago": {"ix_milk_daily_farm_group_farm_id_date"},
+    "/milk-production/daily-total-last-7-days": {"ix_milk_daily_farm_group_farm_id_date"},
+    "/milk-production/daily-by-group-last-7-days": {"ix_milk_daily_farm_group_farm_id_date"},
+    "/milk-production/ranking": {("ix_milk_production_individual_date", "_sheep_date_uc"), "ix_sheep_farm_id_id"},
+    "/milk-production/ranking?order=bottom&metric=average&buckets=10&group_id={group_id}": {
+        ("ix_milk_production_individual_date", "_sheep_date_uc"), "ix_sheep_farm_id_id"
+    },
+    "/sensor/": {"ix_sensor_farm_id_name"},
+    "/inventory/": {"ix_farm_inventory_farm_id_item_name"},
+}
+
+
+def reset_database():
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM milk_production_individual"))
+        db.execute(text("DELETE FROM sheep_parentage"))
+        db.execute(text("DELETE FROM appointment_sheep"))
+        db.execute(text("DELETE FROM medication"))
+        db.execute(text("DELETE FROM appointment"))
+        db.execute(text("DELETE FROM veterinarian"))
+        db.execute(text("DELETE FROM sheep"))
+        db.execute(text("DELETE FROM sheep_group"))
+        db.execute(text("DELETE FROM farm_inventory"))
+        db.execute(text("DELETE FROM sensor"))
+        db.execute(text("DELETE FROM farmer"))
+        db.execute(text("DELETE FROM farm"))
+        db.commit()
+
+
+def create_farm_with_herd():
+    with SessionLocal() as db:
+        farm = Farm(name="Plan Farm", location="Hill")
+        db.add(farm)
+        db.flush()
+        db.add(Farmer(name="Planner", email="plan@test.com", password=hash_password("plan123"), farm_id=farm.id))
+        group = SheepGroup(name="Lote 1", farm_id=farm.id)
+        db.add(group)
+        db.flush()
+
+        ram = Sheep(birth_date=date(2019, 1, 1), farm_id=farm.id, feeding_hay=1.0, feeding_feed=1.0, gender="Macho")
+        ewe = Sheep(birth_date=date(2019, 1, 1), farm_id=farm.id, feeding_hay=1.0, feeding_feed=1.0, gender="Fêmea")
+        lamb = Sheep(birth_date=date(2022, 1, 1), farm_id=farm.id, feeding_hay=1.0, feeding_feed=1.0,
+                     gender="Fêmea", group_id=group.id)
+        db.add_all([ram, ewe, lamb])
+        db.flush()
+        db.add_all([
+            SheepParentage(parent_id=ram.id, offspring_id=lamb.id),
+            SheepParentage(parent_id=ewe.id, offspring_id=lamb.id),
+        ])
+        db.commit()
+        return lamb.id, group.id
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def as_psycopg2(statement, parameters):
+    # statements do asyncpg usam $1, $2...; o EXPLAIN roda pelo psycopg2 (%s)
+    if not isinstance(parameters, (list, tuple)) or "$" not in statement:
+        return statement, parameters
+    ordered = []
+
+    def placeholder(match):
+        ordered.append(parameters[int(match.group(1)) - 1])
+        return "%s"
+
+    statement = re.sub(r"\$(\d+)", placeholder, statement.replace("%", "%%"))
+    return statement, tuple(ordered)
+
+
+def explain(statement, parameters) -> list:
+    """Nós do plano da query. enable_seqscan = off só tira o seq scan "de graça"
+    da base pequena de teste; o planner ainda pode varrer um índice qualquer
+    inteiro, por isso o teste confere os índices esperados de cada endpoint."""
+    statement, parameters = as_psycopg2(statement, parameters)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("SET enable_seqscan = off")
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        raw.rollback()
+    finally:
+        raw.close()
+    return list(plan_nodes(plan[0]["Plan"]))
+
+
+@pytest.mark.asyncio
+async def test_hot_endpoints_use_their_indexes():
+    reset_database()
+    sheep_id, group_id = create_farm_with_herd()
+    with SessionLocal() as db:
+        farm_id = db.get(Sheep, sheep_id).farm_id
+
+    captured = []
+    # rotas síncronas, assíncronas (engine deste event loop) e réplicas configuradas
+    engines = [engine, get_async_engine().sync_engine]
+    for replica in database.replicas:
+        engines += [replica.engine, get_async_engine(replica.async_url).sync_engine]
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "plan@test.com", "password": "plan123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        await ac.patch(f"/sheep/{sheep_id}/milk-yield", json={"date": str(date.today()), "volume": 2.0}, headers=headers)
+        await ac.patch(f"/sheep/{sheep_id}/milk-yield", json={"date": str(date.today() - timedelta(days=1)), "volume": 1.0}, headers=headers)
+
+        for endpoint, expected_indexes in ENDPOINTS.items():
+            url = endpoint.format(sheep_id=sheep_id, group_id=group_id)
+            captured.clear()
+            response_cache.bump_farm(farm_id)  # resposta em cache não executaria nenhuma query
+            for bind in engines:
+                event.listen(bind, "before_cursor_execute", capture)
+            try:
+                response = await ac.get(url, headers=headers)
+            finally:
+                for bind in engines:
+                    event.remove(bind, "before_cursor_execute", capture)
+            assert response.status_code == 200, url
+            assert captured, f"{url}: no statement captured"
+            if url.startswith("/milk-production/ranking"):
+                # a query de janela/percentis em si passa pelo EXPLAIN
+                assert any("percent_rank" in statement for statement, _ in captured), url
+
+            used = set()
+            for statement, parameters in captured:
+                nodes = explain(statement, parameters)
+                assert [node.get("Relation Name") for node in nodes if node["Node Type"] == "Seq Scan"] == [], \
+                    f"{url}: {statement}"
+                used.update(node["Index Name"] for node in nodes if "Index Name" in node)
+            for expected in expected_indexes:
+                alternatives = expected if isinstance(expected, tuple) else (expected,)
+                assert used & set(alternatives), f"{url}: uses {sorted(used)}, expected {expected}"
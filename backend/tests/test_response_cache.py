@@ -0,0 +1,175 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from database import SessionLocal, engine
+from farm.model_farm import Farm
+from farmer.model_farmer import Farmer
+from utils import hash_password
+from main import app
+from sqlalchemy import text, event
+import response_cache
+from response_cache import MemoryCacheBackend, SQLiteCacheBackend
+
+def reset_database():
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM milk_production_individual"))
+        db.execute(text("DELETE FROM sheep_parentage"))
+        db.execute(text("DELETE FROM appointment_sheep"))
+        db.execute(text("DELETE FROM sheep"))
+        db.execute(text("DELETE FROM sheep_group"))
+        db.execute(text("DELETE FROM veterinarian"))
+        db.execute(text("DELETE FROM farmer"))
+        db.execute(text("DELETE FROM farm_inventory"))
+        db.execute(text("DELETE FROM sensor"))
+        db.execute(text("DELETE FROM farm"))
+        db.commit()
+
+def create_test_user():
+    with SessionLocal() as db:
+        farm = Farm(name="Cache Farm", location="Pasture")
+        db.add(farm)
+        db.commit()
+        db.refresh(farm)
+
+        farmer = Farmer(
+            name="Cache Farmer",
+            email="cache@test.com",
+            password=hash_password("cache123"),
+            farm_id=farm.id
+        )
+        db.add(farmer)
+        db.commit()
+        return farm.id
+
+
+@pytest.mark.asyncio
+async def test_responses_are_cached_until_the_farm_writes():
+    reset_database()
+    create_test_user()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "cache@test.com", "password": "cache123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        await ac.post("/sheep-group/", json={"name": "Grupo A", "description": "", "sheep_ids": []}, headers=headers)
+        first = await ac.get("/sheep-group/", headers=headers)
+        assert [g["name"] for g in first.json()] == ["Grupo A"]
+
+        hits = response_cache.metrics.hits
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            second = await ac.get("/sheep-group/", headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        assert second.json() == first.json()
+        assert response_cache.metrics.hits == hits + 1
+        assert statements == []
+
+        # uma escrita da fazenda invalida as respostas cacheadas
+        await ac.post("/sheep-group/", json={"name": "Grupo B", "description": "", "sheep_ids": []}, headers=headers)
+        third = await ac.get("/sheep-group/", headers=headers)
+        assert sorted(g["name"] for g in third.json()) == ["Grupo A", "Grupo B"]
+
+        # ETag servido do cache
+        summary = await ac.get("/milk-production/summary", headers=headers)
+        cached = await ac.get("/milk-production/summary", headers={**headers, "If-None-Match": summary.headers["etag"]})
+        assert cached.status_code == 304
+
+        # token revogado não é servido pelo cache
+        await ac.post("/auth/logout", headers=headers)
+        assert (await ac.get("/sheep-group/", headers=headers)).status_code == 401
+
+        metrics = (await ac.get("/health/cache")).json()
+        assert metrics["hits"] >= 2 and metrics["misses"] >= 2
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_cache_backends(backend, tmp_path):
+    if backend == "memory":
+        cache = MemoryCacheBackend(max_entries=2)
+    else:
+        cache = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        cache.PURGE_INTERVAL = 0
+
+    entry = {"status": 200, "headers": {"content-type": "application/json"}, "body": b"[]"}
+    for key in ("a", "b", "c"):
+        cache.set(key, entry, ttl=60)
+    cache.set("expired", entry, ttl=-1)
+
+    assert cache.get("a") is None  # removida pelo limite de entradas
+    assert cache.get("c") == entry
+    assert cache.get("expired") is None
+
+    assert cache.version(7) == 0
+    cache.bump(7)
+    cache.bump(7)
+    assert cache.version(7) == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_key_rolls_over_with_the_date_and_farm_moves(monkeypatch):
+    from datetime import date
+    reset_database()
+    farm_id = create_test_user()
+    with SessionLocal() as db:
+        other = Farm(name="Other Farm", location="Hill")
+        db.add(other)
+        db.commit()
+        other_id = other.id
+        db.add(Farmer(name="Other Farmer", email="other@test.com", password=hash_password("other123"), farm_id=other_id))
+        db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "cache@test.com", "password": "cache123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        other_login = await ac.post("/auth/login", json={"email": "other@test.com", "password": "other123"})
+        other_headers = {"Authorization": f"Bearer {other_login.json()['access_token']}"}
+
+        # "hoje" muda à meia-noite: a resposta de ontem não é reaproveitada
+        for _ in range(2):
+            await ac.get("/milk-production/total-today", headers=headers)
+        hits, misses = response_cache.metrics.hits, response_cache.metrics.misses
+        await ac.get("/milk-production/total-today", headers=headers)
+        assert response_cache.metrics.hits == hits + 1
+
+        class Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return date.fromordinal(date.today().toordinal() + 1)
+
+        monkeypatch.setattr(response_cache, "date", Tomorrow)
+        await ac.get("/milk-production/total-today", headers=headers)
+        assert response_cache.metrics.misses == misses + 1
+        monkeypatch.undo()
+
+        # a ovelha que muda de fazenda invalida também a fazenda de destino
+        # a primeira requisição do token só popula o cache de principal
+        assert (await ac.get("/sheep/", headers=other_headers)).json() == []
+        hits = response_cache.metrics.hits
+        assert (await ac.get("/sheep/", headers=other_headers)).json() == []
+        assert (await ac.get("/sheep/", headers=other_headers)).json() == []
+        assert response_cache.metrics.hits == hits + 1
+        sheep = await ac.post("/sheep/", json={
+            "birth_date": "2023-01-01", "farm_id": farm_id, "feeding_hay": 1.0,
+            "feeding_feed": 1.0, "gender": "Fêmea",
+        }, headers=headers)
+        assert sheep.status_code in (200, 201), sheep.text
+        moved = await ac.put(f"/sheep/{sheep.json()['id']}", json={"farm_id": other_id}, headers=headers)
+        assert moved.status_code == 200, moved.text
+        assert [s["id"] for s in (await ac.get("/sheep/", headers=other_headers)).json()] == [sheep.json()["id"]]
+
+
+def test_memory_backend_refuses_several_workers(monkeypatch, tmp_path):
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(response_cache, "WEB_CONCURRENCY", 2)
+    with pytest.raises(RuntimeError):
+        response_cache.create_backend()
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_BACKEND", "sqlite")
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    assert isinstance(response_cache.create_backend(), SQLiteCacheBackend)
@@ -1,13 +1,20 @@
+import json
+import numpy as np
 import pytest
 from httpx import AsyncClient, ASGITransport
-from database import SessionLocal
+from database import SessionLocal, engine
 from sheep.model_sheep import Sheep
 from farm.model_farm import Farm
 from farmer.model_farmer import Farmer
 from sheep.model_sheepparentage import SheepParentage
+from sheepgroup.model_sheepgroup import SheepGroup
+from milkproduction.model_milkproduction import MilkProduction
 from utils import hash_password
-from sqlalchemy import text
+from sqlalchemy import text, event
+from datetime import date, timedelta
 from main import app
+import response_cache
+from sheep import mating
 
 
 def reset_database():
@@ -349,4 +356,667 @@ async def test_get_sheep_children():
         assert len(data) == 2
         child_ids = {child["id"] for child in data}
         assert child1_id in child_ids
-        assert child2_id in child_ids
\ No newline at end of file
+        assert child2_id in child_ids
+
+
+def seed_herd(farm_id, size, days):
+    with SessionLocal() as db:
+        herd = [
+            Sheep(
+                birth_date="2022-01-01",
+                farm_id=farm_id,
+                feeding_hay=5.0,
+                feeding_feed=5.0,
+                gender="Fêmea"
+            )
+            for _ in range(size)
+        ]
+        db.add_all(herd)
+        db.flush()
+
+        today = date.today()
+        db.add_all([
+            MilkProduction(sheep_id=sheep.id, date=today - timedelta(days=d), volume=float(d + 1))
+            for sheep in herd
+            for d in range(days)
+        ])
+        db.commit()
+
+
+@pytest.mark.asyncio
+async def test_list_all_sheep_query_count_is_flat():
+    reset_database()
+    farm_id = create_test_user()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        token = login.json()["access_token"]
+        # aquece o cache de principal para as duas medições partirem do mesmo estado
+        await ac.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+        counts = []
+        for size in (2, 20):
+            seed_herd(farm_id, size, days=3)
+            # o seed vai direto ao banco, sem passar pelas rotas que invalidam o cache
+            response_cache.bump_farm(farm_id)
+
+            statements.clear()
+            event.listen(engine, "before_cursor_execute", count_statement)
+            try:
+                response = await ac.get("/sheep/", headers={"Authorization": f"Bearer {token}"})
+            finally:
+                event.remove(engine, "before_cursor_execute", count_statement)
+
+            assert response.status_code == 200
+            data = response.json()
+            # a produção mais recente (hoje) tem volume 1.0
+            assert all(s["milk_production"] == 1.0 for s in data)
+            counts.append(len(statements))
+
+        assert counts[0] == counts[1]
+
+
+@pytest.mark.asyncio
+async def test_list_sheep_keyset_pagination_and_filters():
+    reset_database()
+    farm_id = create_test_user()
+
+    with SessionLocal() as db:
+        db.add_all([
+            Sheep(
+                birth_date=date(2020 + i % 4, 1, 1),
+                farm_id=farm_id,
+                feeding_hay=5.0,
+                feeding_feed=5.0,
+                gender="Fêmea" if i % 2 else "Macho"
+            )
+            for i in range(7)
+        ])
+        db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        seen = []
+        params = {"limit": 3}
+        while True:
+            response = await ac.get("/sheep/", params=params, headers=headers)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= 3
+            seen.extend(s["id"] for s in page)
+            if "x-next-cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["x-next-cursor"]
+        assert seen == sorted(seen)
+        assert len(seen) == 7
+
+        response = await ac.get("/sheep/", params={
+            "gender": "Fêmea",
+            "born_from": "2021-01-01",
+            "fields": "id,birth_date,milk_production"
+        }, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 3
+        for s in data:
+            assert set(s) == {"id", "birth_date", "milk_production"}
+            assert s["birth_date"] >= "2021-01-01"
+
+        response = await ac.get("/sheep/", params={"fields": "id,password"}, headers=headers)
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_update_milk_yield_upserts_and_checks_farm():
+    reset_database()
+    farm_id = create_test_user()
+
+    with SessionLocal() as db:
+        other_farm = Farm(name="Other", location="Far")
+        db.add(other_farm)
+        db.flush()
+        own = Sheep(birth_date="2023-01-01", farm_id=farm_id, feeding_hay=1.0, feeding_feed=1.0, gender="Fêmea")
+        foreign = Sheep(birth_date="2023-01-01", farm_id=other_farm.id, feeding_hay=1.0, feeding_feed=1.0, gender="Fêmea")
+        db.add_all([own, foreign])
+        db.commit()
+        own_id, foreign_id = own.id, foreign.id
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        first = await ac.patch(f"/sheep/{own_id}/milk-yield", json={"volume": 3.0, "date": "2025-05-15"}, headers=headers)
+        second = await ac.patch(f"/sheep/{own_id}/milk-yield", json={"volume": 3.5, "date": "2025-05-15"}, headers=headers)
+        assert first.status_code == second.status_code == 200
+        assert second.json()["id"] == first.json()["id"]
+        assert second.json()["milk_production"] == 3.5
+
+        response = await ac.patch(f"/sheep/{foreign_id}/milk-yield", json={"volume": 1.0, "date": "2025-05-15"}, headers=headers)
+        assert response.status_code == 403
+
+        response = await ac.patch(f"/sheep/{foreign_id + 1000}/milk-yield", json={"volume": 1.0, "date": "2025-05-15"}, headers=headers)
+        assert response.status_code == 404
+
+    with SessionLocal() as db:
+        assert db.query(MilkProduction).filter(MilkProduction.sheep_id == own_id).count() == 1
+        assert db.query(MilkProduction).filter(MilkProduction.sheep_id == foreign_id).count() == 0
+
+
+def seed_pedigree(farm_id):
+    # ram e ewe têm dois filhos (a, b), que são pais de `inbred`; `inbred` é pai de `grandchild`
+    with SessionLocal() as db:
+        def sheep(gender):
+            animal = Sheep(birth_date="2020-01-01", farm_id=farm_id, feeding_hay=1.0,
+                           feeding_feed=1.0, gender=gender)
+            db.add(animal)
+            db.flush()
+            return animal.id
+
+        ram, ewe = sheep("Macho"), sheep("Fêmea")
+        a, b = sheep("Macho"), sheep("Fêmea")
+        inbred = sheep("Macho")
+        grandchild = sheep("Fêmea")
+        db.add_all([
+            SheepParentage(parent_id=parent, offspring_id=offspring)
+            for parent, offspring in [(ram, a), (ewe, a), (ram, b), (ewe, b),
+                                      (a, inbred), (b, inbred), (inbred, grandchild)]
+        ])
+        db.commit()
+        return ram, ewe, a, b, inbred, grandchild
+
+
+@pytest.mark.asyncio
+async def test_sheep_ancestors_and_descendants():
+    reset_database()
+    farm_id = create_test_user()
+    ram, ewe, a, b, inbred, grandchild = seed_pedigree(farm_id)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        response = await ac.get(f"/sheep/{grandchild}/ancestors?depth=10", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["root"] == grandchild and data["direction"] == "ancestors"
+        # ram e ewe aparecem uma única vez, mesmo chegando por a e por b
+        assert {node["id"]: node["generation"] for node in data["nodes"]} == {
+            inbred: 1, a: 2, b: 2, ram: 3, ewe: 3
+        }
+        assert sorted(map(tuple, data["edges"])) == sorted([
+            (inbred, grandchild), (a, inbred), (b, inbred), (ram, a), (ewe, a), (ram, b), (ewe, b)
+        ])
+
+        response = await ac.get(f"/sheep/{grandchild}/ancestors?depth=2", headers=headers)
+        assert {node["id"] for node in response.json()["nodes"]} == {inbred, a, b}
+
+        response = await ac.get(f"/sheep/{ram}/descendants?depth=3", headers=headers)
+        assert response.status_code == 200
+        assert {node["id"]: node["generation"] for node in response.json()["nodes"]} == {
+            a: 1, b: 1, inbred: 2, grandchild: 3
+        }
+
+        response = await ac.get(f"/sheep/{ram}/descendants?depth=0", headers=headers)
+        assert response.status_code == 422
+
+        response = await ac.get("/sheep/999999/ancestors", headers=headers)
+        assert response.status_code == 404
+
+    # parentesco com animais de outra fazenda não vaza pelo grafo
+    with SessionLocal() as db:
+        other = Farm(name="Other Farm", location="Hill")
+        db.add(other)
+        db.flush()
+        foreign_sire, foreign_lamb = (
+            Sheep(birth_date="2020-01-01", farm_id=other.id, feeding_hay=1.0, feeding_feed=1.0, gender=gender)
+            for gender in ("Macho", "Fêmea")
+        )
+        db.add_all([foreign_sire, foreign_lamb])
+        db.flush()
+        foreign_ids = {foreign_sire.id, foreign_lamb.id}
+        db.add_all([SheepParentage(parent_id=foreign_sire.id, offspring_id=ram),
+                    SheepParentage(parent_id=grandchild, offspring_id=foreign_lamb.id)])
+        db.commit()
+
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        for url in (f"/sheep/{grandchild}/ancestors?depth=10", f"/sheep/{ram}/descendants?depth=10"):
+            data = (await ac.get(url, headers=headers)).json()
+            assert not foreign_ids & {node["id"] for node in data["nodes"]}
+            assert not foreign_ids & {node for edge in data["edges"] for node in edge}
+
+
+@pytest.mark.asyncio
+async def test_inbreeding_and_kinship():
+    reset_database()
+    farm_id = create_test_user()
+    ram, ewe, a, b, inbred, grandchild = seed_pedigree(farm_id)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        response = await ac.get("/sheep/inbreeding", headers=headers)
+        assert response.status_code == 200
+        coefficients = {row["sheep_id"]: row["inbreeding"] for row in response.json()}
+        # filho de irmãos completos: F = 1/4
+        assert coefficients == {ram: 0.0, ewe: 0.0, a: 0.0, b: 0.0, inbred: 0.25, grandchild: 0.0}
+
+        response = await ac.get("/sheep/inbreeding?min_coefficient=0.1", headers=headers)
+        assert [row["sheep_id"] for row in response.json()] == [inbred]
+
+        response = await ac.get(f"/sheep/kinship?rams={ram}&rams={a}&rams={inbred}&ewes={ewe}&ewes={b}",
+                                headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["rams"] == [ram, a, inbred] and data["ewes"] == [ewe, b]
+        assert data["kinship"] == [[0.0, 0.25], [0.25, 0.25], [0.25, 0.375]]
+
+        # sem parâmetros: todos os machos x todas as fêmeas
+        response = await ac.get("/sheep/kinship", headers=headers)
+        assert response.json()["rams"] == [ram, a, inbred]
+        assert response.json()["ewes"] == [ewe, b, grandchild]
+
+        # pedigree alterado (retrocruzamento inbred x a): o cache da fazenda é recalculado
+        with SessionLocal() as db:
+            db.add(SheepParentage(parent_id=a, offspring_id=grandchild))
+            db.commit()
+        response_cache.bump_farm(farm_id)
+        response = await ac.get("/sheep/inbreeding?min_coefficient=0.1", headers=headers)
+        assert response.json() == [
+            {"sheep_id": inbred, "inbreeding": 0.25}, {"sheep_id": grandchild, "inbreeding": 0.375}
+        ]
+
+        # ciclo no pedigree (b filha de inbred e mãe de inbred)
+        with SessionLocal() as db:
+            db.add(SheepParentage(parent_id=inbred, offspring_id=b))
+            db.commit()
+        response_cache.bump_farm(farm_id)
+        response = await ac.get("/sheep/inbreeding", headers=headers)
+        assert response.status_code == 409
+
+        response = await ac.get("/sheep/kinship?rams=999999", headers=headers)
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_mating_plan():
+    reset_database()
+    farm_id = create_test_user()
+    ram, ewe, a, b, inbred, grandchild = seed_pedigree(farm_id)
+    with SessionLocal() as db:
+        group = SheepGroup(name="Estação de monta", farm_id=farm_id)
+        db.add(group)
+        db.flush()
+        db.query(Sheep).filter(Sheep.id.in_([ewe, b, grandchild])).update({"group_id": group.id})
+        db.commit()
+        group_id = group.id
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        # F esperado (ovelha x carneiro): ewe 0/.25/.25, b .25/.25/.375, grandchild .125/.1875/.3125
+        response = await ac.post("/sheep/mating-plan", headers=headers, json={
+            "group_id": group_id, "ram_ids": [ram, a, inbred],
+            "capacities": {str(ram): 2, str(a): 1, str(inbred): 0}, "alternatives": 2
+        })
+        assert response.status_code == 200
+        data = response.json()
+        plan = {row["ewe_id"]: (row["ram_id"], row["expected_inbreeding"]) for row in data["assignments"]}
+        assert plan == {ewe: (ram, 0.0), b: (a, 0.25), grandchild: (ram, 0.125)}
+        assert data["unassigned"] == 0
+        assert data["mean_expected_inbreeding"] == 0.125
+        assert data["assignments"][2]["candidates"] == [
+            {"ram_id": ram, "expected_inbreeding": 0.125}, {"ram_id": a, "expected_inbreeding": 0.1875}
+        ]
+
+        # capacidade insuficiente: só uma ovelha recebe o carneiro
+        response = await ac.post("/sheep/mating-plan", headers=headers, json={
+            "group_id": group_id, "ram_ids": [ram], "capacity": 1
+        })
+        data = response.json()
+        assert [row["ram_id"] for row in data["assignments"]] == [ram, None, None]
+        assert data["unassigned"] == 2
+
+        # capacidade enorme: limitada ao número de ovelhas antes de expandir a matriz
+        response = await ac.post("/sheep/mating-plan", headers=headers, json={
+            "group_id": group_id, "ram_ids": [ram, a], "capacity": 10_000_000,
+            "capacities": {str(a): 2_000_000_000}
+        })
+        assert response.status_code == 200
+        assert response.json()["unassigned"] == 0
+        assert [row["ram_id"] for row in response.json()["assignments"]] == [ram, ram, ram]
+
+        response = await ac.post("/sheep/mating-plan", headers=headers, json={
+            "group_id": group_id, "ram_ids": [ewe]
+        })
+        assert response.status_code == 404
+
+        response = await ac.post("/sheep/mating-plan", headers=headers, json={"group_id": 999999})
+        assert response.status_code == 404
+
+        response = await ac.post("/sheep/mating-plan", headers=headers, json={
+            "group_id": group_id, "ram_ids": list(range(1, 502))
+        })
+        assert response.status_code == 422
+
+
+def test_mating_assign_bounds_the_expanded_matrix(monkeypatch):
+    # 300 ovelhas x 100 carneiros, todas preferem o carneiro 0 (capacidade 5); os
+    # demais têm capacidade "infinita": a matriz não pode crescer com ela
+    rng = np.random.default_rng(7)
+    expected = rng.uniform(0.1, 0.5, size=(300, 100))
+    expected[:, 0] = 0.0
+    capacities = [5] + [2_000_000_000] * 99
+
+    shapes = []
+    solve = mating.linear_sum_assignment
+    monkeypatch.setattr(mating, "linear_sum_assignment", lambda cost: shapes.append(cost.shape) or solve(cost))
+    chosen = mating.assign(expected, capacities)
+
+    assert shapes and shapes[0][1] <= 300 + 5
+    assert (chosen >= 0).all() and (chosen == 0).sum() == 5
+    # ótimo: o carneiro 0 fica com as ovelhas que mais perderiam na segunda opção
+    second = expected[:, 1:].min(axis=1)
+    assert set(np.flatnonzero(chosen == 0)) == set(np.argsort(-second)[:5])
+    others = chosen != 0
+    assert (expected[others, chosen[others]] == second[others]).all()
+
+    monkeypatch.setattr(mating, "MAX_ASSIGNMENT_CELLS", 1000)
+    with pytest.raises(ValueError):
+        mating.assign(expected, capacities)
+
+
+@pytest.mark.asyncio
+async def test_update_sheep_parentage_diff():
+    reset_database()
+    farm_id = create_test_user()
+    ram, ewe, a, b, inbred, grandchild = seed_pedigree(farm_id)
+
+    def edges():
+        with SessionLocal() as db:
+            return {
+                (row.parent_id, row.id)
+                for row in db.query(SheepParentage).filter(SheepParentage.offspring_id == a)
+            }
+
+    before = edges()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        # sem father_id/mother_id no corpo: arestas intactas (mesmos ids)
+        response = await ac.put(f"/sheep/{a}", json={"feeding_hay": 3.0}, headers=headers)
+        assert response.status_code == 200
+        assert edges() == before
+
+        # mesmo pai e mesma mãe: nada é reescrito
+        response = await ac.put(f"/sheep/{a}", json={"father_id": ram, "mother_id": ewe}, headers=headers)
+        assert response.status_code == 200
+        assert edges() == before
+
+        # troca só o pai: a aresta da mãe continua a mesma
+        response = await ac.put(f"/sheep/{a}", json={"father_id": inbred}, headers=headers)
+        assert response.status_code == 200
+        after = edges()
+        assert {parent for parent, _ in after} == {inbred, ewe}
+        assert {edge for edge in after if edge[0] == ewe} == {edge for edge in before if edge[0] == ewe}
+
+        response = await ac.put(f"/sheep/{a}", json={"mother_id": None}, headers=headers)
+        assert response.status_code == 200
+        assert {parent for parent, _ in edges()} == {inbred}
+
+        response = await ac.put(f"/sheep/{a}", json={"father_id": ewe}, headers=headers)
+        assert response.status_code == 400
+        response = await ac.put(f"/sheep/{a}", json={"mother_id": 999999}, headers=headers)
+        assert response.status_code == 404
+        response = await ac.put(f"/sheep/{a}", json={"father_id": a}, headers=headers)
+        assert response.status_code == 400
+        assert {parent for parent, _ in edges()} == {inbred}
+
+
+def test_pedigree_integrity_check():
+    reset_database()
+    farm_id = create_test_user()
+    from sheep import integrity
+
+    with SessionLocal() as db:
+        def sheep(gender, born):
+            animal = Sheep(birth_date=born, farm_id=farm_id, feeding_hay=1.0, feeding_feed=1.0, gender=gender)
+            db.add(animal)
+            db.flush()
+            return animal.id
+
+        ram, ewe, other_ram = sheep("Macho", "2018-01-01"), sheep("Fêmea", "2018-01-01"), sheep("Macho", "2018-01-01")
+        lamb = sheep("Fêmea", "2020-01-01")
+        early = sheep("Macho", "2017-01-01")  # nascido antes dos pais
+        three_parents = sheep("Fêmea", "2020-01-01")
+        two_rams = sheep("Fêmea", "2020-01-01")
+        cycle_a, cycle_b = sheep("Macho", None), sheep("Fêmea", None)
+        db.add_all([
+            SheepParentage(parent_id=parent, offspring_id=offspring)
+            for parent, offspring in [
+                (ram, lamb), (ewe, lamb),
+                (ram, early), (ewe, early),
+                (ram, three_parents), (other_ram, three_parents), (ewe, three_parents),
+                (ram, two_rams), (other_ram, two_rams),
+                (cycle_a, cycle_b), (cycle_b, cycle_a),
+            ]
+        ])
+        db.commit()
+
+        violations = integrity.check_farm(db, farm_id)
+
+    found = {(violation.kind, violation.sheep_id) for violation in violations}
+    assert found == {
+        ("birth_order", early),
+        ("too_many_parents", three_parents),
+        ("parent_gender", two_rams),
+        ("cycle", min(cycle_a, cycle_b)),
+    }
+    cycle = next(violation for violation in violations if violation.kind == "cycle")
+    assert cycle.related == (cycle_a, cycle_b)
+
+    # papéis explícitos (importação): macho registrado como mãe
+    animals = {1: ("Macho", None), 2: ("Macho", None), 3: ("Fêmea", None)}
+    violations = integrity.check(animals, [(1, 3, "father"), (2, 3, "mother"), (3, 3), (9, 3)])
+    assert {violation.kind for violation in violations} == {"parent_gender", "self_parent", "missing_parent"}
+    assert any(violation.detail == "mother 2 is Macho" for violation in violations)
+
+
+@pytest.mark.asyncio
+async def test_import_herd():
+    reset_database()
+    farm_id = create_test_user()
+    with SessionLocal() as db:
+        group = SheepGroup(name="Lote 1", farm_id=farm_id)
+        old_ram = Sheep(birth_date="2015-01-01", farm_id=farm_id, feeding_hay=1.0, feeding_feed=1.0, gender="Macho")
+        db.add_all([group, old_ram])
+        db.commit()
+        group_id, old_ram_id = group.id, old_ram.id
+
+    # filha (F1) listada antes dos pais; F2 é neta do carneiro já cadastrado
+    csv_body = "\n".join([
+        "key,birth_date,gender,feeding_hay,feeding_feed,group_id,father_key,mother_key,father_id",
+        f"F1,2021-03-01,Fêmea,1.5,2,{group_id},R1,E1,",
+        f"R1,2019-01-01,Macho,3,2,,,,{old_ram_id}",
+        "E1,2019-02-01,Fêmea,1,1,,,,",
+        "E1,2019-02-01,Fêmea,1,1,,,,",          # chave duplicada
+        "X1,2022-01-01,Fêmea,1,1,,E1,R1,",      # pai/mãe trocados
+        "X2,2023-01-01,Fêmea,1,1,,,X1,",        # filha de linha rejeitada
+        "X3,2018-01-01,Fêmea,1,1,,R1,,",        # nasceu antes do pai
+        "X4,2022-01-01,Fêmea,1,1,999999,,,",    # grupo de outra fazenda
+        "X5,2022-01-01,Cabra,1,1,,,,",          # sexo inválido
+    ])
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        response = await ac.post("/sheep/import", content=csv_body.encode(),
+                                 headers={**headers, "Content-Type": "text/csv"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 3 and data["rejected"] == 6
+        status = {(row["key"], row["index"]): row["status"] for row in data["rows"]}
+        assert status == {
+            ("F1", 0): "created", ("R1", 1): "created", ("E1", 2): "created", ("E1", 3): "rejected",
+            ("X1", 4): "rejected", ("X2", 5): "rejected", ("X3", 6): "rejected", ("X4", 7): "rejected",
+            ("X5", 8): "rejected",
+        }
+        errors = {row["key"]: row["error"] for row in data["rows"][4:]}
+        assert errors["X2"] == "Parent X1 rejected"
+        assert errors["X3"].startswith("birth_order")
+        assert errors["X4"] == "Group not found"
+        assert errors["X5"].startswith("gender")
+        ids = {row["key"]: row["sheep_id"] for row in data["rows"] if row["status"] == "created"}
+
+        response = await ac.get(f"/sheep/{ids['F1']}/ancestors?depth=3", headers=headers)
+        assert {node["id"]: node["generation"] for node in response.json()["nodes"]} == {
+            ids["R1"]: 1, ids["E1"]: 1, old_ram_id: 2
+        }
+
+        # NDJSON: pais referenciados por id de animais já importados
+        ndjson = "\n".join(json.dumps(row) for row in [
+            {"key": "L1", "birth_date": "2024-01-01", "gender": "Macho", "father_id": ids["R1"],
+             "mother_id": ids["F1"]},
+            {"key": "L2", "birth_date": "2024-01-01", "gender": "Macho", "father_id": ids["R1"],
+             "father_key": "L1"},
+        ])
+        response = await ac.post("/sheep/import", content=ndjson.encode(),
+                                 headers={**headers, "Content-Type": "application/x-ndjson"})
+        data = response.json()
+        assert [row["status"] for row in data["rows"]] == ["created", "rejected"]
+
+        # CSV com \r\n e campo entre aspas com quebra de linha e vírgula, lido em pedaços pequenos
+        quoted_key = "Q1\r\nlote, velho"
+        crlf_body = "\r\n".join([
+            "key,birth_date,gender,feeding_hay,feeding_feed,group_id,father_key,mother_key,father_id",
+            '"Q1\r\nlote, velho",2020-01-01,Fêmea,1,1,,,,',
+            'Q2,2023-01-01,Fêmea,1,1,,,"Q1\r\nlote, velho",',
+        ]) + "\r\n"
+        encoded = crlf_body.encode()
+
+        async def chunks():
+            for start in range(0, len(encoded), 7):
+                yield encoded[start:start + 7]
+
+        response = await ac.post("/sheep/import", content=chunks(),
+                                 headers={**headers, "Content-Type": "text/csv"})
+        assert response.status_code == 200
+        assert [(row["key"], row["status"]) for row in response.json()["rows"]] == [
+            (quoted_key, "created"), ("Q2", "created")
+        ]
+
+        response = await ac.post("/sheep/import", content=b'key,birth_date\n"Q3,2020-01-01\n',
+                                 headers={**headers, "Content-Type": "text/csv"})
+        assert response.status_code == 400
+
+        with SessionLocal() as db:
+            assert db.query(Sheep).filter(Sheep.farm_id == farm_id).count() == 7
+            assert db.query(SheepParentage).count() == 6
+
+
+@pytest.mark.asyncio
+async def test_lactation_curves():
+    reset_database()
+    farm_id = create_test_user()
+    import math
+    from milkproduction import lactation
+    from milkproduction.model_lactation import LactationCurve
+
+    # curvas de Wood conhecidas; lactação anterior separada por um intervalo de 90 dias
+    start = date(2024, 1, 1)
+    curves = [(1.2, 0.25, 0.006), (0.9, 0.30, 0.010), (1.5, 0.10, 0.004)]
+    with SessionLocal() as db:
+        ids = []
+        for a, b, c in curves:
+            ewe = Sheep(birth_date=date(2020, 1, 1), farm_id=farm_id, feeding_hay=1.0, feeding_feed=1.0,
+                        gender="Fêmea")
+            db.add(ewe)
+            db.flush()
+            ids.append(ewe.id)
+            db.add_all(MilkProduction(sheep_id=ewe.id, date=start - timedelta(days=150 - d), volume=3.0)
+                       for d in range(50))
+            db.add_all(MilkProduction(sheep_id=ewe.id, date=start + timedelta(days=t - 1),
+                                      volume=a * t ** b * math.exp(-c * t))
+                       for t in range(1, 151))
+        few = Sheep(birth_date=date(2020, 1, 1), farm_id=farm_id, feeding_hay=1.0, feeding_feed=1.0, gender="Fêmea")
+        db.add(few)
+        db.flush()
+        few_id = few.id
+        db.add_all(MilkProduction(sheep_id=few_id, date=start + timedelta(days=d), volume=1.0) for d in range(3))
+        db.commit()
+        # registros gravados fora das rotas: só a comparação completa os encontra
+        assert lactation.refresh(db, farm_id) == 0
+        assert lactation.refresh(db, farm_id, full=True) == 4
+        db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/auth/login", json={"email": "sheep@test.com", "password": "sheep123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        response = await ac.get("/sheep/lactation-ranking?by=peak_yield", headers=headers)
+        assert response.status_code == 200
+        ranking = response.json()
+        # pico de Wood: t = b/c, y = a (b/c)^b e^-b
+        peaks = {sheep_id: a * (b / c) ** b * math.exp(-b) for sheep_id, (a, b, c) in zip(ids, curves)}
+        assert [row["sheep_id"] for row in ranking] == sorted(ids, key=lambda i: -peaks[i])
+        for row in ranking:
+            a, b, c = curves[ids.index(row["sheep_id"])]
+            assert row["lactation_start"] == start.isoformat()
+            assert row["records"] == 150
+            assert row["b"] == pytest.approx(b, rel=1e-6)
+            assert row["c"] == pytest.approx(c, rel=1e-6)
+            assert row["days_to_peak"] == pytest.approx(b / c, rel=1e-6)
+            assert row["peak_yield"] == pytest.approx(peaks[row["sheep_id"]], rel=1e-6)
+            assert row["persistency"] == pytest.approx(-(b + 1) * math.log(c), rel=1e-6)
+
+        response = await ac.get("/sheep/lactation-ranking?by=days_to_peak&order=asc&limit=1", headers=headers)
+        assert [row["sheep_id"] for row in response.json()] == [ids[2]]
+
+        # poucos registros: curva sem métricas, fora do ranking
+        response = await ac.get(f"/sheep/{few_id}", headers=headers)
+        assert response.json()["lactation"]["records"] == 3
+        assert response.json()["lactation"]["peak_yield"] is None
+
+        # a rota de escrita só marca a ovelha; a leitura não reajusta
+        with SessionLocal() as db:
+            fitted_at = dict(db.query(LactationCurve.sheep_id, LactationCurve.fitted_at).all())
+        response = await ac.patch(f"/sheep/{ids[0]}/milk-yield",
+                                  json={"date": str(start + timedelta(days=150)), "volume": 0.5}, headers=headers)
+        assert response.status_code == 200
+        response = await ac.get(f"/sheep/{ids[0]}", headers=headers)
+        assert response.json()["lactation"]["records"] == 150
+
+        # o job reajusta só a ovelha marcada
+        with SessionLocal() as db:
+            assert lactation.refresh(db, farm_id) == 1
+            db.commit()
+            assert lactation.refresh(db, farm_id) == 0
+            refitted = dict(db.query(LactationCurve.sheep_id, LactationCurve.fitted_at).all())
+        assert [sheep_id for sheep_id in ids if refitted[sheep_id] != fitted_at[sheep_id]] == [ids[0]]
+
+        response_cache.bump_farm(farm_id)
+        response = await ac.get(f"/sheep/{ids[0]}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["lactation"]["records"] == 151
@@ -3,19 +3,35 @@ from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status
 import os
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 
 # password hashing setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# BCRYPT_ROUNDS: custo do bcrypt; hashes com outro custo são refeitos no próximo login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# pool dedicado ao bcrypt: um pico de logins não ocupa o threadpool das outras rotas
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 def hash_password(password: str) -> str:
-    hashed = pwd_context.hash(password)
-    print(f"[DEBUG] hash_password: '{password}' -> '{hashed}'")
-    return hashed
+    return pwd_context.hash(password)
 
 def verify_password(plain: str, hashed: str) -> bool:
-    print(f"[DEBUG] verify_password: '{plain}' vs '{hashed}'")
     return pwd_context.verify(plain, hashed)
 
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, hash_password, password)
+
+async def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    # retorna (senha confere, novo hash se o custo mudou)
+    return await asyncio.get_running_loop().run_in_executor(
+        _password_pool, pwd_context.verify_and_update, plain, hashed
+    )
+
 # JWT Setup
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
@@ -27,7 +43,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 300
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti identifica o token na blacklist (logout)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_token(token: str) -> dict:
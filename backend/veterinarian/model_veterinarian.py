@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from database import Base
 
 class Veterinarian(Base):
@@ -10,3 +10,7 @@ class Veterinarian(Base):
     password = Column(String, nullable=False)
     farm_id = Column(Integer, ForeignKey("farm.id"), nullable=False)  # Relacionado com a fazenda
     farmer_id = Column(Integer, ForeignKey("farmer.id"), nullable=False)  # Relacionado com o agricultor
+
+    __table_args__ = (
+        Index('ix_veterinarian_farm_id', 'farm_id'),
+    )
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
+import principal_cache
 from veterinarian.model_veterinarian import Veterinarian
 from veterinarian.schema_veterinarian import VeterinarianCreate, VeterinarianResponse
 
@@ -16,6 +17,7 @@ def create_veterinarian(vet: VeterinarianCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     new_vet = Veterinarian(**vet.model_dump())
+    principal_cache.invalidate_email(new_vet.email)
     db.add(new_vet)
     db.commit()
     db.refresh(new_vet)
@@ -42,9 +44,11 @@ def update_veterinarian(vet_id: int, updated_vet: VeterinarianCreate, db: Sessio
     if not vet:
         raise HTTPException(status_code=404, detail="Veterinarian not found")
 
+    previous_email = vet.email
     for key, value in updated_vet.dict().items():
         setattr(vet, key, value)
 
     db.commit()
+    principal_cache.invalidate_email(previous_email, vet.email)
     db.refresh(vet)
     return vet